@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest of raw image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_content_hash(path: str) -> str:
+    """SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(*parts: str) -> str:
+    """Combine content hash, task, prompt version and model into one key."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """Content-addressed cache for VLM analysis results.
+
+    Entries live in an in-memory LRU bounded by entry count and serialized
+    size. When VLM_CACHE_DIR is set, entries of the tasks listed in
+    VLM_CACHE_DISK_TASKS are also written to disk so they survive restarts
+    and are shared between workers on the same host. License and semakan
+    results hold names, IC numbers and addresses, so by default they stay in
+    memory only and are never written to disk.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("VLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.ttl = float(os.getenv("VLM_CACHE_TTL", "86400"))
+        self.max_entries = int(os.getenv("VLM_CACHE_MAX_ENTRIES", "1024"))
+        self.max_bytes = int(os.getenv("VLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+        self.disk_dir = os.getenv("VLM_CACHE_DIR", "")
+        self.disk_max_bytes = int(os.getenv("VLM_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+        self.disk_tasks = {
+            task.strip() for task in os.getenv("VLM_CACHE_DISK_TASKS", "accident_photos,accident_image,plate").split(",")
+            if task.strip()
+        }
+
+        # key -> (expires_at, size, value)
+        self._memory: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_writes_since_prune = 0
+        self._counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+        }
+
+    async def get(self, key: str, task: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result or None. Checks memory, then disk for disk tasks."""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, size, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return dict(value)
+            self._drop(key)
+            self._counters["expirations"] += 1
+
+        if self._on_disk(task):
+            stored = await asyncio.to_thread(self._read_disk, key, now)
+            if stored is not None:
+                expires_at, value = stored
+                self._store_memory(key, value, expires_at)
+                self._counters["disk_hits"] += 1
+                return dict(value)
+
+        self._counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any], task: str):
+        """Store a result in memory and, if configured for the task, on disk."""
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        self._store_memory(key, value, expires_at)
+        self._counters["stores"] += 1
+        if self._on_disk(task):
+            await asyncio.to_thread(self._write_disk, key, value, expires_at)
+
+    def clear(self):
+        """Drop all in-memory entries. Disk entries expire on their own."""
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self._counters["memory_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+        hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "disk_enabled": bool(self.disk_dir),
+            "disk_tasks": sorted(self.disk_tasks) if self.disk_dir else [],
+            **self._counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _on_disk(self, task: str) -> bool:
+        return bool(self.disk_dir) and task in self.disk_tasks
+
+    def _store_memory(self, key: str, value: Dict[str, Any], expires_at: float):
+        size = len(json.dumps(value, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._drop(key)
+        self._memory[key] = (expires_at, size, dict(value))
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._drop(oldest)
+            self._counters["evictions"] += 1
+
+    def _drop(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[1]
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if stored.get("expires_at", 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._counters["expirations"] += 1
+            return None
+        return stored["expires_at"], stored["value"]
+
+    def _write_disk(self, key: str, value: Dict[str, Any], expires_at: float):
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "value": value}, f, ensure_ascii=False)
+            # Atomic rename so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Analysis cache disk write failed: {e}")
+            return
+
+        self._disk_writes_since_prune += 1
+        if self._disk_writes_since_prune >= 100:
+            self._disk_writes_since_prune = 0
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Remove expired files, then the oldest ones until under the size cap."""
+        now = time.time()
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if now - st.st_mtime > self.ttl:
+                    try:
+                        os.remove(path)
+                        self._counters["expirations"] += 1
+                    except OSError:
+                        pass
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self._counters["evictions"] += 1
+            except OSError:
+                pass
+
+
+# Global analysis cache instance
+analysis_cache = AnalysisCache()
@@ -0,0 +1,258 @@
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Questions are vectors of hashed character n-grams
+_DIM = 1 << 18
+_NGRAM_SIZES = (3, 4, 5)
+# Random-hyperplane signatures for the ANN index, split into 8-bit bands;
+# questions sharing any band are compared exactly
+_SIGNATURE_BYTES = 16
+_SEED = 20240601
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Function words that do not change what a question asks; every other word,
+# and always a negator, must be the same for a cached answer to be served
+_STOPWORDS = frozenset(
+    "yang di ke dari daripada untuk bagi dan atau ini itu pada dengan tentang mengenai "
+    "kah lah pun ya saja sahaja tolong sila "
+    "the a an is are of to for and or in on about please".split()
+)
+_NEGATORS = frozenset("bukan tidak tak tiada takde belum jangan not no never dont cannot".split())
+
+# Malaysian IC numbers, phone numbers and e-mail addresses
+_PERSONAL_DATA = re.compile(
+    r"\b\d{6}-?\d{2}-?\d{4}\b"
+    r"|(?:\+?6)?01\d[- ]?\d{3,4}[- ]?\d{4}\b"
+    r"|[\w.+-]+@[\w-]+\.[\w.]+"
+)
+
+_planes: Optional[np.ndarray] = None
+
+
+class QuestionVector(NamedTuple):
+    indices: np.ndarray  # sorted feature indices
+    weights: np.ndarray  # L2-normalized
+
+
+class CachedAnswer(NamedTuple):
+    question: str
+    answer: str
+    namespace: str
+    vector: QuestionVector
+    words: FrozenSet[str]
+    buckets: List[Tuple[int, int]]
+    expires_at: float
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase words with punctuation and extra spaces removed."""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def content_words(text: str) -> FrozenSet[str]:
+    """Words of a question that carry its meaning, negators included."""
+    return frozenset(
+        word for word in normalize_question(text).split()
+        if word in _NEGATORS or word not in _STOPWORDS
+    )
+
+
+def contains_personal_data(text: str) -> bool:
+    """Whether text holds an IC number, phone number or e-mail address."""
+    return _PERSONAL_DATA.search(text) is not None
+
+
+def question_vector(text: str) -> QuestionVector:
+    """Hashed character n-gram counts of a question, log-scaled and L2-normalized."""
+    padded = f" {normalize_question(text)} "
+    features = [
+        zlib.crc32(padded[start:start + size].encode("utf-8")) & (_DIM - 1)
+        for size in _NGRAM_SIZES
+        for start in range(len(padded) - size + 1)
+    ]
+    if not features:
+        return QuestionVector(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+    indices, counts = np.unique(np.array(features, dtype=np.int64), return_counts=True)
+    weights = 1.0 + np.log(counts)
+    weights /= np.linalg.norm(weights)
+    return QuestionVector(indices, weights.astype(np.float32))
+
+
+def _dense(vector: QuestionVector) -> np.ndarray:
+    """The vector scattered into a dense array, so it can be scored against many others."""
+    dense = np.zeros(_DIM, dtype=np.float32)
+    dense[vector.indices] = vector.weights
+    return dense
+
+
+def cosine(dense: np.ndarray, vector: QuestionVector) -> float:
+    """Similarity of a dense query vector and a stored vector; both are unit length."""
+    return float(dense[vector.indices] @ vector.weights)
+
+
+def _buckets(vector: QuestionVector) -> List[Tuple[int, int]]:
+    """LSH buckets of a vector: (band, band value) for each signature byte."""
+    global _planes
+    if _planes is None:
+        # One random hyperplane sign per feature and signature bit, packed
+        _planes = np.random.default_rng(_SEED).integers(0, 256, (_DIM, _SIGNATURE_BYTES), dtype=np.uint8)
+    signs = np.unpackbits(_planes[vector.indices], axis=1).astype(np.float32) * 2 - 1
+    signature = np.packbits(vector.weights @ signs > 0)
+    return list(enumerate(signature.tolist()))
+
+
+class ChatAnswerCache:
+    """Answers to frequently asked chat questions, matched by similarity.
+
+    Runs fully offline: questions become hashed character n-gram vectors, an
+    LSH index over random-hyperplane signatures narrows the stored questions
+    to a few candidates, and a cached answer is used when the best cosine
+    similarity reaches CHAT_ANSWER_CACHE_THRESHOLD and both questions have
+    the same content words, so "jika saya yang salah" never gets the answer
+    to "jika bukan saya yang salah". Entries are scoped to a namespace (model
+    and prompt version) so a prompt change never serves answers written for
+    the old one. Turns holding personal data are never cached.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("CHAT_ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.ttl = float(os.getenv("CHAT_ANSWER_CACHE_TTL", "86400"))
+        self.threshold = float(os.getenv("CHAT_ANSWER_CACHE_THRESHOLD", "0.85"))
+        self.max_entries = int(os.getenv("CHAT_ANSWER_CACHE_MAX_ENTRIES", "2048"))
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], Set[int]] = {}
+        self._next_id = 0
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "skipped": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "purged": 0,
+            "candidates": 0,
+        }
+
+    def lookup(self, question: str, namespace: str) -> Optional[str]:
+        """A cached answer to a question similar enough to this one, or None."""
+        if not self.enabled:
+            return None
+        entry_id, compared = self._closest(question_vector(question), content_words(question), namespace)
+        self._counters["candidates"] += compared
+        if entry_id is None:
+            self._counters["misses"] += 1
+            return None
+        self._entries.move_to_end(entry_id)
+        self._counters["hits"] += 1
+        return self._entries[entry_id].answer
+
+    def store(self, question: str, answer: str, namespace: str):
+        """Cache an answer, replacing the entry for a near-duplicate question."""
+        if not self.enabled or not answer.strip():
+            return
+        if contains_personal_data(question) or contains_personal_data(answer):
+            self.record_skip()
+            return
+        vector = question_vector(question)
+        if not len(vector.indices):
+            return
+        words = content_words(question)
+        entry_id, _ = self._closest(vector, words, namespace)
+        if entry_id is not None:
+            self._drop(entry_id)
+
+        entry_id = self._next_id
+        self._next_id += 1
+        buckets = _buckets(vector)
+        self._entries[entry_id] = CachedAnswer(question, answer, namespace, vector, words, buckets, time.time() + self.ttl)
+        for bucket in buckets:
+            self._buckets.setdefault(bucket, set()).add(entry_id)
+        self._counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self._counters["evictions"] += 1
+
+    def record_skip(self):
+        """Count a question that was not eligible for caching."""
+        self._counters["skipped"] += 1
+
+    def purge(self, question: Optional[str] = None) -> int:
+        """Drop every entry, or only those matching ``question``; returns the count."""
+        if question is None:
+            purged = len(self._entries)
+            self._entries.clear()
+            self._buckets.clear()
+        else:
+            dense = _dense(question_vector(question))
+            words = content_words(question)
+            matching = [
+                entry_id for entry_id, entry in self._entries.items()
+                if entry.words == words and cosine(dense, entry.vector) >= self.threshold
+            ]
+            for entry_id in matching:
+                self._drop(entry_id)
+            purged = len(matching)
+        self._counters["purged"] += purged
+        return purged
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate, entry count and how many candidates each lookup compared."""
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "entries": len(self._entries),
+            **self._counters,
+            "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+            "candidates_per_lookup": round(self._counters["candidates"] / lookups, 2) if lookups else None,
+        }
+
+    def _closest(self, vector: QuestionVector, words: FrozenSet[str], namespace: str) -> Tuple[Optional[int], int]:
+        """The most similar live entry with the same content words at or above
+        the threshold, and how many entries were compared."""
+        if not len(vector.indices) or not self._entries:
+            return None, 0
+        candidates: Set[int] = set()
+        for bucket in _buckets(vector):
+            candidates.update(self._buckets.get(bucket, ()))
+
+        now = time.time()
+        dense = _dense(vector)
+        best_id, best_score = None, 0.0
+        for entry_id in candidates:
+            entry = self._entries[entry_id]
+            if entry.expires_at <= now:
+                self._drop(entry_id)
+                self._counters["expirations"] += 1
+                continue
+            if entry.namespace != namespace or entry.words != words:
+                continue
+            score = cosine(dense, entry.vector)
+            if score >= self.threshold and score > best_score:
+                best_id, best_score = entry_id, score
+        return best_id, len(candidates)
+
+    def _drop(self, entry_id: int):
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for bucket in entry.buckets:
+            members = self._buckets.get(bucket)
+            if members is not None:
+                members.discard(entry_id)
+                if not members:
+                    del self._buckets[bucket]
+
+
+# Global chat answer cache
+answer_cache = ChatAnswerCache()
@@ -0,0 +1,249 @@
+import io
+import os
+import time
+import wave
+import shutil
+import asyncio
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Whisper works on 16 kHz mono internally, so nothing above that is sent
+SAMPLE_RATE = 16000
+_FRAME_SAMPLES = SAMPLE_RATE // 50  # 20 ms VAD frames
+
+# A frame is speech when it is above an absolute floor; silence is trimmed
+# only where frames are also this far below the speech, so a clip that is
+# speech from start to end is kept whole
+VAD_MARGIN_DB = float(os.getenv("AUDIO_VAD_MARGIN_DB", "10"))
+VAD_FLOOR_DB = float(os.getenv("AUDIO_VAD_FLOOR_DB", "-45"))
+# Clips with less speech than this are rejected as empty
+MIN_SPEECH_SECONDS = float(os.getenv("AUDIO_MIN_SPEECH_SECONDS", "0.2"))
+# Silence kept around the speech so word onsets and endings are not clipped
+PAD_BEFORE_SECONDS = 0.2
+PAD_AFTER_SECONDS = 0.3
+
+# Re-encoding of the trimmed audio: "opus" (Ogg) or "wav"
+OUTPUT_FORMAT = os.getenv("AUDIO_NORMALIZE_FORMAT", "opus")
+OPUS_BITRATE = os.getenv("AUDIO_NORMALIZE_BITRATE", "24k")
+# libopus effort; below the default of 10 the output barely grows while
+# encoding takes about half as long
+OPUS_COMPRESSION_LEVEL = "2"
+FFMPEG_TIMEOUT = float(os.getenv("AUDIO_FFMPEG_TIMEOUT", "30"))
+
+
+class EmptyRecordingError(ValueError):
+    """The recording holds no detectable speech."""
+
+
+class NormalizedAudio(NamedTuple):
+    data: bytes
+    filename: str
+    content_type: str
+    input_seconds: float
+    speech_seconds: float
+
+
+def frame_energies_db(pcm: np.ndarray) -> np.ndarray:
+    """RMS level of each 20 ms frame in dBFS."""
+    frames = len(pcm) // _FRAME_SAMPLES
+    samples = pcm[:frames * _FRAME_SAMPLES].astype(np.float32).reshape(frames, _FRAME_SAMPLES) / 32768.0
+    rms = np.sqrt(np.mean(np.square(samples), axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-6))
+
+
+def speech_bounds(pcm: np.ndarray) -> Optional[Tuple[int, int, float]]:
+    """Sample range to keep and seconds of speech, or None when there is none.
+
+    Energy-based VAD: a clip is empty when too few frames are above
+    VAD_FLOOR_DB. Leading and trailing frames are trimmed, less a little
+    padding, when they are within VAD_MARGIN_DB of the clip's noise floor
+    (its 10th percentile frame energy) and more than VAD_MARGIN_DB below its
+    loud speech (the 90th percentile), i.e. background noise rather than
+    quieter speech.
+    """
+    energies = frame_energies_db(pcm)
+    if not len(energies):
+        return None
+    audible = energies > VAD_FLOOR_DB
+    if np.count_nonzero(audible) * _FRAME_SAMPLES / SAMPLE_RATE < MIN_SPEECH_SECONDS:
+        return None
+    noise_floor, loud = np.percentile(energies, [10, 90])
+    threshold = max(VAD_FLOOR_DB, min(noise_floor + VAD_MARGIN_DB, loud - VAD_MARGIN_DB))
+    speech = np.flatnonzero(energies > threshold)
+    speech_seconds = len(speech) * _FRAME_SAMPLES / SAMPLE_RATE
+    start = max(0, int(speech[0]) * _FRAME_SAMPLES - int(PAD_BEFORE_SECONDS * SAMPLE_RATE))
+    end = min(len(pcm), (int(speech[-1]) + 1) * _FRAME_SAMPLES + int(PAD_AFTER_SECONDS * SAMPLE_RATE))
+    return start, end, speech_seconds
+
+
+def _ffmpeg(ffmpeg: str, args: list, data: Optional[bytes] = None) -> bytes:
+    result = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error", "-nostdin"] + args,
+        input=data, capture_output=True, timeout=FFMPEG_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()[-300:]}")
+    return result.stdout
+
+
+def _pcm_to_wav(pcm: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def _normalize_audio(data: bytes, ffmpeg: str, output_format: str = OUTPUT_FORMAT) -> NormalizedAudio:
+    """Decode to 16 kHz mono, trim silence and re-encode.
+
+    Runs inside a worker process, so it must stay a picklable module-level
+    function. The input goes through a temporary file because containers
+    such as MP4 from Safari cannot be demuxed from a pipe.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".audio") as source:
+        source.write(data)
+        source.flush()
+        raw = _ffmpeg(ffmpeg, ["-i", source.name, "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"])
+    pcm = np.frombuffer(raw, dtype="<i2")
+
+    bounds = speech_bounds(pcm)
+    if bounds is None:
+        raise EmptyRecordingError("No speech detected in recording")
+    start, end, speech_seconds = bounds
+    trimmed = pcm[start:end]
+
+    if output_format == "opus":
+        try:
+            encoded = _ffmpeg(ffmpeg, [
+                "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+                "-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip",
+                "-compression_level", OPUS_COMPRESSION_LEVEL, "-f", "ogg", "pipe:1"
+            ], trimmed.tobytes())
+            return NormalizedAudio(encoded, "recording.ogg", "audio/ogg", len(pcm) / SAMPLE_RATE, speech_seconds)
+        except RuntimeError:
+            # ffmpeg built without libopus; 16 kHz mono WAV is still small
+            pass
+    return NormalizedAudio(_pcm_to_wav(trimmed), "recording.wav", "audio/wav", len(pcm) / SAMPLE_RATE, speech_seconds)
+
+
+class AudioPreprocessor:
+    """Process-pool stage that normalizes recordings before transcription.
+
+    Enabled with AUDIO_NORMALIZE_ENABLED and when ffmpeg is on the PATH (or
+    at FFMPEG_PATH); otherwise recordings are forwarded untouched. A
+    recording that fails to decode is forwarded untouched too, so Whisper
+    still gets a chance at it.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("AUDIO_NORMALIZE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.ffmpeg = shutil.which(os.getenv("FFMPEG_PATH", "ffmpeg"))
+        self.workers = int(os.getenv("AUDIO_POOL_WORKERS", str(min(4, os.cpu_count() or 2))))
+        self.max_queue = int(os.getenv("AUDIO_POOL_MAX_QUEUE", str(max(1, self.workers) * 4)))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "rejected_empty": 0,
+            "failed": 0,
+            "kept_original": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "input_seconds": 0.0,
+            "speech_seconds": 0.0,
+            "process_seconds_total": 0.0,
+        }
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self.ffmpeg is not None
+
+    def start(self):
+        """Create the worker pool. AUDIO_POOL_WORKERS=0 falls back to a thread."""
+        if not self.active:
+            if self.enabled:
+                print("Audio normalization disabled: ffmpeg not found")
+            return
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def close(self):
+        """Shut down the worker pool, dropping any queued work."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def normalize(self, data: bytes, filename: str, content_type: str) -> NormalizedAudio:
+        """The recording as trimmed 16 kHz mono, or unchanged when normalization is off.
+
+        Raises EmptyRecordingError when there is no speech to transcribe.
+        """
+        unchanged = NormalizedAudio(data, filename, content_type, 0.0, 0.0)
+        if not self.active:
+            return unchanged
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+
+        metrics = self._metrics
+        async with self._slots:
+            metrics["submitted"] += 1
+            metrics["bytes_in"] += len(data)
+            started_at = time.perf_counter()
+            try:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._executor, _normalize_audio, data, self.ffmpeg)
+            except EmptyRecordingError:
+                metrics["rejected_empty"] += 1
+                raise
+            except Exception as e:
+                metrics["failed"] += 1
+                metrics["bytes_out"] += len(data)
+                print(f"Audio normalization failed, sending original: {e}")
+                return unchanged
+            finally:
+                metrics["process_seconds_total"] += time.perf_counter() - started_at
+        metrics["completed"] += 1
+        metrics["input_seconds"] += result.input_seconds
+        metrics["speech_seconds"] += result.speech_seconds
+        if len(result.data) >= len(data):
+            # Already compact, e.g. a short mono clip; re-encoding only adds bytes
+            metrics["kept_original"] += 1
+            metrics["bytes_out"] += len(data)
+            return unchanged
+        metrics["bytes_out"] += len(result.data)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool configuration, bytes saved and processing time."""
+        submitted = self._metrics["submitted"]
+        stats: Dict[str, Any] = {
+            "enabled": self.enabled,
+            "ffmpeg": self.ffmpeg,
+            "workers": self.workers,
+            **self._metrics,
+        }
+        for key in ("input_seconds", "speech_seconds", "process_seconds_total"):
+            stats[key] = round(stats[key], 3)
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["process_ms_avg"] = (
+            round(1000 * self._metrics["process_seconds_total"] / submitted, 2) if submitted else 0.0
+        )
+        return stats
+
+
+# Global audio preprocessor instance
+audio_preprocessor = AudioPreprocessor()
@@ -5,7 +5,7 @@ from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from database import get_db, User
+from database import get_db, SessionLocal, User
 import os
 from dotenv import load_dotenv
 
@@ -80,6 +80,24 @@ def get_current_user(
     
     return user
 
+def get_user_from_token(token: str) -> Optional[User]:
+    """Get the active user a bearer token belongs to, or None.
+    
+    For WebSocket connections, where browsers cannot send an Authorization
+    header and the token comes as a query parameter instead.
+    """
+    email = verify_token(token) if token else None
+    if email is None:
+        return None
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+    finally:
+        db.close()
+    if user is None or not user.is_active:
+        return None
+    return user
+
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get the current active user."""
     if not current_user.is_active:
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark audio normalization before transcription.
+
+For each clip, reports the upload size before and after normalization
+(16 kHz mono, silence trimmed, re-encoded), the time normalization takes,
+and the net latency change per clip: upload time saved at --uplink-mbps
+less the normalization time. With --whisper, both versions are also sent
+to the configured Whisper endpoint and the measured latencies compared.
+
+Usage:
+    python benchmarks/bench_audio_normalize.py [--uplink-mbps 2] [--whisper] [--synthetic] [clip ...]
+
+Defaults to the audio files in uploads/. With --synthetic, or when there are
+none, browser-like recordings (stereo 48 kHz Opus webm with silence around
+the speech) are generated with ffmpeg instead.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import asyncio
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_processing import EmptyRecordingError, _ffmpeg, _normalize_audio, audio_preprocessor
+
+AUDIO_EXTENSIONS = ("*.webm", "*.ogg", "*.m4a", "*.mp3", "*.wav")
+
+
+def synthetic_clip(ffmpeg: str, lead: float, speech: float, tail: float, seed: int) -> bytes:
+    """A stereo 48 kHz webm/opus clip: low noise, then speech-like sound, then low noise."""
+    rate = 48000
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(speech * rate)) / rate
+    # Harmonics of a wandering pitch, amplitude-modulated at a syllable rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5
+    voice = 0.3 * voiced * envelope + 0.02 * rng.standard_normal(len(t))
+    noise = lambda seconds: 0.002 * rng.standard_normal(int(seconds * rate))
+    mono = np.concatenate([noise(lead), voice, noise(tail)])
+    stereo = np.stack([mono, mono * 0.9], axis=1)
+    pcm = (np.clip(stereo, -1, 1) * 32767).astype("<i2").tobytes()
+    return _ffmpeg(ffmpeg, [
+        "-f", "s16le", "-ar", str(rate), "-ac", "2", "-i", "pipe:0",
+        "-c:a", "libopus", "-b:a", "128k", "-f", "webm", "pipe:1"
+    ], pcm)
+
+
+async def whisper_latency(data: bytes, filename: str, content_type: str) -> float:
+    from transcription_client import transcription_client
+    started = time.perf_counter()
+    await transcription_client.transcribe(data, filename=filename, content_type=content_type)
+    return time.perf_counter() - started
+
+
+def bench(clips, uplink_mbps: float, whisper: bool):
+    """Print bytes saved and latency change per clip."""
+    ffmpeg = audio_preprocessor.ffmpeg
+    bytes_per_second = uplink_mbps * 1_000_000 / 8
+    print(f"{len(clips)} clip(s), uplink {uplink_mbps} Mbit/s\n")
+    header = f"{'clip':<24}{'in KiB':>9}{'out KiB':>9}{'saved':>8}{'speech s':>10}{'norm ms':>9}{'upload Δ ms':>13}{'net Δ ms':>10}"
+    if whisper:
+        header += f"{'whisper Δ ms':>14}"
+    print(header)
+
+    totals = {"in": 0, "out": 0, "net": 0.0, "normalized": 0}
+    for name, data in clips:
+        name = name if len(name) <= 23 else name[:20] + "..."
+        started = time.perf_counter()
+        try:
+            result = _normalize_audio(data, ffmpeg)
+        except EmptyRecordingError:
+            print(f"{name:<24}{len(data) / 1024:>9.1f}{'rejected as empty (no upstream call)':>49}")
+            totals["in"] += len(data)
+            continue
+        normalize = time.perf_counter() - started
+        upload_delta = (len(result.data) - len(data)) / bytes_per_second
+        net = upload_delta + normalize
+        totals["in"] += len(data)
+        totals["out"] += len(result.data)
+        totals["net"] += net
+        totals["normalized"] += 1
+        line = (
+            f"{name:<24}{len(data) / 1024:>9.1f}{len(result.data) / 1024:>9.1f}"
+            f"{1 - len(result.data) / len(data):>8.0%}{result.speech_seconds:>10.1f}"
+            f"{1000 * normalize:>9.0f}{1000 * upload_delta:>13.0f}{1000 * net:>10.0f}"
+        )
+        if whisper:
+            original = asyncio.run(whisper_latency(data, "recording.webm", "audio/webm"))
+            normalized = asyncio.run(whisper_latency(result.data, result.filename, result.content_type))
+            line += f"{1000 * (normalized + normalize - original):>14.0f}"
+        print(line)
+
+    if totals["in"]:
+        print(f"\nbytes saved: {totals['in'] - totals['out']} of {totals['in']} ({1 - totals['out'] / totals['in']:.0%})")
+    if totals["normalized"]:
+        print(f"mean net latency change per clip: {1000 * totals['net'] / totals['normalized']:.0f} ms (negative is faster)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("clips", nargs="*")
+    parser.add_argument("--uplink-mbps", type=float, default=2.0)
+    parser.add_argument("--whisper", action="store_true", help="also measure latency against the Whisper endpoint")
+    parser.add_argument("--synthetic", action="store_true", help="benchmark generated clips")
+    args = parser.parse_args()
+
+    if audio_preprocessor.ffmpeg is None:
+        print("ffmpeg not found; set FFMPEG_PATH")
+        sys.exit(1)
+
+    paths = args.clips
+    if not paths and not args.synthetic:
+        uploads = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads")
+        paths = sorted(path for pattern in AUDIO_EXTENSIONS for path in glob.glob(os.path.join(uploads, pattern)))
+    if paths:
+        clips = []
+        for path in paths:
+            with open(path, "rb") as f:
+                clips.append((os.path.basename(path), f.read()))
+    else:
+        shapes = [(1.0, 3.0, 1.5), (0.5, 6.0, 2.0), (2.0, 2.0, 2.0), (0.3, 10.0, 0.5), (3.0, 0.0, 0.0)]
+        clips = [
+            (f"synthetic-{lead:g}+{speech:g}+{tail:g}s", synthetic_clip(audio_preprocessor.ffmpeg, lead, speech, tail, seed))
+            for seed, (lead, speech, tail) in enumerate(shapes)
+        ]
+    bench(clips, args.uplink_mbps, args.whisper)
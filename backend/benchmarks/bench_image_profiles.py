@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark image preprocessing per task profile.
+
+Reports CPU time per image and the base64 payload size sent upstream, with and
+without JPEG draft-mode decoding, for every profile in IMAGE_PROFILES.
+
+Usage:
+    python benchmarks/bench_image_profiles.py [image ...]
+
+Defaults to the JPEG files in uploads/.
+"""
+import os
+import sys
+import glob
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processing import IMAGE_PROFILES, _encode_image
+
+
+def bench(paths, repeat=5):
+    """Print CPU ms/image and payload KiB per profile and decode mode."""
+    print(f"{len(paths)} image(s), {repeat} repetition(s)\n")
+    print(f"{'profile':<10}{'size':>6}{'q':>4}{'draft':>7}{'cpu ms/img':>12}{'payload KiB':>13}")
+
+    for name, profile in IMAGE_PROFILES.items():
+        for draft in (False, True):
+            payload = 0
+            started = time.process_time()
+            for _ in range(repeat):
+                for path in paths:
+                    payload += len(_encode_image(path, profile["max_size"], profile["quality"], draft))
+            cpu = time.process_time() - started
+            count = repeat * len(paths)
+            print(
+                f"{name:<10}{profile['max_size']:>6}{profile['quality']:>4}{'yes' if draft else 'no':>7}"
+                f"{1000 * cpu / count:>12.1f}{payload / count / 1024:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    images = sys.argv[1:] or sorted(
+        glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", "*.jpg"))
+    )
+    if not images:
+        print("No images to benchmark")
+        sys.exit(1)
+    bench(images)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark plate extraction from chat and voice-transcribed messages.
+
+Runs the tokenizer-based extractor and the previous regex extractor (with
+its str.replace number conversion) over the utterance corpus in
+plate_utterances.jsonl, and reports top-1 and top-3 accuracy and time per
+message.
+
+Usage:
+    python benchmarks/bench_plate_extractor.py [repeat]
+"""
+import os
+import re
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plate_extractor import extract_plate_candidates
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plate_utterances.jsonl")
+
+
+def legacy_extract(message):
+    """The extractor this module replaced, kept for comparison."""
+    malay_numbers = {
+        'satu': '1', 'dua': '2', 'tiga': '3', 'empat': '4', 'lima': '5',
+        'enam': '6', 'tujuh': '7', 'lapan': '8', 'sembilan': '9', 'sepuluh': '10',
+        'sebelas': '11', 'belas': '', 'puluh': '0'
+    }
+    patterns = [r'([A-Z]{2,3}\s*\d{3,4}\s*[A-Z]?)', r'([A-Z]{2,3}\d{3,4})']
+    for text in (message.upper(), None):
+        if text is None:
+            text = message.lower()
+            for word, digit in malay_numbers.items():
+                text = text.replace(word, digit)
+            text = text.upper()
+        for pattern in patterns:
+            match = re.search(pattern, text)
+            if match:
+                return [match.group(1).replace(" ", "")]
+    return []
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _accuracy(extract, corpus):
+    top1 = top3 = 0
+    for item in corpus:
+        plates = extract(item["utterance"])
+        expected = item["expected"]
+        if expected is None:
+            top1 += not plates
+            top3 += not plates
+        else:
+            top1 += bool(plates) and plates[0] == expected
+            top3 += expected in plates[:3]
+    return top1 / len(corpus), top3 / len(corpus)
+
+
+def _time(extract, corpus, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for item in corpus:
+            extract(item["utterance"])
+    return (time.perf_counter() - started) / (repeat * len(corpus)) * 1e6
+
+
+def bench(repeat=200):
+    """Print accuracy and microseconds per message for both extractors."""
+    corpus = load_corpus()
+    extractors = {
+        "tokenizer": lambda message: [c.plate for c in extract_plate_candidates(message)],
+        "legacy regex": legacy_extract,
+    }
+    print(f"{len(corpus)} utterances, {repeat} repetition(s)\n")
+    print(f"{'extractor':<14}{'top-1':>8}{'top-3':>8}{'us/msg':>10}")
+    for name, extract in extractors.items():
+        top1, top3 = _accuracy(extract, corpus)
+        print(f"{name:<14}{top1:>8.0%}{top3:>8.0%}{_time(extract, corpus, repeat):>10.1f}")
+
+    print("\nMisses:")
+    for item in corpus:
+        candidates = extract_plate_candidates(item["utterance"])
+        plates = [c.plate for c in candidates]
+        if (plates[0] if plates else None) != item["expected"]:
+            print(f"  {item['utterance']!r}: expected {item['expected']}, got {candidates}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
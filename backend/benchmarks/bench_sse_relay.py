@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark relaying a streamed chat completion to SSE clients.
+
+Simulates concurrent upstream streams that deliver one token per network
+read at a fixed rate, writes frames to a local socket as the ASGI server
+would, and compares the per-token relay (json.loads and
+json.dumps for every token, one frame each) with SSERelay, which parses the
+byte stream incrementally and coalesces tokens into frames. Reports CPU
+time per stream and frames sent.
+
+Usage:
+    python benchmarks/bench_sse_relay.py [streams] [tokens] [tokens_per_second]
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sse_relay import SSERelay
+
+TOKEN = "kata "
+
+
+def _event(content):
+    return ("data: " + json.dumps({"choices": [{"delta": {"content": content}}]}) + "\n\n").encode()
+
+
+async def upstream(tokens, rate):
+    """One token event per read, then [DONE]."""
+    for _ in range(tokens):
+        await asyncio.sleep(1 / rate)
+        yield _event(TOKEN)
+    yield b"data: [DONE]\n\n"
+
+
+class SocketSink:
+    """Writes frames to a local socket, as the ASGI server does per frame."""
+
+    async def __aenter__(self):
+        self._client, server = socket.socketpair()
+        _, self.writer = await asyncio.open_connection(sock=self._client)
+        reader, self._server_writer = await asyncio.open_connection(sock=server)
+        self._drain = asyncio.create_task(self._read(reader))
+        return self
+
+    async def _read(self, reader):
+        while await reader.read(65536):
+            pass
+
+    async def send(self, frame):
+        self.writer.write(frame)
+        await self.writer.drain()
+
+    async def __aexit__(self, *exc):
+        self.writer.close()
+        await self._drain
+        self._server_writer.close()
+
+
+async def legacy_stream(tokens, rate):
+    """The previous relay: line split, json.loads and json.dumps per token."""
+    frames = 0
+    async with SocketSink() as sink:
+        async for frame in _legacy_frames(tokens, rate):
+            await sink.send(frame)
+            frames += 1
+    return frames
+
+
+async def _legacy_frames(tokens, rate):
+    async for chunk in upstream(tokens, rate):
+        for line in chunk.split(b"\n"):
+            line_text = line.decode("utf-8").strip()
+            if line_text.startswith("data: "):
+                data_text = line_text[6:]
+                if data_text == "[DONE]":
+                    break
+                data = json.loads(data_text)
+                content = data.get("choices", [{}])[0].get("delta", {}).get("content", "")
+                if content:
+                    yield f"data: {json.dumps({'content': content})}\n\n".encode()
+
+
+async def relay_stream(relay, tokens, rate):
+    frames = 0
+    async with SocketSink() as sink:
+        async for frame in relay.relay(relay.upstream_tokens(upstream(tokens, rate))):
+            await sink.send(frame)
+            frames += 1
+    return frames
+
+
+async def _run(factory, streams):
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    frames = sum(await asyncio.gather(*(factory() for _ in range(streams))))
+    return time.process_time() - cpu, time.perf_counter() - wall, frames
+
+
+def bench(streams=200, tokens=200, rate=100.0):
+    """Print CPU per stream and frames for both relays."""
+    relay = SSERelay()
+    print(f"{streams} concurrent stream(s), {tokens} tokens each at {rate:g} tokens/s\n")
+    print(f"{'relay':<12}{'cpu ms/stream':>15}{'wall s':>9}{'frames':>9}")
+    for name, factory in (
+        ("per-token", lambda: legacy_stream(tokens, rate)),
+        ("coalesced", lambda: relay_stream(relay, tokens, rate)),
+    ):
+        cpu, wall, frames = asyncio.run(_run(factory, streams))
+        print(f"{name:<12}{cpu * 1000 / streams:>15.2f}{wall:>9.2f}{frames:>9}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    bench(
+        int(args[0]) if len(args) > 0 else 200,
+        int(args[1]) if len(args) > 1 else 200,
+        float(args[2]) if len(args) > 2 else 100.0,
+    )
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark VLM response parsing.
+
+Compares the single-pass JSON parser used in structured-output mode with the
+compiled regex fallback for free-form text, per task.
+
+Usage:
+    python benchmarks/bench_vlm_parsers.py [repeat]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec
+import vlm_parsers
+
+SAMPLES = {
+    "plate": {
+        "structured": {
+            "plate_number": "WVA 1234",
+            "vehicle_type": "Kereta penumpang",
+            "vehicle_color": "Putih",
+            "registration_expiry": "2025-06-30",
+            "road_tax_status": "Aktif",
+        },
+        "text": (
+            "PLAT: WVA 1234\nJENIS: Kereta penumpang\nWARNA: Putih\n"
+            "TAMAT: 2025-06-30\nCUKAI: Aktif\n"
+        ),
+    },
+    "license": {
+        "structured": {
+            "name": "AHMAD BIN IBRAHIM",
+            "ic_number": "801234-12-5678",
+            "license_number": "L1234567",
+            "nationality": "MALAYSIA",
+            "class": "B2 - Motokar",
+            "expiry_date": "2030-12-31",
+            "address": "No. 123, Jalan Melati, Taman Sri Skudai, 81300 Skudai, Johor",
+        },
+        "text": (
+            "NAMA: AHMAD BIN IBRAHIM\nIC: 801234-12-5678\nLESEN: L1234567\n"
+            "WARGANEGARA: MALAYSIA\nKELAS: B2 - Motokar\nTAMAT: 2030-12-31\n"
+            "ALAMAT: No. 123, Jalan Melati, Taman Sri Skudai, 81300 Skudai, Johor\n"
+        ),
+    },
+    "accident_image": {
+        "structured": {
+            "vehicle_description": "Kereta penumpang Toyota Camry berwarna putih",
+            "damage_description": "Bampar hadapan kemek, lampu hadapan kanan pecah",
+            "incident_description": "Hentaman hadapan, tanda brek kelihatan di jalan",
+        },
+        "text": (
+            "KENDERAAN: Kereta penumpang Toyota Camry berwarna putih\n"
+            "KEROSAKAN: Bampar hadapan kemek, lampu hadapan kanan pecah\n"
+            "INSIDEN: Hentaman hadapan, tanda brek kelihatan di jalan\n"
+        ),
+    },
+    "accident_photos": {
+        "structured": {
+            "analysis": "Kerosakan bampar hadapan konsisten dengan hentaman hadapan. " * 20,
+            "consistency_score": 0.8,
+            "damage_assessment": "Kerosakan sederhana, anggaran kos pembaikan RM 3,500.",
+        },
+        "text": (
+            "Kerosakan bampar hadapan konsisten dengan hentaman hadapan.\n" * 20
+            + "Consistency score: 8/10\nDamage: moderate front-end damage, estimated RM 3,500.\n"
+        ),
+    },
+}
+
+
+def _time(func, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def bench(repeat=20000):
+    """Print microseconds per parse for the JSON and regex paths."""
+    backend = "orjson" if json_codec.orjson is not None else "json"
+    print(f"JSON backend: {backend}, {repeat} repetition(s)\n")
+    print(f"{'task':<17}{'json us':>10}{'regex us':>10}{'speedup':>9}")
+
+    for task, sample in SAMPLES.items():
+        structured = json_codec.dumps(sample["structured"])
+        json_us = _time(lambda text: vlm_parsers.parse_response(task, text), structured, repeat)
+        regex_us = _time(vlm_parsers._FALLBACK[task], sample["text"], repeat)
+        print(f"{task:<17}{json_us:>10.2f}{regex_us:>10.2f}{regex_us / json_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,99 @@
+import os
+import hashlib
+from typing import Dict, Any, List, Optional
+
+# Static system prompt for /chat. It must stay byte-identical between
+# requests so an upstream with prefix caching can reuse its KV cache; any
+# per-message data goes after the conversation history instead.
+CHAT_SYSTEM_PROMPT = """Anda adalah pembantu AI untuk sistem laporan kemalangan PDRM. Anda membantu pengguna dengan pertanyaan tentang laporan kemalangan, proses tuntutan insurans, dan sebarang pertanyaan berkaitan. Berikan jawapan yang jelas, tepat, dan dalam Bahasa Melayu apabila mungkin. Anda adalah pembantu yang mesra dan profesional.
+
+IMPORTANT: Jika pengguna bertanya tentang saman kereta atau nombor plat kenderaan (seperti "vmx7352", "VMX 7352", "ABC 1234"), anda BOLEH memberikan maklumat saman dari data yang diberikan kepada anda dalam mesej pengguna. Jangan beritahu pengguna yang anda tidak mempunyai akses - gunakan data yang disediakan."""
+
+# Changes whenever the static prompt text changes
+CHAT_PROMPT_VERSION = hashlib.sha256(CHAT_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# Most history messages sent per request. The window start moves in steps
+# of half this size rather than one message per turn, so consecutive turns
+# share the same history prefix.
+HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_MESSAGES", "10"))
+
+_metrics = {
+    "requests": 0,
+    "requests_with_context": 0,
+    "static_prefix_chars": 0,
+    "prompt_chars": 0,
+    "usage_reports": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "first_token_count": 0,
+    "first_token_seconds": 0.0,
+}
+
+
+def history_window(history: Optional[List[dict]], limit: int = HISTORY_MESSAGES) -> List[dict]:
+    """The most recent history messages, with a start that moves in steps."""
+    if not history or limit <= 0:
+        return []
+    step = max(1, limit // 2)
+    excess = len(history) - limit
+    start = -(-excess // step) * step if excess > 0 else 0
+    return history[start:]
+
+
+def build_chat_messages(message: str, history: Optional[List[dict]] = None, context: str = "") -> List[Dict[str, str]]:
+    """Chat messages laid out as static system prompt, history, then the turn.
+
+    ``history`` is sent as given; callers bound it with history_window or a
+    chat session's token budget.
+
+    Per-message context such as saman records is put in the final user
+    message, so everything before it is a prefix shared with earlier turns.
+    """
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+    for msg in history or []:
+        messages.append({
+            "role": msg.get("role", "user"),
+            "content": msg.get("content", "")
+        })
+
+    content = f"{context.strip()}\n\n{message}" if context.strip() else message
+    messages.append({"role": "user", "content": content})
+
+    _metrics["requests"] += 1
+    _metrics["requests_with_context"] += bool(context.strip())
+    _metrics["static_prefix_chars"] += len(CHAT_SYSTEM_PROMPT)
+    _metrics["prompt_chars"] += sum(len(msg["content"]) for msg in messages)
+    return messages
+
+
+def record_usage(usage: Optional[Dict[str, Any]]):
+    """Record prompt and cached token counts reported by the upstream."""
+    if not usage:
+        return
+    details = usage.get("prompt_tokens_details") or {}
+    _metrics["usage_reports"] += 1
+    _metrics["prompt_tokens"] += int(usage.get("prompt_tokens") or 0)
+    _metrics["cached_tokens"] += int(details.get("cached_tokens") or 0)
+
+
+def record_first_token(seconds: float):
+    """Record the time from sending a streamed request to its first content."""
+    _metrics["first_token_count"] += 1
+    _metrics["first_token_seconds"] += seconds
+
+
+def prompt_stats() -> Dict[str, Any]:
+    """Prompt version, static prefix share and upstream prefix cache reuse."""
+    stats = dict(_metrics)
+    stats["prompt_version"] = CHAT_PROMPT_VERSION
+    stats["static_prefix_ratio"] = (
+        round(stats["static_prefix_chars"] / stats["prompt_chars"], 4) if stats["prompt_chars"] else None
+    )
+    # Share of prompt tokens the upstream served from its prefix cache
+    stats["cached_token_ratio"] = (
+        round(stats["cached_tokens"] / stats["prompt_tokens"], 4) if stats["prompt_tokens"] else None
+    )
+    stats["avg_first_token_seconds"] = (
+        round(stats["first_token_seconds"] / stats["first_token_count"], 4) if stats["first_token_count"] else None
+    )
+    return stats
@@ -0,0 +1,324 @@
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Dict, Any, List, NamedTuple, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Characters per token when no tokenizer is available; close to what BPE
+# tokenizers give for Malay and English text
+_CHARS_PER_TOKEN = 3.5
+
+# tiktoken downloads its encoding on first use, which can hang or fail
+# offline, so it is loaded in a background thread on first need and token
+# counts are estimated until it is ready
+_encoding = None
+_encoding_loader: Optional[threading.Thread] = None
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding():
+    global _encoding
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(os.getenv("CHAT_TOKENIZER", "cl100k_base"))
+    except Exception as e:
+        print(f"Tokenizer unavailable, estimating token counts: {e}")
+
+
+def _tokenizer():
+    """The tiktoken encoding once loaded, else None; starts loading it on first call."""
+    global _encoding_loader
+    if _encoding_loader is None:
+        with _encoding_lock:
+            if _encoding_loader is None:
+                _encoding_loader = threading.Thread(target=_load_encoding, name="tokenizer-load", daemon=True)
+                _encoding_loader.start()
+    return _encoding
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    summarized_upto INTEGER NOT NULL DEFAULT 0,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    tokens INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE INDEX IF NOT EXISTS chat_sessions_expires ON chat_sessions (expires_at);
+"""
+
+SUMMARY_PREFIX = "Ringkasan perbualan terdahulu:\n"
+SUMMARY_ACK = "Baik, saya akan mengambil kira ringkasan ini."
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text, exact with tiktoken and estimated otherwise."""
+    encoding = _tokenizer()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return int(len(text) / _CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Text cut down to about ``tokens`` tokens, keeping the start."""
+    encoding = _tokenizer()
+    if encoding is not None:
+        encoded = encoding.encode(text, disallowed_special=())
+        if len(encoded) <= tokens:
+            return text
+        return encoding.decode(encoded[:tokens]) + " ..."
+    limit = int(tokens * _CHARS_PER_TOKEN)
+    return text if len(text) <= limit else text[:limit] + " ..."
+
+
+class ChatMessage(NamedTuple):
+    seq: int
+    role: str
+    content: str
+    tokens: int
+
+
+class ChatSession(NamedTuple):
+    id: str
+    summary: str
+    summarized_upto: int
+    messages: List[ChatMessage]  # not yet folded into the summary, oldest first
+
+
+class ChatSessionStore:
+    """Server-side chat history in a local SQLite file.
+
+    Each session holds a running summary plus the messages not yet folded
+    into it. Prompts get the summary and as many recent messages as fit the
+    token budget. When the unsummarized messages outgrow the budget, the
+    oldest are folded into the summary in one step, so the history prefix
+    stays the same between compactions instead of sliding every turn.
+    Sessions expire CHAT_SESSION_TTL seconds after their last message.
+    """
+
+    def __init__(self):
+        self.path = os.getenv("CHAT_SESSION_DB", "") or os.path.join(os.path.dirname(__file__), "chat_sessions.db")
+        self.ttl = float(os.getenv("CHAT_SESSION_TTL", "86400"))
+        self.token_budget = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+        self.summary_tokens = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self._metrics = {
+            "sessions_created": 0,
+            "sessions_expired": 0,
+            "messages_stored": 0,
+            "messages_trimmed": 0,
+            "compactions": 0,
+            "compaction_failures": 0,
+        }
+
+    def _db(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _purge_expired(self, db: sqlite3.Connection, now: float):
+        """Drop expired sessions, at most once a minute."""
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        expired = [row[0] for row in db.execute("SELECT id FROM chat_sessions WHERE expires_at < ?", (now,))]
+        for session_id in expired:
+            db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+            db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+        self._metrics["sessions_expired"] += len(expired)
+
+    def _create(self, user_id: int) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            self._purge_expired(db, now)
+            db.execute(
+                "INSERT INTO chat_sessions (id, user_id, expires_at) VALUES (?, ?, ?)",
+                (session_id, user_id, now + self.ttl)
+            )
+        self._metrics["sessions_created"] += 1
+        return session_id
+
+    def _get(self, session_id: str, user_id: int) -> Optional[ChatSession]:
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT summary, summarized_upto FROM chat_sessions WHERE id = ? AND user_id = ? AND expires_at >= ?",
+                (session_id, user_id, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            messages = [
+                ChatMessage(*message) for message in db.execute(
+                    "SELECT seq, role, content, tokens FROM chat_messages WHERE session_id = ? AND seq > ? ORDER BY seq",
+                    (session_id, row[1])
+                )
+            ]
+        return ChatSession(session_id, row[0], row[1], messages)
+
+    def _append(self, session_id: str, messages: List[Dict[str, str]]):
+        rows = [(message["role"], message["content"], count_tokens(message["content"])) for message in messages]
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                # Folded messages are deleted, so continue after the summary too
+                last = db.execute(
+                    "SELECT MAX(summarized_upto, (SELECT COALESCE(MAX(seq), 0) FROM chat_messages WHERE session_id = ?)) "
+                    "FROM chat_sessions WHERE id = ?",
+                    (session_id, session_id)
+                ).fetchone()[0]
+                db.executemany(
+                    "INSERT INTO chat_messages (session_id, seq, role, content, tokens) VALUES (?, ?, ?, ?, ?)",
+                    [(session_id, last + offset, *row) for offset, row in enumerate(rows, 1)]
+                )
+                db.execute("UPDATE chat_sessions SET expires_at = ? WHERE id = ?", (time.time() + self.ttl, session_id))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        self._metrics["messages_stored"] += len(rows)
+
+    def _store_summary(self, session_id: str, summary: str, previous_upto: int, upto: int) -> bool:
+        """Save a new summary unless another compaction got there first."""
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN")
+            try:
+                updated = db.execute(
+                    "UPDATE chat_sessions SET summary = ?, summarized_upto = ? WHERE id = ? AND summarized_upto = ?",
+                    (summary, upto, session_id, previous_upto)
+                ).rowcount
+                if updated:
+                    db.execute("DELETE FROM chat_messages WHERE session_id = ? AND seq <= ?", (session_id, upto))
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+        return bool(updated)
+
+    def _delete(self, session_id: str, user_id: int) -> bool:
+        with self._lock:
+            db = self._db()
+            deleted = db.execute(
+                "DELETE FROM chat_sessions WHERE id = ? AND user_id = ?", (session_id, user_id)
+            ).rowcount
+            if deleted:
+                db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+        return bool(deleted)
+
+    async def create(self, user_id: int) -> str:
+        """Start a session for a user and return its ID."""
+        return await asyncio.to_thread(self._create, user_id)
+
+    async def get(self, session_id: str, user_id: int) -> Optional[ChatSession]:
+        """A live session owned by the user, or None."""
+        return await asyncio.to_thread(self._get, session_id, user_id)
+
+    async def append(self, session_id: str, messages: List[Dict[str, str]]):
+        """Add messages to a session and extend its expiry."""
+        await asyncio.to_thread(self._append, session_id, messages)
+
+    async def delete(self, session_id: str, user_id: int) -> bool:
+        """Delete a session owned by the user."""
+        return await asyncio.to_thread(self._delete, session_id, user_id)
+
+    def history(self, session: ChatSession) -> List[Dict[str, str]]:
+        """Prompt history: the summary, then recent messages within the token budget."""
+        history = []
+        if session.summary:
+            history.append({"role": "user", "content": SUMMARY_PREFIX + session.summary})
+            history.append({"role": "assistant", "content": SUMMARY_ACK})
+
+        recent: List[Dict[str, str]] = []
+        used = 0
+        for message in reversed(session.messages):
+            if used + message.tokens > self.token_budget:
+                if not recent:
+                    # A single message larger than the budget is cut down
+                    recent.append({"role": message.role, "content": truncate_to_tokens(message.content, self.token_budget)})
+                self._metrics["messages_trimmed"] += len(session.messages) - len(recent)
+                break
+            recent.append({"role": message.role, "content": message.content})
+            used += message.tokens
+        return history + recent[::-1]
+
+    def needs_compaction(self, session: ChatSession) -> bool:
+        return sum(message.tokens for message in session.messages) > self.token_budget
+
+    async def compact(
+        self,
+        session_id: str,
+        user_id: int,
+        summarize: Callable[[str, List[ChatMessage]], Awaitable[str]]
+    ) -> bool:
+        """Fold the oldest messages into the summary once they outgrow the budget.
+
+        Messages are folded until what remains fits in half the budget, so
+        compaction runs every few turns rather than on each one.
+        ``summarize(previous_summary, messages)`` returns the new summary.
+        """
+        session = await self.get(session_id, user_id)
+        if session is None or not self.needs_compaction(session):
+            return False
+
+        remaining = sum(message.tokens for message in session.messages)
+        folded = []
+        for message in session.messages[:-1]:
+            if remaining <= self.token_budget // 2:
+                break
+            folded.append(message)
+            remaining -= message.tokens
+        if not folded:
+            return False
+
+        try:
+            summary = await summarize(session.summary, folded)
+        except Exception:
+            self._metrics["compaction_failures"] += 1
+            raise
+        summary = truncate_to_tokens(summary.strip(), self.summary_tokens)
+        stored = await asyncio.to_thread(
+            self._store_summary, session_id, summary, session.summarized_upto, folded[-1].seq
+        )
+        if stored:
+            self._metrics["compactions"] += 1
+        return stored
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            connection, self._connection = self._connection, None
+            if connection is not None:
+                connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Session counters and the token counter in use."""
+        return {
+            "tokenizer": _encoding.name if _encoding is not None else "estimate",
+            "token_budget": self.token_budget,
+            **self._metrics,
+        }
+
+
+# Global chat session store
+chat_sessions = ChatSessionStore()
@@ -0,0 +1,78 @@
+import os
+from typing import Any, Dict, Optional
+
+
+class StreamSlot:
+    """One user's claim on a concurrent chat stream; release is idempotent."""
+
+    def __init__(self, tracker: "ChatStreamTracker", user_id: int):
+        self._tracker = tracker
+        self._user_id = user_id
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._tracker._release(self._user_id)
+
+
+class ChatStreamTracker:
+    """Per-user cap on concurrent /chat streams, and what abandoned streams saved.
+
+    A stream is abandoned when the client disconnects before the upstream
+    finishes. The upstream request is then closed, so the model stops
+    generating; tokens saved are estimated as max_tokens less the tokens
+    already generated, an upper bound since the answer may have ended sooner.
+    """
+
+    def __init__(self):
+        self.max_per_user = int(os.getenv("CHAT_MAX_STREAMS_PER_USER", "3"))
+        self._active: Dict[int, int] = {}
+        self._metrics = {
+            "streams": 0,
+            "rejected": 0,
+            # Streams relayed from the model; fast-path answers are not counted
+            "completed": 0,
+            "abandoned": 0,
+            "abandoned_tokens_generated": 0,
+            "tokens_saved_estimate": 0,
+        }
+
+    def acquire(self, user_id: int) -> Optional[StreamSlot]:
+        """A stream slot for the user, or None when they are at the cap."""
+        active = self._active.get(user_id, 0)
+        if self.max_per_user > 0 and active >= self.max_per_user:
+            self._metrics["rejected"] += 1
+            return None
+        self._active[user_id] = active + 1
+        self._metrics["streams"] += 1
+        return StreamSlot(self, user_id)
+
+    def _release(self, user_id: int):
+        active = self._active.get(user_id, 0) - 1
+        if active > 0:
+            self._active[user_id] = active
+        else:
+            self._active.pop(user_id, None)
+
+    def record_completed(self):
+        self._metrics["completed"] += 1
+
+    def record_abandoned(self, generated: int, max_tokens: int):
+        """Record a stream whose client left after ``generated`` tokens."""
+        self._metrics["abandoned"] += 1
+        self._metrics["abandoned_tokens_generated"] += generated
+        self._metrics["tokens_saved_estimate"] += max(0, max_tokens - generated)
+
+    def stats(self) -> Dict[str, Any]:
+        """Stream counts, active streams and abandoned-stream savings."""
+        return {
+            "max_per_user": self.max_per_user,
+            "active_streams": sum(self._active.values()),
+            "active_users": len(self._active),
+            **self._metrics,
+        }
+
+
+# Global chat stream tracker
+chat_streams = ChatStreamTracker()
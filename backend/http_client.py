@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import aiohttp
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, Any, Optional, AsyncIterator
+from dotenv import load_dotenv
+from resilience import get_breaker, call_with_retries
+
+load_dotenv()
+
+# Default connection settings per upstream. Each value can be overridden with
+# an environment variable named <UPSTREAM>_HTTP_<SETTING>, e.g.
+# VLM_HTTP_LIMIT=64 or WHISPER_HTTP_READ_TIMEOUT=120. ``retries`` applies to
+# idempotent requests that fail with a transient error.
+UPSTREAM_DEFAULTS = {
+    "vlm": {"limit": 32, "keepalive": 60.0, "connect_timeout": 5.0, "read_timeout": 120.0, "total_timeout": 180.0, "retries": 1},
+    "llm": {"limit": 32, "keepalive": 60.0, "connect_timeout": 5.0, "read_timeout": 120.0, "total_timeout": 180.0, "retries": 2},
+    "chat": {"limit": 64, "keepalive": 60.0, "connect_timeout": 5.0, "read_timeout": 120.0, "total_timeout": 300.0, "retries": 1},
+    "whisper": {"limit": 16, "keepalive": 60.0, "connect_timeout": 5.0, "read_timeout": 60.0, "total_timeout": 90.0, "retries": 2},
+}
+
+
+def _upstream_settings(name: str) -> Dict[str, Any]:
+    """Resolve connection settings for an upstream, applying env overrides."""
+    settings = dict(UPSTREAM_DEFAULTS.get(name, UPSTREAM_DEFAULTS["llm"]))
+    prefix = f"{name.upper()}_HTTP_"
+    for key, default in settings.items():
+        value = os.getenv(prefix + key.upper())
+        if value:
+            settings[key] = type(default)(value)
+    return settings
+
+
+class UpstreamError(Exception):
+    """Non-200 response from an upstream service."""
+
+    def __init__(self, status: int, body: str):
+        super().__init__(f"{status} - {body}")
+        self.status = status
+        self.body = body
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether a failed upstream call is worth retrying."""
+    if isinstance(error, UpstreamError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+
+class UpstreamHTTPClient:
+    """Application-scoped pool of aiohttp sessions, one per upstream service."""
+
+    def __init__(self):
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._settings: Dict[str, Dict[str, Any]] = {}
+
+    async def start(self):
+        """Create the pooled sessions. Called from the FastAPI startup hook."""
+        for name in UPSTREAM_DEFAULTS:
+            self.session(name)
+
+    async def close(self):
+        """Close all sessions and their connection pools. Called on shutdown."""
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            if not session.closed:
+                await session.close()
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """Return the shared session for an upstream, creating it on first use."""
+        session = self._sessions.get(name)
+        if session is None or session.closed:
+            session = self._create_session(name)
+            self._sessions[name] = session
+        return session
+
+    async def post_json(
+        self,
+        name: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        idempotent: bool = True
+    ) -> Dict[str, Any]:
+        """
+        POST a JSON payload to an upstream and return the decoded JSON body.
+        The call goes through the upstream's circuit breaker, is bounded by the
+        current request deadline and, if idempotent, is retried on transient
+        failures.
+        """
+        async def attempt(remaining: Optional[float]) -> Dict[str, Any]:
+            session = self.session(name)
+            async with session.post(url, headers=headers, json=payload, **self._timeout_kwargs(name, remaining)) as response:
+                if response.status != 200:
+                    raise UpstreamError(response.status, await response.text())
+                return await response.json(content_type=None)
+
+        retries = self._settings_for(name)["retries"] if idempotent else 0
+        return await call_with_retries(get_breaker(name), attempt, retries, is_transient_error)
+
+    async def post_form(
+        self,
+        name: str,
+        url: str,
+        form_factory: Callable[[], aiohttp.FormData],
+        headers: Optional[Dict[str, str]] = None,
+        idempotent: bool = True
+    ) -> Dict[str, Any]:
+        """
+        POST multipart form data to an upstream and return the decoded JSON
+        body, with the same breaker, deadline and retry policy as post_json.
+        A FormData can only be sent once, so ``form_factory`` builds a fresh
+        one for every attempt.
+        """
+        async def attempt(remaining: Optional[float]) -> Dict[str, Any]:
+            session = self.session(name)
+            async with session.post(url, headers=headers, data=form_factory(), **self._timeout_kwargs(name, remaining)) as response:
+                if response.status != 200:
+                    raise UpstreamError(response.status, await response.text())
+                return await response.json(content_type=None)
+
+        retries = self._settings_for(name)["retries"] if idempotent else 0
+        return await call_with_retries(get_breaker(name), attempt, retries, is_transient_error)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        name: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Open a streaming POST through the upstream's circuit breaker.
+        Yields the response once headers arrive. Streams are never retried,
+        and the connection is closed rather than reused if the consumer stops
+        before the body is fully read.
+        """
+        breaker = get_breaker(name)
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            response = await self.session(name).post(url, headers=headers, json=payload)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.record(not is_transient_error(e), time.monotonic() - started)
+            raise
+        breaker.record(response.status < 500, time.monotonic() - started)
+
+        try:
+            yield response
+        except BaseException:
+            response.close()
+            raise
+        else:
+            response.release()
+
+    def _settings_for(self, name: str) -> Dict[str, Any]:
+        settings = self._settings.get(name)
+        if settings is None:
+            settings = self._settings[name] = _upstream_settings(name)
+        return settings
+
+    def _timeout_kwargs(self, name: str, remaining: Optional[float]) -> Dict[str, Any]:
+        """Per-request timeout that also respects the request deadline."""
+        if remaining is None:
+            return {}
+        settings = self._settings_for(name)
+        return {"timeout": aiohttp.ClientTimeout(
+            total=min(remaining, settings["total_timeout"]),
+            connect=settings["connect_timeout"],
+            sock_read=settings["read_timeout"],
+        )}
+
+    def _create_session(self, name: str) -> aiohttp.ClientSession:
+        settings = self._settings_for(name)
+        connector = aiohttp.TCPConnector(
+            limit=settings["limit"],
+            limit_per_host=settings["limit"],
+            keepalive_timeout=settings["keepalive"],
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=settings["total_timeout"],
+            connect=settings["connect_timeout"],
+            sock_read=settings["read_timeout"],
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool usage per upstream."""
+        result = {}
+        for name, session in self._sessions.items():
+            connector: Optional[aiohttp.TCPConnector] = session.connector
+            result[name] = {
+                "closed": session.closed,
+                "limit": connector.limit if connector else 0,
+                "acquired": len(getattr(connector, "_acquired", ())) if connector else 0,
+            }
+        return result
+
+
+# Global upstream HTTP client instance
+http_client = UpstreamHTTPClient()
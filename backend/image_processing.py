@@ -0,0 +1,147 @@
+import os
+import time
+import asyncio
+import base64
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Optional
+from PIL import Image
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Target long edge and JPEG quality per analysis task. Plates only need enough
+# resolution to read characters; damage assessment benefits from more detail.
+IMAGE_PROFILES = {
+    "default": {"max_size": 1024, "quality": 85},
+    "plate": {"max_size": 768, "quality": 80},
+    "license": {"max_size": 1024, "quality": 85},
+    "damage": {"max_size": 1280, "quality": 85},
+}
+
+
+def _encode_image(source, max_size: int = 1024, quality: int = 85, draft: bool = True) -> str:
+    """Decode, downscale and re-encode an image as base64 JPEG.
+
+    Runs inside a worker process, so it must stay a picklable module-level
+    function and only take plain arguments (a file path or raw bytes).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    with Image.open(source) as img:
+        # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding, so a
+        # 12MP phone photo is never fully decoded just to be thumbnailed.
+        # The result is still at least max_size on the long edge.
+        if draft and img.format == "JPEG":
+            img.draft("RGB", (max_size, max_size))
+
+        # Resize image if too large
+        if img.width > max_size or img.height > max_size:
+            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+        # Convert to RGB if necessary
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        buffer = BytesIO()
+        img.save(buffer, format='JPEG', quality=quality)
+        return base64.b64encode(buffer.getvalue()).decode()
+
+
+class ImagePreprocessor:
+    """Process-pool stage that keeps image decoding off the event loop."""
+
+    def __init__(self):
+        self.workers = int(os.getenv("IMAGE_POOL_WORKERS", str(os.cpu_count() or 2)))
+        self.max_queue = int(os.getenv("IMAGE_POOL_MAX_QUEUE", str(max(1, self.workers) * 4)))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "waiting": 0,
+            "encode_seconds_total": 0.0,
+            "encode_seconds_max": 0.0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "payload_bytes_total": 0,
+        }
+
+    def start(self):
+        """Create the worker pool. IMAGE_POOL_WORKERS=0 falls back to a thread."""
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def close(self):
+        """Shut down the worker pool, dropping any queued work."""
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def encode(self, source, profile: str = "default") -> str:
+        """Encode an image path or bytes to base64 JPEG in the worker pool.
+
+        ``profile`` selects the target size and quality from IMAGE_PROFILES.
+
+        At most ``max_queue`` jobs are handed to the pool at once; further
+        callers wait here without blocking the event loop.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue)
+        if self._executor is None:
+            self.start()
+
+        metrics = self._metrics
+        metrics["waiting"] += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            metrics["waiting"] -= 1
+        wait = time.perf_counter() - queued_at
+        metrics["queue_wait_seconds_total"] += wait
+        metrics["queue_wait_seconds_max"] = max(metrics["queue_wait_seconds_max"], wait)
+
+        metrics["submitted"] += 1
+        metrics["in_flight"] += 1
+        started_at = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            settings = IMAGE_PROFILES.get(profile, IMAGE_PROFILES["default"])
+            result = await loop.run_in_executor(
+                self._executor, _encode_image, source, settings["max_size"], settings["quality"]
+            )
+            metrics["completed"] += 1
+            metrics["payload_bytes_total"] += len(result)
+            return result
+        except Exception:
+            metrics["failed"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started_at
+            metrics["in_flight"] -= 1
+            metrics["encode_seconds_total"] += elapsed
+            metrics["encode_seconds_max"] = max(metrics["encode_seconds_max"], elapsed)
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of pool configuration and counters."""
+        finished = self._metrics["completed"] + self._metrics["failed"]
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            **self._metrics,
+            "encode_ms_avg": round(1000 * self._metrics["encode_seconds_total"] / finished, 2) if finished else 0.0,
+            "queue_wait_ms_avg": round(1000 * self._metrics["queue_wait_seconds_total"] / self._metrics["submitted"], 2)
+            if self._metrics["submitted"] else 0.0,
+        }
+
+
+# Global image preprocessor instance
+image_preprocessor = ImagePreprocessor()
@@ -1,123 +1,87 @@
 import os
 import json
-import aiohttp
 import re
-from typing import Dict, Any, Optional, List
+import time
+import asyncio
+import logging
+from typing import Dict, Any, Optional, List, Tuple
 from dotenv import load_dotenv
+from http_client import http_client, UpstreamError
+from singleflight import SingleFlight, fingerprint
+from plate_index import EXACT, CONFUSABLE, PlateMatch
+from saman_reloader import SamanReloader
+from saman_chat import CHAT_ROUTE_STATS, saman_fast_answer
+from plate_extractor import PlateCandidate, extract_plate_candidates, resolve_plate_candidate
+from chat_prompt import CHAT_PROMPT_VERSION, build_chat_messages, history_window, record_usage, record_first_token
+from chat_sessions import ChatMessage, chat_sessions
+from sse_relay import sse_relay, sse_frame
+from chat_streams import chat_streams
+from answer_cache import answer_cache, contains_personal_data
 
 load_dotenv()
 
-# Global car saman data
-CAR_SAMAN_DATA = {}
+logger = logging.getLogger(__name__)
+
+# Ask the chat upstream to report token usage, including prefix cache hits,
+# at the end of a stream
+CHAT_STREAM_USAGE = os.getenv("CHAT_STREAM_USAGE", "1") != "0"
+
+# Instructions for folding older chat turns into a session summary
+CHAT_SUMMARY_PROMPT = (
+    "Anda meringkaskan perbualan antara pengguna dan pembantu AI sistem laporan kemalangan PDRM. "
+    "Kemas kini ringkasan semasa dengan mesej baharu. Kekalkan fakta penting seperti nombor plat, "
+    "nombor laporan, tarikh, jumlah saman dan keputusan yang dibuat. Tulis dalam Bahasa Melayu, "
+    "ringkas dan padat, tanpa mukadimah."
+)
+
+# Car saman data, reloaded in the background when the data file or its deltas change
 CAR_SAMAN_FILE = "car_saman_data.txt"
+saman_reloader = SamanReloader(os.path.join(os.path.dirname(__file__), CAR_SAMAN_FILE))
 
 def load_car_saman_data():
     """Load car saman data from text file."""
-    global CAR_SAMAN_DATA
     try:
-        file_path = os.path.join(os.path.dirname(__file__), CAR_SAMAN_FILE)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    # Skip comments and empty lines
-                    if not line or line.startswith('#'):
-                        continue
-                    # Parse the line
-                    parts = line.split('|')
-                    if len(parts) >= 8:
-                        plate = parts[0].strip()
-                        owner = parts[1].strip()
-                        ic = parts[2].strip()
-                        car_type = parts[3].strip()
-                        total_saman = int(parts[4].strip())
-                        unpaid_saman = int(parts[5].strip())
-                        outstanding = parts[6].strip()
-                        details = parts[7].strip()
-                        
-                        CAR_SAMAN_DATA[plate] = {
-                            "owner": owner,
-                            "ic": ic,
-                            "car_type": car_type,
-                            "total_saman": total_saman,
-                            "unpaid_saman": unpaid_saman,
-                            "outstanding": outstanding,
-                            "details": details
-                        }
-            print(f"Loaded {len(CAR_SAMAN_DATA)} car saman records")
+        if os.path.exists(saman_reloader.source_path):
+            snapshot = saman_reloader.load()
+            print(f"Loaded {len(snapshot.data)} car saman records")
         else:
-            print(f"Car saman data file not found: {file_path}")
+            print(f"Car saman data file not found: {saman_reloader.source_path}")
     except Exception as e:
         print(f"Error loading car saman data: {e}")
 
-def search_car_saman(plate_query: str) -> Optional[Dict[str, Any]]:
-    """Search for car saman data by plate number."""
-    # Normalize the query - remove spaces, uppercase
-    normalized_query = plate_query.replace(" ", "").upper()
-    print(f"[DEBUG] Searching for plate: '{plate_query}' -> normalized: '{normalized_query}'")
-    print(f"[DEBUG] Available plates: {list(CAR_SAMAN_DATA.keys())[:10]}...")
-    
-    # Try exact match first
-    if normalized_query in CAR_SAMAN_DATA:
-        print(f"[DEBUG] Found exact match for {normalized_query}")
-        return CAR_SAMAN_DATA[normalized_query]
-    
-    # Try partial match
-    for plate, data in CAR_SAMAN_DATA.items():
-        if normalized_query in plate or plate in normalized_query:
-            print(f"[DEBUG] Found partial match: query '{normalized_query}' matched plate '{plate}'")
-            return data
-    
-    print(f"[DEBUG] No match found for {normalized_query}")
-    return None
+def search_car_saman_candidates(plate_query: str, limit: int = 5) -> List[PlateMatch]:
+    """Ranked plate matches for a query, tolerating O/0, I/1, B/8 and S/5 mix-ups."""
+    snapshot = saman_reloader.snapshot
+    if snapshot is None:
+        return []
+    return snapshot.index.search(plate_query, limit)
 
-def convert_malay_numbers(text: str) -> str:
-    """Convert Malay number words to digits."""
-    malay_numbers = {
-        'satu': '1', 'dua': '2', 'tiga': '3', 'empat': '4', 'lima': '5',
-        'enam': '6', 'tujuh': '7', 'lapan': '8', 'sembilan': '9', 'sepuluh': '10',
-        'sebelas': '11', 'belas': '', 'puluh': '0'
-    }
-    
-    text_lower = text.lower()
-    for word, digit in malay_numbers.items():
-        text_lower = text_lower.replace(word, digit)
-    
-    return text_lower
+def search_car_saman(plate_query: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Search for car saman data by plate number.
+    Returns the matched plate and its record for an exact match or an O/0,
+    I/1, B/8, S/5 mix-up only. A fuzzy or prefix match is another vehicle,
+    so its record is never returned; use search_car_saman_candidates to
+    suggest those plates instead.
+    """
+    # Read the snapshot once so a concurrent reload cannot mix two versions
+    snapshot = saman_reloader.snapshot
+    matches = snapshot.index.search(plate_query, 1) if snapshot else []
+    if not matches or matches[0].kind not in (EXACT, CONFUSABLE):
+        return None
+    return matches[0].plate, snapshot.data[matches[0].plate]
+
+def message_plate_candidate(message: str, snapshot) -> Optional[PlateCandidate]:
+    """The plate a user message refers to, preferring one with a saman record."""
+    candidates = extract_plate_candidates(message)
+    candidate = resolve_plate_candidate(candidates, snapshot.index if snapshot else None)
+    logger.debug("Plate candidates: %d, resolved: %s", len(candidates), candidate.plate if candidate else None)
+    return candidate
 
 def extract_plate_from_message(message: str) -> Optional[str]:
     """Extract license plate number from user message."""
-    # Common Malaysian plate patterns
-    patterns = [
-        r'([A-Z]{2,3}\s*\d{3,4}\s*[A-Z]?)',  # e.g., VMX 7352, ABC 1234
-        r'([A-Z]{2,3}\d{3,4})',  # e.g., VMX7352
-    ]
-    
-    message_upper = message.upper()
-    print(f"[DEBUG] Extracting plate from message: {message}")
-    
-    # Try direct extraction first
-    for pattern in patterns:
-        match = re.search(pattern, message_upper)
-        if match:
-            plate = match.group(1).replace(" ", "")
-            print(f"[DEBUG] Plate extracted (direct): {plate}")
-            return plate
-    
-    # Try with Malay number conversion
-    message_with_numbers = convert_malay_numbers(message)
-    message_with_numbers_upper = message_with_numbers.upper()
-    print(f"[DEBUG] Message after number conversion: {message_with_numbers_upper}")
-    
-    for pattern in patterns:
-        match = re.search(pattern, message_with_numbers_upper)
-        if match:
-            plate = match.group(1).replace(" ", "")
-            print(f"[DEBUG] Plate extracted (after number conversion): {plate}")
-            return plate
-            return match.group(1).replace(" ", "")
-    
-    return None
+    candidate = message_plate_candidate(message, saman_reloader.snapshot)
+    return candidate.plate if candidate else None
 
 # Load car saman data on module import
 load_car_saman_data()
@@ -127,6 +91,25 @@ class LLMService:
         self.api_key = os.getenv("OPENAI_API_KEY", "not-required-for-local")
         self.api_base_url = os.getenv("OPENAI_API_BASE_URL", "http://192.168.50.125:5501/v1")
         self.model = os.getenv("OPENAI_MODEL", "Qwen3-14B")
+        self.singleflight = SingleFlight()
+        # Background session compactions by session ID
+        self._compactions: Dict[str, asyncio.Task] = {}
+    
+    async def _post_json(
+        self,
+        upstream: str,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        POST a payload upstream and return the JSON response.
+        Concurrent requests with an identical payload share one upstream call.
+        """
+        key = fingerprint(upstream, url, payload)
+        return await self.singleflight.do(
+            key, lambda: http_client.post_json(upstream, url, payload, headers)
+        )
         
     async def analyze_report_discrepancies(
         self,
@@ -262,22 +245,17 @@ PENTING: Kembalikan hanya respons JSON, tiada teks tambahan. SEMUA KANDUNGAN ANA
                 "response_format": {"type": "json_object"}
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.api_base_url}/chat/completions", headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result.get("choices", [{}])[0].get("message", {}).get("content", "{}")
-                        
-                        # Parse JSON response
-                        try:
-                            analysis_result = json.loads(content)
-                            return self._validate_and_clean_response(analysis_result)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, extract key information manually
-                            return self._parse_text_response(content)
-                    else:
-                        raise Exception(f"LLM API error: {response.status}")
-                        
+            result = await self._post_json("llm", f"{self.api_base_url}/chat/completions", payload, headers)
+            content = result.get("choices", [{}])[0].get("message", {}).get("content", "{}")
+            
+            # Parse JSON response
+            try:
+                analysis_result = json.loads(content)
+                return self._validate_and_clean_response(analysis_result)
+            except json.JSONDecodeError:
+                # If JSON parsing fails, extract key information manually
+                return self._parse_text_response(content)
+            
         except Exception as e:
             print(f"LLM API call failed: {str(e)}, falling back to mock analysis")
             return await self._mock_llm_analysis({}, {}, {})
@@ -404,48 +382,101 @@ Penemuan Utama:
             "supporting_evidence": mock_evidence
         }
     
-    def _build_saman_context(self, message: str) -> str:
-        """Build saman context from the message if a plate number is detected."""
-        plate = extract_plate_from_message(message)
+    def _build_saman_context(self, plate: Optional[str]) -> str:
+        """Build saman context for the plate detected in the message, if any."""
         if not plate:
-            print("[DEBUG] No plate extracted from message")
-            return ""
-        
-        saman_data = search_car_saman(plate)
-        if not saman_data:
-            print(f"[DEBUG] No saman data found for plate: {plate}")
             return ""
         
-        context = f"""
-        
-        === DATA SAMAN KENDERAAN ===
-        Nombor Plat: {plate}
-        Nama Pemilik: {saman_data['owner']}
-        No. IC: {saman_data['ic']}
-        Jenis Kereta: {saman_data['car_type']}
-        Jumlah Saman: {saman_data['total_saman']}
-        Saman Belum Bayar: {saman_data['unpaid_saman']}
-        Jumlah Tunggakan: {saman_data['outstanding']}
-        Butiran Saman: {saman_data['details']}
+        found = search_car_saman(plate)
+        if found is None:
+            # Near misses are other vehicles: offer their plates, never their records
+            suggestions = [match.plate for match in search_car_saman_candidates(plate, 3)]
+            if not suggestions:
+                return ""
+            return f"""=== DATA SAMAN KENDERAAN ===
+Tiada rekod saman untuk nombor plat {plate}.
+Nombor plat yang hampir: {", ".join(suggestions)}
+
+TANYA PENGGUNA SAMA ADA MEREKA MAKSUDKAN SALAH SATU NOMBOR PLAT DI ATAS. JANGAN BERIKAN SEBARANG MAKLUMAT PEMILIK."""
         
-        GUNAKAN DATA DI ATAS UNTUK MENJAWAB SOALAN MENGENAI SAMAN KENDERAAN INI.
-        """
-        print(f"[DEBUG] Built saman context for plate {plate}")
+        matched_plate, saman_data = found
+        context = f"""=== DATA SAMAN KENDERAAN ===
+Nombor Plat: {matched_plate}
+Nama Pemilik: {saman_data['owner']}
+No. IC: {saman_data['ic']}
+Jenis Kereta: {saman_data['car_type']}
+Jumlah Saman: {saman_data['total_saman']}
+Saman Belum Bayar: {saman_data['unpaid_saman']}
+Jumlah Tunggakan: {saman_data['outstanding']}
+Butiran Saman: {saman_data['details']}
+
+GUNAKAN DATA DI ATAS UNTUK MENJAWAB SOALAN MENGENAI SAMAN KENDERAAN INI."""
         return context
     
-    def _get_system_prompt(self, message: str) -> str:
-        """Get the appropriate system prompt, including saman data if relevant."""
-        base_prompt = """Anda adalah pembantu AI untuk sistem laporan kemalangan PDRM. Anda membantu pengguna dengan pertanyaan tentang laporan kemalangan, proses tuntutan insurans, dan sebarang pertanyaan berkaitan. Berikan jawapan yang jelas, tepat, dan dalam Bahasa Melayu apabila mungkin. Anda adalah pembantu yang mesra dan profesional.
-
-IMPORTANT: Jika pengguna bertanya tentang saman kereta atau nombor plat kenderaan (seperti "vmx7352", "VMX 7352", "ABC 1234"), anda BOLEH memberikan maklumat saman dari data yang diberikan kepada anda. Jangan beritahu pengguna yang anda tidak mempunyai akses - gunakan data yang disediakan."""
-        
-        # Add saman context if plate number is detected
-        saman_context = self._build_saman_context(message)
-        if saman_context:
-            base_prompt = base_prompt + saman_context
-            print(f"[DEBUG] Added saman context to prompt. Total length: {len(base_prompt)}")
-        
-        return base_prompt
+    def _chat_endpoint(self):
+        """URL, model and headers for chat, which uses the VLM API configuration."""
+        vlm_api_key = os.getenv("VLM_API_KEY", "sk-2iTJBlqeaDWPTmGHm-kfbg")
+        vlm_api_url = os.getenv("VLM_API_URL", "http://60.51.17.97:9999/v1/chat/completions")
+        vlm_model = os.getenv("VLM_MODEL", "qwen3.5-397b-a17b-fp8-instruct")
+        headers = {
+            "Authorization": f"Bearer {vlm_api_key}",
+            "Content-Type": "application/json"
+        }
+        return vlm_api_url, vlm_model, headers
+    
+    async def _summarize_history(self, summary: str, messages: List[ChatMessage]) -> str:
+        """Fold older chat messages into the running session summary."""
+        vlm_api_url, vlm_model, headers = self._chat_endpoint()
+        transcript = "\n".join(f"{message.role}: {message.content}" for message in messages)
+        payload = {
+            "model": vlm_model,
+            "messages": [
+                {"role": "system", "content": CHAT_SUMMARY_PROMPT},
+                {"role": "user", "content": f"Ringkasan semasa:\n{summary or '(tiada)'}\n\nMesej baharu:\n{transcript}"}
+            ],
+            "max_tokens": chat_sessions.summary_tokens,
+            "temperature": 0.2
+        }
+        result = await self._post_json("chat", vlm_api_url, payload, headers)
+        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+        if not content:
+            raise ValueError("Empty summary from chat upstream")
+        return content
+    
+    async def _compact_session(self, session_id: str, user_id: int):
+        try:
+            await chat_sessions.compact(session_id, user_id, self._summarize_history)
+        except Exception as e:
+            print(f"Chat session compaction failed for {session_id}: {str(e)}")
+        finally:
+            self._compactions.pop(session_id, None)
+    
+    async def _save_turn(self, session_id: str, user_id: int, message: str, answer: str):
+        """Store a finished turn and fold old history into the summary in the background."""
+        await chat_sessions.append(session_id, [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": answer}
+        ])
+        if session_id not in self._compactions:
+            self._compactions[session_id] = asyncio.create_task(self._compact_session(session_id, user_id))
+    
+    def _answer_cache_namespace(self, message: str, plate: Optional[str], history: list, model: str) -> Optional[str]:
+        """
+        Answer cache namespace for a turn whose answer can be shared, or None.
+        Only the first turn of a conversation qualifies, since later answers
+        depend on the history, and messages naming a plate or holding personal
+        data such as an IC number never do.
+        """
+        if not answer_cache.enabled:
+            return None
+        if history or plate or contains_personal_data(message):
+            answer_cache.record_skip()
+            return None
+        return f"{model}:{CHAT_PROMPT_VERSION}"
+    
+    def _build_chat_messages(self, message: str, conversation_history: list = None, plate: Optional[str] = None) -> list:
+        """Chat messages with the static system prompt first and saman data, if any, in the last turn."""
+        return build_chat_messages(message, conversation_history, self._build_saman_context(plate))
     
     async def chat(self, message: str, conversation_history: list = None) -> str:
         """
@@ -454,37 +485,31 @@ IMPORTANT: Jika pengguna bertanya tentang saman kereta atau nombor plat kenderaa
         Uses VLM API configuration.
         """
         try:
-            # Use VLM API configuration
-            vlm_api_key = os.getenv("VLM_API_KEY", "sk-2iTJBlqeaDWPTmGHm-kfbg")
-            vlm_api_url = os.getenv("VLM_API_URL", "http://60.51.17.97:9999/v1/chat/completions")
-            vlm_model = os.getenv("VLM_MODEL", "qwen3.5-397b-a17b-fp8-instruct")
+            # The plate is extracted once per turn and shared by every route
+            snapshot = saman_reloader.snapshot
+            candidate = message_plate_candidate(message, snapshot)
+            plate = candidate.plate if candidate else None
             
-            headers = {
-                "Authorization": f"Bearer {vlm_api_key}",
-                "Content-Type": "application/json"
-            }
+            # Plain summons lookups are answered from the saman data directly
+            fast_answer = saman_fast_answer(message, snapshot, candidate)
+            if fast_answer is not None:
+                CHAT_ROUTE_STATS["saman_fast_path"] += 1
+                return "".join(fast_answer)
             
-            # Build conversation messages
-            messages = [
-                {
-                    "role": "system",
-                    "content": self._get_system_prompt(message)
-                }
-            ]
+            vlm_api_url, vlm_model, headers = self._chat_endpoint()
+            history = history_window(conversation_history)
             
-            # Add conversation history if provided
-            if conversation_history:
-                for msg in conversation_history[-10:]:  # Limit to last 10 messages
-                    messages.append({
-                        "role": msg.get("role", "user"),
-                        "content": msg.get("content", "")
-                    })
+            # Frequently asked questions are answered from the answer cache
+            cache_namespace = self._answer_cache_namespace(message, plate, history, vlm_model)
+            if cache_namespace is not None:
+                cached = answer_cache.lookup(message, cache_namespace)
+                if cached is not None:
+                    CHAT_ROUTE_STATS["answer_cache"] += 1
+                    return cached
+            CHAT_ROUTE_STATS["llm"] += 1
             
-            # Add current message
-            messages.append({
-                "role": "user",
-                "content": message
-            })
+            # Static system prompt first so the upstream can reuse its cached prefix
+            messages = self._build_chat_messages(message, history, plate)
             
             payload = {
                 "model": vlm_model,
@@ -493,58 +518,73 @@ IMPORTANT: Jika pengguna bertanya tentang saman kereta atau nombor plat kenderaa
                 "temperature": 0.7
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(vlm_api_url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        return content if content else "Maaf, saya tidak dapat menjawab pada masa ini."
-                    else:
-                        error_text = await response.text()
-                        print(f"Chat API error: {response.status} - {error_text}")
-                        return "Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi."
-                        
+            try:
+                result = await self._post_json("chat", vlm_api_url, payload, headers)
+            except UpstreamError as e:
+                print(f"Chat API error: {str(e)}")
+                return "Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi."
+            
+            record_usage(result.get("usage"))
+            content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            if not content:
+                return "Maaf, saya tidak dapat menjawab pada masa ini."
+            if cache_namespace is not None:
+                answer_cache.store(message, content, cache_namespace)
+            return content
+            
         except Exception as e:
             print(f"Chat error: {str(e)}")
             return "Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi."
     
-    async def chat_stream(self, message: str, conversation_history: list = None):
+    async def chat_stream(
+        self,
+        message: str,
+        conversation_history: list = None,
+        session_id: Optional[str] = None,
+        user_id: Optional[int] = None
+    ):
         """
         Streaming chat endpoint for AI conversations.
         Yields content chunks for StreamingResponse.
+        With a session_id, history comes from the server-side session and the
+        finished turn is stored in it; otherwise conversation_history is used.
         """
         try:
-            # Use VLM API configuration
-            vlm_api_key = os.getenv("VLM_API_KEY", "sk-2iTJBlqeaDWPTmGHm-kfbg")
-            vlm_api_url = os.getenv("VLM_API_URL", "http://60.51.17.97:9999/v1/chat/completions")
-            vlm_model = os.getenv("VLM_MODEL", "qwen3.5-397b-a17b-fp8-instruct")
+            session = await chat_sessions.get(session_id, user_id) if session_id else None
             
-            headers = {
-                "Authorization": f"Bearer {vlm_api_key}",
-                "Content-Type": "application/json"
-            }
+            # The plate is extracted once per turn and shared by every route
+            snapshot = saman_reloader.snapshot
+            candidate = message_plate_candidate(message, snapshot)
+            plate = candidate.plate if candidate else None
             
-            # Build conversation messages
-            messages = [
-                {
-                    "role": "system",
-                    "content": self._get_system_prompt(message)
-                }
-            ]
+            # Plain summons lookups are answered from the saman data directly
+            fast_answer = saman_fast_answer(message, snapshot, candidate)
+            if fast_answer is not None:
+                CHAT_ROUTE_STATS["saman_fast_path"] += 1
+                for frame in sse_relay.frames(fast_answer):
+                    yield frame
+                if session is not None:
+                    await self._save_turn(session_id, user_id, message, "".join(fast_answer))
+                return
             
-            # Add conversation history if provided
-            if conversation_history:
-                for msg in conversation_history[-10:]:  # Limit to last 10 messages
-                    messages.append({
-                        "role": msg.get("role", "user"),
-                        "content": msg.get("content", "")
-                    })
+            vlm_api_url, vlm_model, headers = self._chat_endpoint()
+            history = chat_sessions.history(session) if session is not None else history_window(conversation_history)
             
-            # Add current message
-            messages.append({
-                "role": "user",
-                "content": message
-            })
+            # Frequently asked questions are replayed from the answer cache
+            cache_namespace = self._answer_cache_namespace(message, plate, history, vlm_model)
+            if cache_namespace is not None:
+                cached = answer_cache.lookup(message, cache_namespace)
+                if cached is not None:
+                    CHAT_ROUTE_STATS["answer_cache"] += 1
+                    for frame in sse_relay.frames([cached]):
+                        yield frame
+                    if session is not None:
+                        await self._save_turn(session_id, user_id, message, cached)
+                    return
+            CHAT_ROUTE_STATS["llm"] += 1
+            
+            # Static system prompt first so the upstream can reuse its cached prefix
+            messages = self._build_chat_messages(message, history, plate)
             
             payload = {
                 "model": vlm_model,
@@ -553,34 +593,48 @@ IMPORTANT: Jika pengguna bertanya tentang saman kereta atau nombor plat kenderaa
                 "temperature": 0.7,
                 "stream": True
             }
+            if CHAT_STREAM_USAGE:
+                # Final chunk reports prompt and cached token counts
+                payload["stream_options"] = {"include_usage": True}
+            
+            started = time.perf_counter()
+            answer = []
+            
+            async def token_batches(chunks):
+                on_event = lambda event: record_usage(event.get("usage"))
+                async for batch in sse_relay.upstream_tokens(chunks, on_event):
+                    if batch and not answer:
+                        record_first_token(time.perf_counter() - started)
+                    answer.extend(batch)
+                    yield batch
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(vlm_api_url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        # Stream the response
-                        async for line in response.content:
-                            if line:
-                                line_text = line.decode('utf-8').strip()
-                                if line_text.startswith('data: '):
-                                    data_text = line_text[6:]  # Remove 'data: ' prefix
-                                    if data_text == '[DONE]':
-                                        break
-                                    try:
-                                        data = json.loads(data_text)
-                                        delta = data.get("choices", [{}])[0].get("delta", {})
-                                        content = delta.get("content", "")
-                                        if content:
-                                            yield f"data: {json.dumps({'content': content})}\n\n"
-                                    except json.JSONDecodeError:
-                                        continue
-                    else:
-                        error_text = await response.text()
-                        print(f"Chat stream API error: {response.status} - {error_text}")
-                        yield f"data: {json.dumps({'content': 'Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi.'})}\n\n"
+            async with http_client.stream("chat", vlm_api_url, payload, headers) as response:
+                if response.status == 200:
+                    # Parse upstream events incrementally and relay tokens in coalesced frames
+                    frames = sse_relay.relay(token_batches(response.content.iter_any()))
+                    try:
+                        async for frame in frames:
+                            yield frame
+                    except (asyncio.CancelledError, GeneratorExit):
+                        # The client disconnected. Stop the relay; leaving the
+                        # stream block closes the upstream connection, which
+                        # makes the model stop generating.
+                        chat_streams.record_abandoned(len(answer), payload["max_tokens"])
+                        await frames.aclose()
+                        raise
+                    chat_streams.record_completed()
+                    if cache_namespace is not None and answer:
+                        answer_cache.store(message, "".join(answer), cache_namespace)
+                    if session is not None and answer:
+                        await self._save_turn(session_id, user_id, message, "".join(answer))
+                else:
+                    error_text = await response.text()
+                    print(f"Chat stream API error: {response.status} - {error_text}")
+                    yield sse_frame("Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi.")
                         
         except Exception as e:
             print(f"Chat stream error: {str(e)}")
-            yield f"data: {json.dumps({'content': 'Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi.'})}\n\n"
+            yield sse_frame("Maaf, berlaku ralat sistem. Sila cuba lagi sebentar lagi.")
 
 # Global LLM service instance
 llm_service = LLMService()
\ No newline at end of file
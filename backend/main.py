@@ -1,15 +1,18 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import os
 import shutil
+import tempfile
+import asyncio
+from contextlib import asynccontextmanager, AsyncExitStack
 import json
 import logging
-import aiohttp
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 import uuid
 
 # Configure logging
@@ -29,10 +32,26 @@ from schemas import (
 )
 from auth import (
     authenticate_user, create_access_token, get_current_active_user,
-    get_current_citizen, get_password_hash
+    get_current_citizen, get_current_pdrm_officer, get_password_hash, get_user_from_token
 )
 from vlm_service import vlm_service
-from llm_service import llm_service
+from llm_service import llm_service, search_car_saman, saman_reloader
+from saman_offences import OFFENCE_CODES
+from saman_chat import CHAT_ROUTE_STATS
+from chat_prompt import prompt_stats
+from chat_sessions import chat_sessions
+from sse_relay import sse_relay
+from chat_streams import chat_streams
+from answer_cache import answer_cache
+from saman_lookup import items_from_json, items_from_ndjson, batches_from_list, stream_lookup
+from http_client import http_client
+from transcription_client import transcription_client
+from voice_stream import VoiceStream, VOICE_FORMATS, voice_stream_stats
+from image_processing import image_preprocessor
+from audio_processing import audio_preprocessor, EmptyRecordingError
+from analysis_cache import analysis_cache
+from resilience import deadline_scope, breaker_stats
+from vlm_parsers import PARSE_STATS
 
 # Create FastAPI app
 app = FastAPI(
@@ -52,6 +71,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the browser read the session id of a new chat
+    expose_headers=["X-Chat-Session-Id"],
 )
 
 # Create uploads directory
@@ -61,11 +82,60 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # Mount static files
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
+# Images up to this size are analyzed straight from memory; larger uploads are
+# spooled to a temporary file that the image workers decode from disk.
+UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))
+
+# Deadline in seconds for all upstream calls made by a single VLM request
+VLM_REQUEST_DEADLINE = float(os.getenv("VLM_REQUEST_DEADLINE", "60"))
+
+# Seconds a voice stream client has to send its auth message
+VOICE_AUTH_TIMEOUT = float(os.getenv("VOICE_AUTH_TIMEOUT", "10"))
+
+def _spool_to_temp_file(source) -> str:
+    """Copy an upload stream to a named temporary file and return its path."""
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(prefix="upload_", delete=False) as buffer:
+        shutil.copyfileobj(source, buffer)
+        return buffer.name
+
+@asynccontextmanager
+async def upload_image_source(file: UploadFile):
+    """Yield an uploaded image as bytes, or as a temp file path above the spool threshold."""
+    if file.size is None or file.size <= UPLOAD_SPOOL_THRESHOLD:
+        yield await file.read()
+        return
+
+    temp_path = await asyncio.to_thread(_spool_to_temp_file, file.file)
+    try:
+        yield temp_path
+    finally:
+        await asyncio.to_thread(os.remove, temp_path)
+
 # Create database tables on startup
 @app.on_event("startup")
 def startup_event():
     create_tables()
 
+# Open pooled upstream connections and start background workers on startup
+@app.on_event("startup")
+async def start_upstream_clients():
+    await http_client.start()
+    image_preprocessor.start()
+    audio_preprocessor.start()
+    saman_reloader.start()
+    transcription_client.start()
+
+# Close pooled upstream connections and stop background workers on shutdown
+@app.on_event("shutdown")
+async def stop_upstream_clients():
+    await transcription_client.close()
+    await http_client.close()
+    image_preprocessor.close()
+    audio_preprocessor.close()
+    await saman_reloader.close()
+    chat_sessions.close()
+
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserSchema)
 def register_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -133,7 +203,9 @@ from typing import List, Optional
 
 class ChatRequest(BaseModel):
     message: str
+    # Legacy clients resend the history; new clients send session_id instead
     conversation_history: Optional[List[dict]] = None
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
@@ -143,17 +215,78 @@ async def chat_with_ai(
     request: ChatRequest,
     current_user: User = Depends(get_current_active_user)
 ):
-    """Chat with AI assistant for accident report related questions. Supports streaming."""
+    """
+    Chat with AI assistant for accident report related questions. Supports streaming.
+    
+    History is kept server-side: a request without session_id or
+    conversation_history starts a session, returned in the X-Chat-Session-Id
+    header, and later turns send only the message and that session_id.
+    
+    Each user may have CHAT_MAX_STREAMS_PER_USER streams open at once. If the
+    client disconnects mid-answer, the upstream request is closed as well.
+    """
+    slot = chat_streams.acquire(current_user.id)
+    if slot is None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many chat streams in progress",
+            headers={"Retry-After": "1"}
+        )
+    try:
+        session_id = request.session_id
+        if session_id is not None:
+            if await chat_sessions.get(session_id, current_user.id) is None:
+                raise HTTPException(status_code=404, detail="Chat session not found or expired")
+        elif request.conversation_history is None:
+            session_id = await chat_sessions.create(current_user.id)
+    except BaseException:
+        slot.release()
+        raise
+    
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+    }
+    if session_id is not None:
+        headers["X-Chat-Session-Id"] = session_id
+    stream = llm_service.chat_stream(request.message, request.conversation_history, session_id, current_user.id)
+    
+    async def finish_stream():
+        # After a disconnect the generator may be left suspended mid-answer;
+        # closing it here aborts the upstream request instead of leaving that
+        # to garbage collection
+        try:
+            await stream.aclose()
+        finally:
+            slot.release()
+    
     return StreamingResponse(
-        llm_service.chat_stream(request.message, request.conversation_history),
+        stream,
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        }
+        headers=headers,
+        background=BackgroundTask(finish_stream)
     )
 
+@app.delete("/chat/sessions/{session_id}", response_model=MessageResponse)
+async def delete_chat_session(
+    session_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """End a chat session and delete its history."""
+    if not await chat_sessions.delete(session_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Chat session not found or expired")
+    return MessageResponse(message="Chat session deleted")
+
+@app.delete("/pdrm/chat/answer-cache", response_model=MessageResponse)
+def purge_chat_answer_cache(
+    question: Optional[str] = Query(None, description="Purge only answers to questions similar to this one"),
+    current_user: User = Depends(get_current_pdrm_officer)
+):
+    """Drop cached chat answers, e.g. after procedures or the prompt change."""
+    purged = answer_cache.purge(question)
+    return MessageResponse(message=f"Purged {purged} cached answers")
+
 @app.post("/audio/transcriptions")
 async def transcribe_audio(
     file: UploadFile = File(...),
@@ -161,53 +294,88 @@ async def transcribe_audio(
 ):
     """Transcribe audio file using Whisper API."""
     try:
-        # Read file content
         file_content = await file.read()
-        
-        # Call Whisper API using environment variables
-        whisper_api_key = os.getenv("WHISPER_API_KEY", "sk-2iTJBlqeaDWPTmGHm-kfbg")
-        whisper_api_base = os.getenv("WHISPER_API_URL", "http://60.51.17.97:9999/v1").rstrip("/")
-        whisper_model = os.getenv("WHISPER_MODEL", "whisper-large-v3-turbo")
-        
-        # Try different endpoint paths
-        endpoints = [
-            f"{whisper_api_base}/audio/transcriptions",
-            f"{whisper_api_base}/transcriptions",
-        ]
-        
-        # Create form data manually
-        form_data = aiohttp.FormData()
-        form_data.add_field(
-            "file",
+        # Downmix to 16 kHz mono and trim silence before uploading to Whisper
+        audio = await audio_preprocessor.normalize(
             file_content,
             filename=file.filename or "recording.webm",
             content_type=file.content_type or "audio/webm"
         )
-        form_data.add_field("model", whisper_model)
-        
-        headers = {"Authorization": f"Bearer {whisper_api_key}"}
-        
-        last_error = None
-        for endpoint in endpoints:
-            try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(endpoint, headers=headers, data=form_data) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            return {"text": result.get("text", "")}
-                        else:
-                            last_error = f"Status {response.status}: {await response.text()}"
-                            print(f"Whisper API error at {endpoint}: {last_error}")
-            except Exception as e:
-                last_error = str(e)
-                print(f"Whisper API error at {endpoint}: {last_error}")
-                continue
-        
-        return {"text": "", "error": f"Transcription failed: {last_error}"}
-        
+        text = await transcription_client.transcribe(audio.data, filename=audio.filename, content_type=audio.content_type)
+        return {"text": text}
+    except EmptyRecordingError as e:
+        return {"text": "", "error": str(e)}
     except Exception as e:
         print(f"Transcription error: {str(e)}")
-        return {"text": "", "error": str(e)}
+        return {"text": "", "error": f"Transcription failed: {str(e)}"}
+
+@app.websocket("/audio/stream")
+async def stream_audio(
+    websocket: WebSocket,
+    audio_format: str = Query("webm", alias="format")
+):
+    """
+    Transcribe voice while the user is still speaking.
+    
+    Connect with ?format=webm|pcm16 (16 kHz mono) and send the access token
+    as the first message, {"type": "auth", "token": ...}; it is not taken
+    from the URL, which ends up in access logs. Then send audio chunks as
+    binary messages and {"type": "stop"} when the user stops. The server
+    pushes {"type": "partial", "text": ...} while audio arrives, then one
+    {"type": "final", "text": ...} and closes.
+    """
+    await websocket.accept()
+    user = None
+    try:
+        message = await asyncio.wait_for(websocket.receive_text(), VOICE_AUTH_TIMEOUT)
+        try:
+            command = json.loads(message)
+        except ValueError:
+            command = None
+        if isinstance(command, dict) and command.get("type") == "auth" and isinstance(command.get("token"), str):
+            user = await asyncio.to_thread(get_user_from_token, command["token"])
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, KeyError):
+        # No auth message in time, or audio sent before it
+        pass
+    if user is None or audio_format not in VOICE_FORMATS:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    async def send_partial(text: str):
+        await websocket.send_json({"type": "partial", "text": text})
+    
+    stream = VoiceStream(audio_format, send_partial)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                stream.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    command = json.loads(message["text"])
+                except ValueError:
+                    command = {"type": message["text"].strip()}
+                if isinstance(command, dict) and command.get("type") == "stop":
+                    break
+        
+        text = await stream.finish()
+        await websocket.send_json({"type": "final", "text": text})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"Voice stream error: {str(e)}")
+        try:
+            await websocket.send_json({"type": "error", "detail": f"Transcription failed: {str(e)}"})
+            await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+        except Exception:
+            pass
+    finally:
+        await stream.aclose()
 
 # Accident Report endpoints
 @app.post("/reports", response_model=AccidentReportSchema)
@@ -289,18 +457,10 @@ async def analyze_accident_image(
 ):
     """Analyze an accident image using VLM to extract vehicle, damage, and incident information."""
     try:
-        # Save uploaded file temporarily
-        temp_path = os.path.join(UPLOAD_DIR, f"temp_{uuid.uuid4()}_{file.filename}")
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
         # Call VLM service to analyze the image
-        analysis_result = await vlm_service.analyze_accident_image(temp_path)
-        
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        with deadline_scope(VLM_REQUEST_DEADLINE):
+            async with upload_image_source(file) as image:
+                analysis_result = await vlm_service.analyze_accident_image(image)
         
         return ImageAnalysisResponse(
             vehicle_description=analysis_result.get("vehicle_description", ""),
@@ -433,18 +593,10 @@ async def analyze_plate_number(
 ):
     """Analyze a vehicle image to extract and verify plate number using VLM."""
     try:
-        # Save uploaded file temporarily
-        temp_path = os.path.join(UPLOAD_DIR, f"temp_plate_{uuid.uuid4()}_{file.filename}")
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
         # Call VLM service to analyze the image
-        analysis_result = await vlm_service.analyze_plate_number(temp_path)
-        
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        with deadline_scope(VLM_REQUEST_DEADLINE):
+            async with upload_image_source(file) as image:
+                analysis_result = await vlm_service.analyze_plate_number(image)
         
         return PlateAnalysisResponse(
             plate_number=analysis_result.get("plate_number", ""),
@@ -475,18 +627,10 @@ async def analyze_license(
 ):
     """Analyze a driver license image to extract driver information using VLM."""
     try:
-        # Save uploaded file temporarily
-        temp_path = os.path.join(UPLOAD_DIR, f"temp_license_{uuid.uuid4()}_{file.filename}")
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
         # Call VLM service to analyze the image
-        analysis_result = await vlm_service.analyze_license(temp_path)
-        
-        # Clean up temp file
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        with deadline_scope(VLM_REQUEST_DEADLINE):
+            async with upload_image_source(file) as image:
+                analysis_result = await vlm_service.analyze_license(image)
         
         return LicenseAnalysisResponse(
             name=analysis_result.get("name", ""),
@@ -501,11 +645,275 @@ async def analyze_license(
         logger.error(f"Error analyzing license: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to analyze license: {str(e)}")
 
+class SamanRecordResponse(BaseModel):
+    plate_number: str
+    owner: str
+    ic: str
+    car_type: str
+    total_saman: int
+    unpaid_saman: int
+    outstanding: str
+    details: str
+
+class CombinedSemakanResponse(BaseModel):
+    plate: PlateAnalysisResponse
+    license: Optional[LicenseAnalysisResponse] = None
+    saman: Optional[SamanRecordResponse] = None
+
+@app.post("/semakan/analyze-combined", response_model=CombinedSemakanResponse)
+async def analyze_semakan_combined(
+    vehicle_file: UploadFile = File(...),
+    license_file: Optional[UploadFile] = File(None),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Analyze vehicle and license images in one VLM call and join the plate with saman records."""
+    try:
+        with deadline_scope(VLM_REQUEST_DEADLINE):
+            async with AsyncExitStack() as stack:
+                vehicle_image = await stack.enter_async_context(upload_image_source(vehicle_file))
+                license_image = None
+                if license_file is not None:
+                    license_image = await stack.enter_async_context(upload_image_source(license_file))
+                analysis_result = await vlm_service.analyze_semakan(vehicle_image, license_image)
+        
+        if analysis_result.get("mocked"):
+            # The mock plate belongs to a real record; never join it
+            raise HTTPException(status_code=503, detail="Vehicle analysis is unavailable; please try again later")
+        
+        plate = analysis_result["plate"]
+        license_data = analysis_result.get("license")
+        
+        saman = None
+        plate_number = plate.get("plate_number", "")
+        # Only an exact or confusable match is the same vehicle; the record is
+        # labelled with the plate it belongs to, not the plate the VLM read
+        found = search_car_saman(plate_number) if plate_number else None
+        if found:
+            matched_plate, saman_data = found
+            saman = SamanRecordResponse(plate_number=matched_plate, **saman_data)
+        
+        return CombinedSemakanResponse(
+            plate=PlateAnalysisResponse(
+                plate_number=plate_number,
+                vehicle_type=plate.get("vehicle_type"),
+                vehicle_color=plate.get("vehicle_color"),
+                registration_expiry=plate.get("registration_expiry"),
+                road_tax_status=plate.get("road_tax_status"),
+                confidence_score=plate.get("confidence_score", 0.8)
+            ),
+            license=LicenseAnalysisResponse(
+                name=license_data.get("name", ""),
+                ic_number=license_data.get("ic_number", ""),
+                license_number=license_data.get("license_number", ""),
+                address=license_data.get("address", ""),
+                expiry_date=license_data.get("expiry_date", ""),
+                nationality=license_data.get("nationality", ""),
+                license_class=license_data.get("class", "")
+            ) if license_data else None,
+            saman=saman
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in combined semakan analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to analyze semakan images: {str(e)}")
+
+@app.post("/semakan/lookup")
+async def lookup_saman_batch(
+    request: Request,
+    fuzzy: bool = True,
+    candidates: int = Query(1, ge=1, le=10),
+    current_user: User = Depends(get_current_pdrm_officer)
+):
+    """
+    Resolve many plates against the saman records without the LLM (PDRM officers only).
+    
+    The body is a JSON list of plates (or {"plates": [...]}), or NDJSON with
+    one plate per line when sent as application/x-ndjson. Results stream back
+    as NDJSON in request order, one line per plate, and NDJSON input is
+    resolved as it arrives.
+    """
+    snapshot = saman_reloader.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Saman data is not loaded")
+    
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        batches = items_from_ndjson(request.stream())
+    else:
+        try:
+            items = items_from_json(await request.body())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid lookup body: {str(e)}")
+        batches = batches_from_list(items)
+    
+    return StreamingResponse(
+        stream_lookup(snapshot, batches, candidates, fuzzy),
+        media_type="application/x-ndjson",
+        headers={"X-Saman-Data-Version": snapshot.version}
+    )
+
+class SamanPlateMatch(BaseModel):
+    plate_number: str
+    offences: int
+    amount: float
+
+class SamanOffenceQueryResponse(BaseModel):
+    data_version: str
+    matched_plates: int
+    plates: List[SamanPlateMatch]
+    # Offences left out of a paid filter because their paid status is unknown
+    paid_unknown_excluded: int = 0
+
+class SamanAggregateGroup(BaseModel):
+    group: str
+    records: Optional[int] = None
+    outstanding: Optional[float] = None
+    offences: Optional[int] = None
+    unpaid: Optional[int] = None
+    paid_unknown: Optional[int] = None
+    amount: Optional[float] = None
+
+class SamanAggregateResponse(BaseModel):
+    data_version: str
+    group_by: str
+    groups: List[SamanAggregateGroup]
+    paid_unknown_excluded: int = 0
+
+def _saman_offence_mask(offences, offence, paid, include_unknown, min_amount, date_from, date_to, car_type):
+    """
+    Offence mask for the shared query filters, rejecting unknown offence codes,
+    and how many offences a paid filter left out for an unknown paid status.
+    """
+    codes = [code.upper() for code in offence or []]
+    unknown = [code for code in codes if code not in OFFENCE_CODES]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown offence code(s): {', '.join(unknown)}. Valid codes: {', '.join(OFFENCE_CODES)}"
+        )
+    mask = offences.offence_mask(
+        codes=codes,
+        min_amount_sen=round(min_amount * 100) if min_amount is not None else None,
+        date_from=date_from,
+        date_to=date_to,
+        car_type=car_type
+    )
+    if paid is None:
+        return mask, 0
+    return offences.filter_paid(mask, paid, include_unknown)
+
+@app.get("/pdrm/saman/offences", response_model=SamanOffenceQueryResponse)
+def query_saman_offences(
+    offence: Optional[List[str]] = Query(None, description="Offence codes, e.g. RED_LIGHT"),
+    paid: Optional[bool] = None,
+    include_unknown: bool = Query(False, description="With paid, also match offences whose paid status is unknown"),
+    min_amount: Optional[float] = Query(None, description="Minimum amount per offence in RM"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    car_type: Optional[str] = None,
+    min_total: Optional[float] = Query(None, description="Minimum total of matching offences per plate in RM"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_pdrm_officer)
+):
+    """Plates with offences matching every filter, largest matching total first."""
+    snapshot = saman_reloader.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Saman data is not loaded")
+    
+    mask, excluded = _saman_offence_mask(
+        snapshot.offences, offence, paid, include_unknown, min_amount, date_from, date_to, car_type
+    )
+    matched, plates = snapshot.offences.plates_matching(
+        mask,
+        min_total_sen=round(min_total * 100) if min_total is not None else None,
+        limit=limit
+    )
+    return SamanOffenceQueryResponse(
+        data_version=snapshot.version,
+        matched_plates=matched,
+        plates=[
+            SamanPlateMatch(plate_number=plate, offences=count, amount=total / 100)
+            for plate, count, total in plates
+        ],
+        paid_unknown_excluded=excluded
+    )
+
+@app.get("/pdrm/saman/aggregate", response_model=SamanAggregateResponse)
+def aggregate_saman(
+    group_by: str = Query("car_type", pattern="^(car_type|offence|month)$"),
+    offence: Optional[List[str]] = Query(None, description="Offence codes, e.g. RED_LIGHT"),
+    paid: Optional[bool] = None,
+    include_unknown: bool = Query(False, description="With paid, also match offences whose paid status is unknown"),
+    min_amount: Optional[float] = Query(None, description="Minimum amount per offence in RM"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    car_type: Optional[str] = None,
+    current_user: User = Depends(get_current_pdrm_officer)
+):
+    """
+    Totals across the whole dataset. car_type sums each plate's outstanding
+    amount; offence and month count and sum the offences matching the filters.
+    """
+    snapshot = saman_reloader.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Saman data is not loaded")
+    
+    mask, excluded = None, 0
+    if group_by != "car_type":
+        mask, excluded = _saman_offence_mask(
+            snapshot.offences, offence, paid, include_unknown, min_amount, date_from, date_to, car_type
+        )
+    groups = []
+    for row in snapshot.offences.aggregate(group_by, mask):
+        group = SamanAggregateGroup(
+            group=row["group"],
+            records=row.get("records"),
+            offences=row.get("offences"),
+            unpaid=row.get("unpaid"),
+            paid_unknown=row.get("paid_unknown")
+        )
+        if "outstanding_sen" in row:
+            group.outstanding = row["outstanding_sen"] / 100
+        if "amount_sen" in row:
+            group.amount = row["amount_sen"] / 100
+        groups.append(group)
+    return SamanAggregateResponse(
+        data_version=snapshot.version,
+        group_by=group_by,
+        groups=groups,
+        paid_unknown_excluded=excluded
+    )
+
 # Health check
 @app.get("/health")
 def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+    return {"status": "healthy", "timestamp": datetime.utcnow(), "saman_data": saman_reloader.stats()}
+
+@app.get("/metrics")
+def get_metrics(current_user: User = Depends(get_current_pdrm_officer)):
+    """Runtime metrics for upstream connections and background workers (PDRM officers only)."""
+    return {
+        "upstream_http": http_client.stats(),
+        "image_preprocessing": image_preprocessor.stats(),
+        "audio_preprocessing": audio_preprocessor.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "singleflight": {
+            "vlm": vlm_service.singleflight.stats(),
+            "llm": llm_service.singleflight.stats(),
+        },
+        "vlm_parsing": dict(PARSE_STATS),
+        "chat_routing": dict(CHAT_ROUTE_STATS),
+        "chat_prompt": prompt_stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "chat_streaming": sse_relay.stats(),
+        "chat_streams": chat_streams.stats(),
+        "chat_answer_cache": answer_cache.stats(),
+        "transcription": transcription_client.stats(),
+        "voice_streams": voice_stream_stats(),
+        "circuit_breakers": breaker_stats(),
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,309 @@
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from plate_index import EXACT, CONFUSABLE
+
+# Spoken digits, Malay first; English covers code-switched transcripts
+_UNITS = {
+    "kosong": 0, "sifar": 0, "satu": 1, "dua": 2, "tiga": 3, "empat": 4,
+    "lima": 5, "enam": 6, "tujuh": 7, "lapan": 8, "sembilan": 9,
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9,
+}
+_MULTIPLIERS = {"belas": 10, "puluh": 10, "ratus": 100, "ribu": 1000}
+# "se-" forms are "satu" followed by the multiplier
+_SE_FORMS = {"sebelas": "belas", "sepuluh": "puluh", "seratus": "ratus", "seribu": "ribu"}
+
+# Letter names as spoken or as a transcriber spells them. NATO "lima" is
+# left out because in Malay it is the digit five.
+_LETTER_NAMES = {
+    "alpha": "A", "alfa": "A", "ei": "A",
+    "bravo": "B", "bi": "B", "bee": "B",
+    "charlie": "C", "si": "C", "see": "C",
+    "delta": "D", "di": "D", "dee": "D",
+    "echo": "E",
+    "foxtrot": "F", "ef": "F",
+    "golf": "G", "ji": "G", "jee": "G",
+    "hotel": "H", "eic": "H", "eich": "H", "hec": "H",
+    "india": "I", "ai": "I",
+    "juliet": "J", "juliett": "J", "je": "J", "jay": "J",
+    "kilo": "K", "ke": "K", "kay": "K",
+    "el": "L",
+    "mike": "M", "em": "M",
+    "november": "N", "en": "N",
+    "oscar": "O",
+    "papa": "P", "pi": "P",
+    "quebec": "Q", "kiu": "Q", "kyu": "Q",
+    "romeo": "R", "ar": "R",
+    "sierra": "S", "es": "S",
+    "tango": "T", "ti": "T", "tee": "T",
+    "uniform": "U", "yu": "U",
+    "victor": "V", "vi": "V", "vee": "V",
+    "whiskey": "W", "whisky": "W", "dabelyu": "W", "dablyu": "W",
+    "xray": "X", "eks": "X", "ex": "X",
+    "yankee": "Y", "wai": "Y",
+    "zulu": "Z", "zed": "Z", "zet": "Z",
+}
+
+# Short everyday words that are also valid letter prefixes; reading them as
+# part of a plate is possible but unlikely
+_STOPWORDS = {
+    "ada", "tak", "apa", "ini", "itu", "dan", "yg", "nak", "no", "ke", "di",
+    "sy", "utk", "dia", "kah", "lah", "la", "je", "ya", "ok", "hai", "hi",
+    "the", "is", "my", "of", "for", "car", "rm", "pls", "bro", "kat",
+    "jam", "pun", "dah", "kau", "aku", "km", "sdn", "bhd",
+}
+
+# "RM 300" is an amount, never a plate prefix
+_CURRENCY_WORDS = {"rm", "ringgit", "sen"}
+# Words after a number that make it a quantity rather than a plate number
+_QUANTITY_WORDS = {
+    "jam", "minit", "saat", "hari", "minggu", "bulan", "tahun", "km", "kilometer",
+    "meter", "kmj", "kg", "orang", "kali", "sen", "ringgit", "peratus",
+    "hour", "hours", "min", "mins", "minutes", "days", "years", "times", "percent",
+}
+# Letter names that are also everyday words ("pergi ke KL"); they count as
+# letters only inside a spelled-out sequence such as "ke el", not next to a
+# typed prefix
+_ORDINARY_LETTER_NAMES = {"ke", "di", "si", "je", "pi", "en"}
+
+# Confidence lost per token, by how the token was read
+_PENALTY_SPOKEN_DIGIT = 0.02
+_PENALTY_SPELLED_LETTER = 0.03
+_PENALTY_PHONETIC = 0.02
+_PENALTY_LETTER_NAME = 0.1
+_PENALTY_CONFUSABLE_DIGIT = 0.1
+_PENALTY_STOPWORD = 0.35
+_PENALTY_ORDINARY_LETTER = 0.3
+# Confidence lost for unusual plate shapes and for cutting through a
+# spelled-out plate
+_PENALTY_SHORT_NUMBER = 0.1
+_PENALTY_SHORT_PREFIX = 0.05
+_PENALTY_CUT = 0.2
+
+# Digits a typist or transcriber writes for the letter at the start of a plate
+_DIGIT_LETTERS = {"0": "O", "1": "I", "5": "S", "8": "B"}
+
+# Candidates below this confidence are not returned
+MIN_CONFIDENCE = float(os.getenv("PLATE_EXTRACT_MIN_CONFIDENCE", "0.6"))
+
+# Longest run of tokens considered for one plate
+_MAX_SPAN_TOKENS = 10
+
+_TOKEN = re.compile(r"[A-Za-z]+|\d+")
+
+LETTERS = "L"
+DIGITS = "D"
+
+
+class PlateCandidate(NamedTuple):
+    plate: str
+    confidence: float
+    start: int  # character span of the plate in the message
+    end: int
+
+
+class _Reading(NamedTuple):
+    kind: str
+    text: str
+    penalty: float
+    spelled: bool = False  # a single letter or letter name, not a typed block
+    ordinary: bool = False  # the letter name is also an everyday word
+
+
+def _number_groups(words: List[Tuple[str, int, int]]) -> List[Tuple[str, int, int]]:
+    """Digit strings for a run of spoken number words.
+
+    Words combine into one number where Malay grammar allows it ("dua puluh
+    tiga" is 23, "tujuh ribu tiga ratus lima puluh dua" is 7352) and
+    otherwise start a new group, so digit-by-digit readings such as
+    "tujuh tiga lima dua" come out as four groups.
+    """
+    groups = []
+    expanded = []
+    for word, word_start, word_end in words:
+        if word in _SE_FORMS:
+            expanded.append(("satu", word_start, word_end))
+            expanded.append((_SE_FORMS[word], word_start, word_end))
+        else:
+            expanded.append((word, word_start, word_end))
+
+    # The number being built is head plus a pending unit (tail) that a
+    # following multiplier may still scale; room bounds what can be added
+    head, tail, room = 0, None, 0
+    start = head_end = tail_start = end = -1
+    active = False
+    for word, word_start, word_end in expanded:
+        if word in _UNITS:
+            unit = _UNITS[word]
+            if not active or tail is not None or unit >= room:
+                if active:
+                    groups.append((str(head + (tail or 0)), start, end))
+                head, room, active, start = 0, 10 ** 9, True, word_start
+            tail, tail_start, end = unit, word_start, word_end
+            continue
+
+        if tail is None:
+            # A multiplier with nothing to multiply is not part of a number
+            if active:
+                groups.append((str(head), start, end))
+            head, room, active = 0, 0, False
+            continue
+
+        if word == "ribu":
+            head, room = (head + tail) * 1000, 1000
+        else:
+            value = 10 + tail if word == "belas" else tail * _MULTIPLIERS[word]
+            if value >= room:
+                # Does not fit the number so far, e.g. "dua puluh tiga puluh"
+                groups.append((str(head), start, head_end))
+                head, start = 0, tail_start
+            head += value
+            room = 0 if word == "belas" else _MULTIPLIERS[word]
+        tail, end = None, word_end
+        head_end = end
+    if active:
+        groups.append((str(head + (tail or 0)), start, end))
+    return groups
+
+
+def _tokenize(message: str) -> List[Tuple[List[_Reading], int, int]]:
+    """Tokens with every way each can be read as part of a plate."""
+    tokens: List[Tuple[List[_Reading], int, int]] = []
+    spoken: List[Tuple[str, int, int]] = []
+
+    def flush_spoken():
+        for digits, start, end in _number_groups(spoken):
+            tokens.append(([_Reading(DIGITS, digits, _PENALTY_SPOKEN_DIGIT)], start, end))
+        spoken.clear()
+
+    for match in _TOKEN.finditer(message):
+        word = match.group().lower()
+        if word in _CURRENCY_WORDS:
+            flush_spoken()
+            tokens.append(([], match.start(), match.end()))
+            continue
+        if word in _UNITS or word in _MULTIPLIERS or word in _SE_FORMS:
+            spoken.append((word, match.start(), match.end()))
+            continue
+        flush_spoken()
+
+        readings = []
+        if word.isdigit():
+            if len(word) <= 4:
+                readings.append(_Reading(DIGITS, word, 0.0))
+            if word in _DIGIT_LETTERS:
+                readings.append(_Reading(LETTERS, _DIGIT_LETTERS[word], _PENALTY_CONFUSABLE_DIGIT, True))
+        else:
+            if len(word) == 1:
+                readings.append(_Reading(LETTERS, word.upper(), _PENALTY_SPELLED_LETTER, True))
+            elif len(word) <= 3:
+                ordinary = word in _STOPWORDS
+                readings.append(_Reading(LETTERS, word.upper(), _PENALTY_STOPWORD if ordinary else 0.0, False, ordinary))
+            if word in _LETTER_NAMES:
+                # Short names ("di", "ke") double as everyday words
+                penalty = _PENALTY_PHONETIC if len(word) > 3 else _PENALTY_LETTER_NAME
+                readings.append(_Reading(LETTERS, _LETTER_NAMES[word], penalty, True, word in _ORDINARY_LETTER_NAMES))
+        tokens.append((readings, match.start(), match.end()))
+    flush_spoken()
+    return tokens
+
+
+def _advance(state: Tuple[int, int, int], reading: _Reading) -> Optional[Tuple[int, int, int]]:
+    """Plate grammar: 1-3 prefix letters, 1-4 digits, at most one suffix letter.
+
+    State is (prefix letters, digits, suffix letters); None when the reading
+    cannot follow.
+    """
+    letters, digits, suffix = state
+    size = len(reading.text)
+    if reading.kind == LETTERS:
+        if digits == 0:
+            return (letters + size, 0, 0) if letters + size <= 3 else None
+        return (letters, digits, suffix + size) if suffix + size <= 1 else None
+    if letters == 0 or suffix:
+        return None
+    return (letters, digits + size, 0) if digits + size <= 4 else None
+
+
+def _extends(readings: List[_Reading], kind: str, room: int, max_penalty: float = _PENALTY_LETTER_NAME) -> bool:
+    """True if a neighbouring token would plausibly continue the plate."""
+    return any(
+        reading.kind == kind and len(reading.text) <= room and reading.penalty <= max_penalty
+        for reading in readings
+    )
+
+
+def extract_plate_candidates(message: str, limit: int = 3) -> List[PlateCandidate]:
+    """Plates mentioned in a message, most likely first.
+
+    The message is tokenized once; spoken numbers, spelled letters and letter
+    names are read alongside literal text, and every run of tokens that forms
+    a valid plate becomes a candidate. Confidence drops for each token read
+    in a less likely way, for unusual plate shapes, and when the run stops
+    short of a neighbouring token that would have continued the plate.
+    Amounts ("RM 300"), quantities ("2 jam") and letter names that are just
+    everyday words next to a typed prefix ("ke KL") are not plates.
+    """
+    tokens = _tokenize(message)
+    words = [message[start:end].lower() for _, start, end in tokens]
+    best: Dict[str, PlateCandidate] = {}
+
+    for first in range(len(tokens)):
+        # (state, plate so far, penalty, spelled letter tokens, typed letter
+        # block seen, ordinary-word letter seen) for every reading path
+        paths = [((0, 0, 0), "", 0.0, 0, False, False)]
+        for position in range(first, min(first + _MAX_SPAN_TOKENS, len(tokens))):
+            readings, _, end = tokens[position]
+            extended = []
+            for state, plate, penalty, spelled, typed, ordinary in paths:
+                for reading in readings:
+                    next_state = _advance(state, reading)
+                    if next_state is not None:
+                        letter = reading.kind == LETTERS
+                        extended.append((
+                            next_state, plate + reading.text, penalty + reading.penalty,
+                            spelled + (letter and reading.spelled),
+                            typed or (letter and not reading.spelled),
+                            ordinary or reading.ordinary,
+                        ))
+            if not extended:
+                break
+            paths = extended
+            quantity = position + 1 < len(tokens) and words[position + 1] in _QUANTITY_WORDS
+            for (letters, digits, suffix), plate, penalty, spelled, typed, ordinary in paths:
+                if not digits or (quantity and not suffix):
+                    continue
+                if ordinary and (typed or spelled < 2):
+                    penalty += _PENALTY_ORDINARY_LETTER
+                if digits < 3:
+                    penalty += _PENALTY_SHORT_NUMBER
+                if letters == 1:
+                    penalty += _PENALTY_SHORT_PREFIX
+                if first > 0 and _extends(tokens[first - 1][0], LETTERS, 3 - letters):
+                    penalty += _PENALTY_CUT
+                if not suffix and position + 1 < len(tokens):
+                    following = tokens[position + 1][0]
+                    # A lone letter right after the digits is usually the suffix
+                    if _extends(following, DIGITS, 4 - digits) or _extends(following, LETTERS, 1, _PENALTY_SPELLED_LETTER):
+                        penalty += _PENALTY_CUT
+                confidence = round(1.0 - penalty, 3)
+                if confidence < MIN_CONFIDENCE:
+                    continue
+                current = best.get(plate)
+                if current is None or confidence > current.confidence:
+                    best[plate] = PlateCandidate(plate, confidence, tokens[first][1], end)
+
+    return sorted(best.values(), key=lambda candidate: (-candidate.confidence, candidate.start))[:limit]
+
+
+def resolve_plate_candidate(candidates: List[PlateCandidate], index=None) -> Optional[PlateCandidate]:
+    """The first candidate with a record in ``index``, else the most likely one."""
+    if not candidates:
+        return None
+    if index is not None:
+        for candidate in candidates:
+            matches = index.search(candidate.plate, 1, 0)
+            if matches and matches[0].kind in (EXACT, CONFUSABLE):
+                return candidate
+    return candidates[0]
@@ -0,0 +1,142 @@
+import os
+import re
+import bisect
+import string
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+# Characters a VLM or speech transcript commonly confuses on number plates.
+# Both sides of each pair map to the same canonical character.
+CONFUSABLES = str.maketrans({"O": "0", "I": "1", "B": "8", "S": "5"})
+
+# Alphabet of canonical keys, used to enumerate edits of a query
+_CANONICAL_ALPHABET = "".join(
+    sorted(set(string.ascii_uppercase + string.digits) - {"O", "I", "B", "S"})
+)
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]")
+
+# Match kinds, in ranking order
+EXACT = "exact"
+CONFUSABLE = "confusable"
+FUZZY = "fuzzy"
+PREFIX = "prefix"
+
+_KIND_RANK = {EXACT: 0, CONFUSABLE: 1, FUZZY: 2, PREFIX: 3}
+
+
+def normalize_plate(plate: str) -> str:
+    """Uppercase a plate and drop spaces, dashes and other separators."""
+    return _NON_ALNUM.sub("", plate.upper())
+
+
+def canonical_plate(plate: str) -> str:
+    """Normalized plate with confusable characters folded together."""
+    return normalize_plate(plate).translate(CONFUSABLES)
+
+
+class PlateMatch(NamedTuple):
+    plate: str
+    kind: str
+    distance: int
+
+
+class PlateIndex:
+    """Sorted index of plate numbers for exact, prefix and fuzzy lookup.
+
+    Plates are stored as a sorted array of canonical keys (confusables
+    folded) with the original plate alongside, so prefix lookups are a
+    binary search. A hash lookup from canonical key to its first position
+    serves exact and confusable matches in O(1), and bounded edit-distance
+    search probes it with every edit of the query rather than scanning.
+    """
+
+    def __init__(self, plates: Iterable[str] = ()):
+        pairs = sorted((canonical_plate(plate), plate) for plate in plates)
+        positions: Dict[str, int] = {}
+        for position, (key, _) in enumerate(pairs):
+            positions.setdefault(key, position)
+        self._setup([key for key, _ in pairs], [plate for _, plate in pairs], positions.get)
+
+    @classmethod
+    def from_sorted(
+        cls,
+        keys: Sequence[str],
+        plates: Sequence[str],
+        find: Callable[[str], Optional[int]]
+    ) -> "PlateIndex":
+        """Index over existing columns sorted by canonical key.
+
+        ``find(key)`` must return the position of the first entry with that
+        key, or None. Used to search a SamanStore without copying it.
+        """
+        index = cls.__new__(cls)
+        index._setup(keys, plates, find)
+        return index
+
+    def _setup(self, keys: Sequence[str], plates: Sequence[str], find: Callable[[str], Optional[int]]):
+        self._keys = keys
+        self._plates = plates
+        self._find = find
+        self.max_distance = int(os.getenv("PLATE_SEARCH_MAX_DISTANCE", "1"))
+        self.min_prefix = int(os.getenv("PLATE_SEARCH_MIN_PREFIX", "3"))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _plates_for(self, key: str) -> List[str]:
+        position = self._find(key)
+        if position is None:
+            return []
+        end = position + 1
+        while end < len(self._keys) and self._keys[end] == key:
+            end += 1
+        return [self._plates[i] for i in range(position, end)]
+
+    def search(self, query: str, limit: int = 5, max_distance: Optional[int] = None) -> List[PlateMatch]:
+        """Ranked matches: exact, then confusable, then fuzzy, then prefix."""
+        normalized = normalize_plate(query)
+        if not normalized:
+            return []
+        key = normalized.translate(CONFUSABLES)
+        max_distance = self.max_distance if max_distance is None else max_distance
+
+        matches: Dict[str, PlateMatch] = {}
+        for plate in self._plates_for(key):
+            kind = EXACT if normalize_plate(plate) == normalized else CONFUSABLE
+            matches[plate] = PlateMatch(plate, kind, 0)
+
+        if not matches and max_distance > 0:
+            frontier = {key}
+            seen = {key}
+            for distance in range(1, max_distance + 1):
+                frontier = {edit for variant in frontier for edit in _edits(variant)} - seen
+                seen |= frontier
+                for variant in frontier:
+                    for plate in self._plates_for(variant):
+                        matches.setdefault(plate, PlateMatch(plate, FUZZY, distance))
+                if matches:
+                    break
+
+        if len(matches) < limit and len(key) >= self.min_prefix:
+            start = bisect.bisect_left(self._keys, key)
+            for position in range(start, min(start + limit, len(self._keys))):
+                if not self._keys[position].startswith(key):
+                    break
+                plate = self._plates[position]
+                matches.setdefault(plate, PlateMatch(plate, PREFIX, len(self._keys[position]) - len(key)))
+
+        return sorted(matches.values(), key=match_rank)[:limit]
+
+
+def match_rank(match: PlateMatch):
+    """Sort key ranking matches best first."""
+    return (_KIND_RANK[match.kind], match.distance, match.plate)
+
+
+def _edits(key: str) -> Set[str]:
+    """Every string one deletion, substitution or insertion away from key."""
+    splits = [(key[:i], key[i:]) for i in range(len(key) + 1)]
+    deletes = {left + right[1:] for left, right in splits if right}
+    substitutes = {left + c + right[1:] for left, right in splits if right for c in _CANONICAL_ALPHABET}
+    inserts = {left + c + right for left, right in splits for c in _CANONICAL_ALPHABET}
+    return deletes | substitutes | inserts
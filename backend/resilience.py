@@ -0,0 +1,219 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Awaitable, Callable, TypeVar
+from dotenv import load_dotenv
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() by which the current request must finish
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while a circuit breaker is open."""
+
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    """Raised when the request deadline leaves no time for another attempt."""
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """Bound all upstream calls made in this context to ``seconds`` from now.
+
+    Nested scopes can only shorten an outer deadline, never extend it.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker over a rolling window of calls.
+
+    The breaker opens when, with at least ``min_calls`` in the window, the
+    error rate or the rate of calls slower than ``slow_call_seconds`` reaches
+    its threshold. While open every call fails fast. After ``open_seconds`` a
+    limited number of half-open probes are let through: a success closes the
+    breaker, a failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str):
+        prefix = f"{name.upper()}_BREAKER_"
+        self.name = name
+        self.window_seconds = float(os.getenv(prefix + "WINDOW", "60"))
+        self.min_calls = int(os.getenv(prefix + "MIN_CALLS", "10"))
+        self.error_threshold = float(os.getenv(prefix + "ERROR_RATE", "0.5"))
+        self.slow_call_seconds = float(os.getenv(prefix + "SLOW_CALL_SECONDS", "30"))
+        self.slow_call_threshold = float(os.getenv(prefix + "SLOW_CALL_RATE", "0.8"))
+        self.open_seconds = float(os.getenv(prefix + "OPEN_SECONDS", "30"))
+        self.half_open_probes = int(os.getenv(prefix + "HALF_OPEN_PROBES", "1"))
+
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        # (finished_at, ok, latency)
+        self._window: deque = deque()
+        self._metrics = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach upstream."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self._metrics["rejected"] += 1
+                raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self._metrics["rejected"] += 1
+                raise CircuitOpenError(f"Circuit breaker for {self.name} is half-open")
+            self._probes_in_flight += 1
+
+    def record(self, ok: bool, latency: float):
+        """Record the outcome of a call that passed before_call()."""
+        now = time.monotonic()
+        self._metrics["successes" if ok else "failures"] += 1
+
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if ok and latency < self.slow_call_seconds:
+                self.state = self.CLOSED
+                self._window.clear()
+            else:
+                self._open(now)
+            return
+
+        self._window.append((now, ok, latency))
+        self._trim(now)
+        if self.state == self.CLOSED and self._should_open():
+            self._open(now)
+
+    def release(self):
+        """Forget a call that passed before_call() but never finished."""
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _trim(self, now: float):
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
+
+    def _should_open(self) -> bool:
+        calls = len(self._window)
+        if calls < self.min_calls:
+            return False
+        errors = sum(1 for _, ok, _ in self._window if not ok)
+        slow = sum(1 for _, _, latency in self._window if latency >= self.slow_call_seconds)
+        return errors / calls >= self.error_threshold or slow / calls >= self.slow_call_threshold
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._metrics["opened"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Current state and rolling-window rates."""
+        self._trim(time.monotonic())
+        calls = len(self._window)
+        errors = sum(1 for _, ok, _ in self._window if not ok)
+        slow = sum(1 for _, _, latency in self._window if latency >= self.slow_call_seconds)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "error_rate": round(errors / calls, 4) if calls else 0.0,
+            "slow_call_rate": round(slow / calls, 4) if calls else 0.0,
+            **self._metrics,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the shared circuit breaker for an upstream."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name)
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Any]:
+    """Stats for every circuit breaker created so far."""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+async def call_with_retries(
+    breaker: CircuitBreaker,
+    factory: Callable[[Optional[float]], Awaitable[T]],
+    retries: int = 0,
+    is_retryable: Callable[[BaseException], bool] = lambda e: True,
+    backoff_base: float = 0.25,
+    backoff_max: float = 4.0
+) -> T:
+    """Call ``factory(timeout)`` through a breaker with jittered retries.
+
+    ``timeout`` is the time left before the request deadline (or None), so
+    each attempt can bound its own socket waits. Retries use full-jitter
+    exponential backoff and stop early when the deadline would be exceeded.
+    Only pass retries > 0 for idempotent calls.
+    """
+    attempt = 0
+    while True:
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError(f"Deadline exceeded before calling {breaker.name}")
+
+        breaker.before_call()
+        started = time.monotonic()
+        try:
+            result = await factory(remaining)
+        except asyncio.CancelledError:
+            # A cancelled call says nothing about upstream health
+            breaker.release()
+            raise
+        except Exception as e:
+            # Only transient failures count against upstream health; a 4xx
+            # caused by a bad request says nothing about the upstream itself.
+            transient = is_retryable(e)
+            breaker.record(not transient, time.monotonic() - started)
+            if attempt >= retries or not transient:
+                raise
+            delay = random.uniform(0, min(backoff_max, backoff_base * (2 ** attempt)))
+            remaining = remaining_time()
+            if remaining is not None and delay >= remaining:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record(True, time.monotonic() - started)
+        return result
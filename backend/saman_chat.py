@@ -0,0 +1,102 @@
+import os
+import re
+from typing import List, Optional
+from plate_index import EXACT, CONFUSABLE, PlateMatch
+from plate_extractor import PlateCandidate
+
+# Answer plain summons lookups from the saman data instead of the LLM
+FAST_PATH_ENABLED = os.getenv("CHAT_SAMAN_FAST_PATH", "1") != "0"
+
+# How /chat messages were answered
+CHAT_ROUTE_STATS = {"saman_fast_path": 0, "answer_cache": 0, "llm": 0}
+
+# Words that may appear in a plain lookup question besides the plate itself.
+# A message with any other word is treated as open-ended and goes to the LLM.
+_LOOKUP_WORDS = {
+    # question words and fillers
+    "berapa", "ada", "tak", "tidak", "ke", "kah", "adakah", "apa", "apakah",
+    "untuk", "bagi", "kepada", "utk", "yang", "yg", "ini", "tu", "itu",
+    "saya", "aku", "sy", "nak", "mahu", "ingin", "hendak", "minta", "tolong",
+    "sila", "boleh", "semak", "semakan", "check", "cek", "tengok", "lihat",
+    "tunjuk", "papar", "cari", "info", "maklumat", "status", "rekod", "senarai",
+    "butiran", "detail", "details", "berapakah", "banyak", "la", "lah",
+    "pls", "please", "hi", "hai", "helo", "hello", "salam",
+    # the subject of the question
+    "saman", "summon", "summons", "kompaun", "tunggakan", "hutang", "denda",
+    "jumlah", "total", "baki", "belum", "bayar", "dibayar", "outstanding",
+    "plat", "plate", "nombor", "no", "nomor", "number", "kereta", "kenderaan",
+    "motor", "motosikal", "van", "lori",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_DETAIL_SPLIT = re.compile(r",\s*(?=\d{4}-\d{2}-\d{2})")
+
+
+def is_saman_lookup(message: str, candidate: PlateCandidate) -> bool:
+    """True if the message only asks for the summons record of the plate.
+
+    The words the plate was read from are dropped and every remaining word
+    must be in the lookup vocabulary.
+    """
+    rest = message[:candidate.start] + " " + message[candidate.end:]
+    return all(word in _LOOKUP_WORDS for word in _WORD.findall(rest.lower()))
+
+
+def format_saman_answer(query: str, matches: List[PlateMatch], data) -> str:
+    """Templated Malay answer for a summons lookup.
+
+    Exact and confusable matches get the record; near misses only get the
+    closest plates as suggestions, so a typo never reveals another owner's
+    details.
+    """
+    if not matches:
+        return (
+            f"Tiada rekod saman dijumpai untuk nombor plat {query}. "
+            "Sila semak semula nombor plat tersebut."
+        )
+
+    best = matches[0]
+    if best.kind not in (EXACT, CONFUSABLE):
+        suggestions = ", ".join(match.plate for match in matches)
+        return (
+            f"Tiada rekod saman dijumpai untuk nombor plat {query}. "
+            f"Adakah anda maksudkan: {suggestions}?"
+        )
+
+    record = data[best.plate]
+    lines = []
+    if best.kind == CONFUSABLE:
+        lines.append(f"Rekod paling hampir dengan {query} ialah nombor plat {best.plate}.\n")
+    lines.append(f"Maklumat saman untuk kenderaan {best.plate}:\n")
+    lines.append(f"- Nama Pemilik: {record['owner']}\n")
+    lines.append(f"- No. IC: {record['ic']}\n")
+    lines.append(f"- Jenis Kereta: {record['car_type']}\n")
+    lines.append(f"- Jumlah Saman: {record['total_saman']}\n")
+    lines.append(f"- Saman Belum Bayar: {record['unpaid_saman']}\n")
+    lines.append(f"- Jumlah Tunggakan: {record['outstanding']}\n")
+
+    details = [item.strip() for item in _DETAIL_SPLIT.split(record["details"]) if item.strip()]
+    if details:
+        lines.append("\nButiran Saman:\n")
+        lines.extend(f"{number}. {item}\n" for number, item in enumerate(details, 1))
+
+    if record["unpaid_saman"]:
+        lines.append("\nSila jelaskan saman yang belum dibayar untuk mengelakkan tindakan lanjut.")
+    else:
+        lines.append("\nTiada saman tertunggak untuk kenderaan ini.")
+    return "".join(lines)
+
+
+def saman_fast_answer(message: str, snapshot, candidate: Optional[PlateCandidate]) -> Optional[List[str]]:
+    """Answer chunks for a plain summons lookup, or None to use the LLM.
+
+    ``candidate`` is the plate already resolved from the message against
+    ``snapshot``. The answer is returned line by line so it streams like an
+    LLM reply.
+    """
+    if not FAST_PATH_ENABLED or snapshot is None:
+        return None
+    if candidate is None or not is_saman_lookup(message, candidate):
+        return None
+    answer = format_saman_answer(candidate.plate, snapshot.index.search(candidate.plate, 3), snapshot.data)
+    return answer.splitlines(keepends=True)
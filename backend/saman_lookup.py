@@ -0,0 +1,144 @@
+import os
+import asyncio
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Tuple
+import json_codec
+from plate_index import EXACT, CONFUSABLE, normalize_plate
+
+# Upper bound on plates per /semakan/lookup request
+MAX_PLATES = int(os.getenv("SEMAKAN_LOOKUP_MAX_PLATES", "10000"))
+# Plates resolved per batch; a batch is also cut at every received body chunk
+BATCH_SIZE = int(os.getenv("SEMAKAN_LOOKUP_BATCH", "256"))
+
+# (position in the request, plate query or None, error message or None)
+LookupItem = Tuple[int, Optional[str], Optional[str]]
+
+
+def _plate_from(value: Any) -> Optional[str]:
+    """Plate from a JSON item: a string or an object with a "plate" field."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict) and isinstance(value.get("plate"), str):
+        return value["plate"]
+    return None
+
+
+def items_from_json(body: bytes) -> List[LookupItem]:
+    """Parse a JSON list of plates, or {"plates": [...]}. Raises ValueError."""
+    data = json_codec.loads(body)
+    if isinstance(data, dict):
+        data = data.get("plates")
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON list of plates or {"plates": [...]}')
+    items = []
+    for position, value in enumerate(data):
+        plate = _plate_from(value)
+        items.append((position, plate, None if plate is not None else "Expected a plate string"))
+    return items
+
+
+async def items_from_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[LookupItem]]:
+    """Parse NDJSON as it arrives, yielding the complete lines of each chunk.
+
+    Each line is a JSON string or an object with a "plate" field. Lines that
+    fail to parse are yielded with an error instead of aborting the stream.
+    """
+    position = 0
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        batch = []
+        for line in lines:
+            item = _parse_line(position, line)
+            if item is not None:
+                batch.append(item)
+                position += 1
+        if batch:
+            yield batch
+    item = _parse_line(position, pending)
+    if item is not None:
+        yield [item]
+
+
+def _parse_line(position: int, line: bytes) -> Optional[LookupItem]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        plate = _plate_from(json_codec.loads(line))
+    except ValueError:
+        return position, None, "Invalid JSON"
+    return position, plate, None if plate is not None else "Expected a plate string"
+
+
+def resolve_batch(snapshot, items: Iterable[LookupItem], candidates: int = 1, fuzzy: bool = True) -> List[Dict[str, Any]]:
+    """Resolve a batch of plate queries against one saman snapshot.
+
+    Queries that normalize to the same plate are searched once per batch.
+    A record is attached only for an exact or confusable match; fuzzy and
+    prefix matches are other vehicles and come back as suggestions.
+    """
+    resolved: Dict[str, List] = {}
+    results = []
+    for position, query, error in items:
+        if error is not None:
+            results.append({"index": position, "error": error})
+            continue
+        normalized = normalize_plate(query)
+        matches = resolved.get(normalized)
+        if matches is None:
+            matches = snapshot.index.search(normalized, candidates, None if fuzzy else 0) if normalized else []
+            resolved[normalized] = matches
+
+        result: Dict[str, Any] = {"index": position, "query": query, "normalized": normalized}
+        if matches and matches[0].kind in (EXACT, CONFUSABLE):
+            best = matches[0]
+            result.update(
+                plate_number=best.plate,
+                match=best.kind,
+                distance=best.distance,
+                record=snapshot.data[best.plate]
+            )
+            suggestions = matches[1:]
+        else:
+            result.update(plate_number=None, match=None)
+            suggestions = matches
+        if suggestions:
+            result["suggestions"] = [
+                {"plate_number": match.plate, "match": match.kind, "distance": match.distance}
+                for match in suggestions
+            ]
+        results.append(result)
+    return results
+
+
+async def stream_lookup(
+    snapshot,
+    batches: AsyncIterator[List[LookupItem]],
+    candidates: int = 1,
+    fuzzy: bool = True
+) -> AsyncIterator[bytes]:
+    """Resolve batches as they arrive and yield NDJSON result lines.
+
+    Batches are resolved in a worker thread so a large request does not hold
+    the event loop; every batch uses the same snapshot so one request never
+    mixes two data versions.
+    """
+    seen = 0
+    async for batch in batches:
+        for start in range(0, len(batch), BATCH_SIZE):
+            chunk = batch[start:start + BATCH_SIZE]
+            allowed = chunk[:MAX_PLATES - seen]
+            if allowed:
+                seen += len(allowed)
+                results = await asyncio.to_thread(resolve_batch, snapshot, allowed, candidates, fuzzy)
+                yield b"".join(json_codec.dumps_bytes(result) + b"\n" for result in results)
+            if len(allowed) < len(chunk):
+                yield json_codec.dumps_bytes({"error": f"Request exceeds {MAX_PLATES} plates; remaining input ignored"}) + b"\n"
+                return
+
+
+async def batches_from_list(items: List[LookupItem]) -> AsyncIterator[List[LookupItem]]:
+    """Wrap an already parsed list as a single batch source."""
+    yield items
@@ -0,0 +1,359 @@
+import re
+from datetime import date
+from itertools import combinations
+from typing import Dict, Any, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+import numpy as np
+
+# Offence codes; the index of a code is what the store and arrays hold
+OFFENCE_CODES = [
+    "OTHER",
+    "RED_LIGHT",
+    "ILLEGAL_PARKING",
+    "SPEEDING",
+    "SEATBELT",
+    "ROAD_TAX",
+    "FAIL_TO_STOP",
+    "HELMET",
+]
+
+# Lowercased offence text prefixes mapped to a code, checked in order
+_OFFENCE_PREFIXES = [
+    ("lompat lampu merah", "RED_LIGHT"),
+    ("langgar lampu merah", "RED_LIGHT"),
+    ("parkir", "ILLEGAL_PARKING"),
+    ("letak kereta", "ILLEGAL_PARKING"),
+    ("pecut", "SPEEDING"),
+    ("melebihi had laju", "SPEEDING"),
+    ("tidak pakai seatbelt", "SEATBELT"),
+    ("tidak pakai tali pinggang", "SEATBELT"),
+    ("gagal pamer cukai jalan", "ROAD_TAX"),
+    ("cukai jalan", "ROAD_TAX"),
+    ("gagal berhenti", "FAIL_TO_STOP"),
+    ("tidak pakai helmet", "HELMET"),
+    ("tidak pakai topi keledar", "HELMET"),
+]
+
+# Offence.paid values. The data file records only how many summonses are
+# unpaid and the amount outstanding, which does not always settle each one
+UNPAID = 0
+PAID = 1
+PAID_UNKNOWN = 2
+# Records with more offences than this are not searched for an unpaid set
+_MAX_SUBSET_OFFENCES = 12
+
+_CODE_INDEX = {code: index for index, code in enumerate(OFFENCE_CODES)}
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# "2024-01-15: Lompat lampu merah (RM150)"
+_OFFENCE = re.compile(r'(\d{4}-\d{2}-\d{2})\s*:\s*(.+?)\s*\(\s*RM\s*([\d,]+(?:\.\d{1,2})?)\s*\)')
+_AMOUNT = re.compile(r'RM\s*([\d,]+(?:\.\d{1,2})?)', re.IGNORECASE)
+
+
+class Offence(NamedTuple):
+    day: int  # days since 1970-01-01
+    code: int  # index into OFFENCE_CODES
+    amount_sen: int
+    paid: int  # UNPAID, PAID or PAID_UNKNOWN
+
+
+def offence_code(text: str) -> int:
+    """Index into OFFENCE_CODES for free-text offence wording."""
+    lowered = text.strip().lower()
+    for prefix, code in _OFFENCE_PREFIXES:
+        if lowered.startswith(prefix):
+            return _CODE_INDEX[code]
+    return _CODE_INDEX["OTHER"]
+
+
+def parse_amount_sen(text: str) -> int:
+    """Amount in sen from text like "RM450" or "RM1,250.50"; 0 if none."""
+    match = _AMOUNT.search(text)
+    if not match:
+        return 0
+    return round(float(match.group(1).replace(",", "")) * 100)
+
+
+def _unpaid_sets(amounts: List[int], unpaid_saman: int, outstanding_sen: int) -> List[Set[int]]:
+    """Sets of offence indices whose amounts add up to the outstanding amount.
+
+    Sets of ``unpaid_saman`` offences are preferred; when none adds up the
+    count is taken to be stale and sets of any size are returned.
+    """
+    if len(amounts) > _MAX_SUBSET_OFFENCES:
+        return []
+    matching = [
+        set(indices)
+        for size in range(len(amounts) + 1)
+        for indices in combinations(range(len(amounts)), size)
+        if sum(amounts[index] for index in indices) == outstanding_sen
+    ]
+    return [indices for indices in matching if len(indices) == unpaid_saman] or matching
+
+
+def parse_offences(details: str, unpaid_saman: int, outstanding_sen: int) -> List[Offence]:
+    """Parse a details field into offences ordered by date.
+
+    The data file does not record which summonses were paid, so the unpaid
+    ones are inferred as the offences whose amounts add up to the
+    outstanding amount. An offence is UNPAID or PAID when every such set
+    agrees on it, and PAID_UNKNOWN otherwise.
+    """
+    parsed = []
+    for match in _OFFENCE.finditer(details):
+        try:
+            day = date.fromisoformat(match.group(1)).toordinal() - _EPOCH_ORDINAL
+        except ValueError:
+            continue
+        amount = round(float(match.group(3).replace(",", "")) * 100)
+        parsed.append((day, offence_code(match.group(2)), amount))
+    parsed.sort()
+
+    candidates = _unpaid_sets([amount for _, _, amount in parsed], unpaid_saman, outstanding_sen)
+    offences = []
+    for index, (day, code, amount) in enumerate(parsed):
+        unpaid_in = sum(index in unpaid for unpaid in candidates)
+        if candidates and unpaid_in == len(candidates):
+            paid = UNPAID
+        elif candidates and unpaid_in == 0:
+            paid = PAID
+        else:
+            paid = PAID_UNKNOWN
+        offences.append(Offence(day, code, amount, paid))
+    return offences
+
+
+def to_day(value: date) -> int:
+    """Days since 1970-01-01 for a date."""
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def from_day(day: int) -> str:
+    """ISO date for days since 1970-01-01."""
+    return date.fromordinal(int(day) + _EPOCH_ORDINAL).isoformat()
+
+
+class OffenceTable:
+    """Columnar offences and per-record fields for vectorized queries.
+
+    Offence arrays hold one row per offence: ``record`` (record id),
+    ``day``, ``code``, ``amount`` (sen) and ``paid`` (UNPAID, PAID or
+    PAID_UNKNOWN). Record arrays hold one
+    row per record: ``car_type`` (index into ``car_types``), ``outstanding``
+    (sen) and ``live`` (False for records removed by a delta).
+    """
+
+    def __init__(
+        self,
+        plates: Sequence[str],
+        car_types: List[str],
+        car_type: np.ndarray,
+        outstanding: np.ndarray,
+        live: np.ndarray,
+        record: np.ndarray,
+        day: np.ndarray,
+        code: np.ndarray,
+        amount: np.ndarray,
+        paid: np.ndarray
+    ):
+        self.plates = plates
+        self.car_types = car_types
+        self.car_type = car_type
+        self.outstanding = outstanding
+        self.live = live
+        self._removed = not live.all()
+        self.record = record
+        self.day = day
+        self.code = code
+        self.amount = amount
+        self.paid = paid
+
+    @classmethod
+    def from_store(cls, store) -> "OffenceTable":
+        """Zero-copy arrays over the offence columns of a SamanStore."""
+        return cls(
+            plates=store.plates_column,
+            car_types=store.interned_table("car_type"),
+            car_type=np.frombuffer(store.column("car_type"), dtype=np.uint32),
+            outstanding=np.frombuffer(store.column("outstanding_sen"), dtype=np.int64),
+            live=np.ones(len(store), dtype=bool),
+            record=np.frombuffer(store.column("offence.record"), dtype=np.uint32),
+            day=np.frombuffer(store.column("offence.day"), dtype=np.int32),
+            code=np.frombuffer(store.column("offence.code"), dtype=np.uint8),
+            amount=np.frombuffer(store.column("offence.amount"), dtype=np.int64),
+            paid=np.frombuffer(store.column("offence.paid"), dtype=np.uint8),
+        )
+
+    def layered(self, hidden: Sequence[int], upserts: Mapping[str, Dict[str, Any]]) -> "OffenceTable":
+        """Table with base records ``hidden`` and delta ``upserts`` appended."""
+        live = self.live.copy()
+        live[np.asarray(hidden, dtype=np.int64)] = False
+
+        car_types = list(self.car_types)
+        car_type_ids = {name: index for index, name in enumerate(car_types)}
+        base_count = len(self.live)
+        plates: List[str] = []
+        car_type, outstanding = [], []
+        rows: List[Tuple[int, int, int, int, int]] = []
+        for offset, (plate, record) in enumerate(upserts.items()):
+            plates.append(plate)
+            car_type.append(car_type_ids.setdefault(record["car_type"], len(car_types)))
+            if len(car_type_ids) > len(car_types):
+                car_types.append(record["car_type"])
+            outstanding.append(parse_amount_sen(record["outstanding"]))
+            for offence in parse_offences(record["details"], record["unpaid_saman"], outstanding[-1]):
+                rows.append((base_count + offset, *offence))
+
+        extra = np.array(rows, dtype=np.int64).reshape(-1, 5)
+        return OffenceTable(
+            plates=_ConcatSequence(self.plates, plates),
+            car_types=car_types,
+            car_type=np.concatenate([self.car_type, np.array(car_type, dtype=np.uint32)]),
+            outstanding=np.concatenate([self.outstanding, np.array(outstanding, dtype=np.int64)]),
+            live=np.concatenate([live, np.ones(len(plates), dtype=bool)]),
+            record=np.concatenate([self.record, extra[:, 0].astype(np.uint32)]),
+            day=np.concatenate([self.day, extra[:, 1].astype(np.int32)]),
+            code=np.concatenate([self.code, extra[:, 2].astype(np.uint8)]),
+            amount=np.concatenate([self.amount, extra[:, 3]]),
+            paid=np.concatenate([self.paid, extra[:, 4].astype(np.uint8)]),
+        )
+
+    def offence_mask(
+        self,
+        codes: Optional[Sequence[str]] = None,
+        paid: Optional[bool] = None,
+        min_amount_sen: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        car_type: Optional[str] = None,
+        include_unknown: bool = False
+    ) -> np.ndarray:
+        """Boolean mask over offences matching every given filter.
+
+        Offences whose paid status is unknown match a ``paid`` filter only
+        with ``include_unknown``; see filter_paid.
+        """
+        # Skip the per-offence gather when no record was removed by a delta
+        mask = self.live[self.record] if self._removed else np.ones(len(self.record), dtype=bool)
+        if codes:
+            # Gather from a small lookup table rather than np.isin
+            wanted = np.zeros(len(OFFENCE_CODES), dtype=bool)
+            wanted[[_CODE_INDEX[code] for code in codes]] = True
+            mask &= wanted[self.code]
+        if min_amount_sen is not None:
+            mask &= self.amount >= min_amount_sen
+        if date_from is not None:
+            mask &= self.day >= to_day(date_from)
+        if date_to is not None:
+            mask &= self.day <= to_day(date_to)
+        if car_type is not None:
+            mask &= self.car_type[self.record] == self._car_type_id(car_type)
+        if paid is not None:
+            mask, _ = self.filter_paid(mask, paid, include_unknown)
+        return mask
+
+    def filter_paid(self, mask: np.ndarray, paid: bool, include_unknown: bool = False) -> Tuple[np.ndarray, int]:
+        """``mask`` narrowed to paid or unpaid offences, and how many offences
+        with an unknown paid status were left out (0 with ``include_unknown``)."""
+        unknown = self.paid == PAID_UNKNOWN
+        wanted = self.paid == (PAID if paid else UNPAID)
+        if include_unknown:
+            return mask & (wanted | unknown), 0
+        return mask & wanted, int(np.count_nonzero(mask & unknown))
+
+    def _car_type_id(self, name: str) -> int:
+        lowered = name.strip().lower()
+        for index, candidate in enumerate(self.car_types):
+            if candidate.lower() == lowered:
+                return index
+        return -1
+
+    def plates_matching(self, mask: np.ndarray, min_total_sen: Optional[int] = None, limit: int = 100):
+        """Count of records with matching offences, and up to ``limit`` of them
+        as (plate, count, total_sen) with the largest total first."""
+        records = self.record[mask]
+        if not len(records):
+            return 0, []
+        size = len(self.live)
+        counts = np.bincount(records, minlength=size)
+        totals = np.bincount(records, weights=self.amount[mask], minlength=size).astype(np.int64)
+        hit = counts > 0
+        if min_total_sen is not None:
+            hit &= totals >= min_total_sen
+        ids = np.flatnonzero(hit)
+        if len(ids) > limit:
+            # Partial selection of the top totals instead of a full sort
+            ids = ids[np.argpartition(-totals[ids], limit - 1)[:limit]]
+        ids = ids[np.lexsort((ids, -totals[ids]))]
+        return int(hit.sum()), [
+            (self.plates[int(i)], int(counts[i]), int(totals[i])) for i in ids
+        ]
+
+    def aggregate(self, group_by: str, mask: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Group totals by "car_type", "offence" or "month".
+
+        car_type groups sum each record's outstanding amount; offence and
+        month groups count and sum the offences selected by ``mask``, with
+        how many are known to be unpaid and how many have an unknown status.
+        """
+        if group_by == "car_type":
+            live = self.live
+            groups = self.car_type[live]
+            size = len(self.car_types)
+            records = np.bincount(groups, minlength=size)
+            outstanding = np.bincount(groups, weights=self.outstanding[live], minlength=size).astype(np.int64)
+            return [
+                {"group": self.car_types[i], "records": int(records[i]), "outstanding_sen": int(outstanding[i])}
+                for i in np.argsort(-outstanding, kind="stable") if records[i]
+            ]
+
+        mask = self.offence_mask() if mask is None else mask
+        if group_by == "offence":
+            keys = self.code[mask]
+            first = 0
+            label = lambda key: OFFENCE_CODES[key]
+        elif group_by == "month":
+            days = self.day[mask]
+            if not len(days):
+                return []
+            # Map days to months through a table over the date range; far
+            # cheaper than converting every offence through datetime64
+            first_day = int(days.min())
+            month_of_day = np.arange(first_day, int(days.max()) + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+            first = int(month_of_day[0])
+            keys = month_of_day[days - first_day] - first
+            label = lambda key: str(np.datetime64(int(key), "M"))
+        else:
+            raise ValueError(f"Unknown group_by: {group_by}")
+
+        # Keys are small dense integers, so bincount groups without sorting
+        counts = np.bincount(keys)
+        totals = np.bincount(keys, weights=self.amount[mask], minlength=len(counts)).astype(np.int64)
+        paid = self.paid[mask]
+        unpaid = np.bincount(keys[paid == UNPAID], minlength=len(counts))
+        unknown = np.bincount(keys[paid == PAID_UNKNOWN], minlength=len(counts))
+        return [
+            {
+                "group": label(first + i),
+                "offences": int(counts[i]),
+                "unpaid": int(unpaid[i]),
+                "paid_unknown": int(unknown[i]),
+                "amount_sen": int(totals[i]),
+            }
+            for i in np.flatnonzero(counts)
+        ]
+
+
+class _ConcatSequence(Sequence):
+    """Two sequences read as one, without copying the first."""
+
+    def __init__(self, first: Sequence, second: Sequence):
+        self._first = first
+        self._second = second
+
+    def __len__(self) -> int:
+        return len(self._first) + len(self._second)
+
+    def __getitem__(self, index: int):
+        if index < len(self._first):
+            return self._first[index]
+        return self._second[index - len(self._first)]
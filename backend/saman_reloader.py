@@ -0,0 +1,231 @@
+import os
+import time
+import asyncio
+import struct
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections.abc import Mapping
+from typing import Dict, Any, Iterator, List, NamedTuple, Optional, Set, Tuple
+from dotenv import load_dotenv
+from plate_index import PlateIndex, PlateMatch, match_rank
+from saman_offences import OffenceTable
+from saman_store import (
+    SamanStore, default_store_path, ensure_saman_store, iter_saman_delta, source_stamp
+)
+
+load_dotenv()
+
+
+class LayeredSamanData(Mapping):
+    """Read-only view of a base store with delta upserts and deletions applied."""
+
+    def __init__(self, base: Mapping, upserts: Dict[str, Dict[str, Any]], deleted: Set[str]):
+        self.base = base
+        self.upserts = upserts
+        # Deleted plates that exist in the base and were not re-added later
+        self.deleted = {plate for plate in deleted if plate in base and plate not in upserts}
+        self._added = sum(1 for plate in upserts if plate not in base)
+
+    def __getitem__(self, plate: str) -> Dict[str, Any]:
+        if plate in self.upserts:
+            return self.upserts[plate]
+        if plate in self.deleted:
+            raise KeyError(plate)
+        return self.base[plate]
+
+    def __contains__(self, plate) -> bool:
+        if plate in self.upserts:
+            return True
+        return plate not in self.deleted and plate in self.base
+
+    def __len__(self) -> int:
+        return len(self.base) + self._added - len(self.deleted)
+
+    def __iter__(self) -> Iterator[str]:
+        for plate in self.base:
+            if plate not in self.deleted and plate not in self.upserts:
+                yield plate
+        yield from self.upserts
+
+
+class LayeredPlateIndex:
+    """Searches the base index and the delta index and merges the rankings."""
+
+    def __init__(self, base: PlateIndex, data: LayeredSamanData):
+        self.base = base
+        self.overlay = PlateIndex(data.upserts.keys())
+        self._hidden = data.deleted | set(data.upserts)
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.overlay)
+
+    def search(self, query: str, limit: int = 5, max_distance: Optional[int] = None) -> List[PlateMatch]:
+        """Ranked matches across both layers."""
+        # Over-fetch from the base so hidden plates do not shorten the result
+        base = [
+            match for match in self.base.search(query, limit + len(self._hidden), max_distance)
+            if match.plate not in self._hidden
+        ] if self._hidden else self.base.search(query, limit, max_distance)
+        overlay = self.overlay.search(query, limit, max_distance) if len(self.overlay) else []
+        return sorted(base + overlay, key=match_rank)[:limit]
+
+
+class SamanSnapshot(NamedTuple):
+    """Immutable saman dataset swapped in as a whole on reload."""
+    data: Mapping
+    index: Any
+    offences: OffenceTable
+    version: str
+    base_stamp: str
+    delta_stamps: Tuple[Tuple[str, str], ...]
+    loaded_at: float
+
+
+class SamanReloader:
+    """Keeps the saman dataset current without restarting workers.
+
+    A background task polls the data file and a directory of delta files.
+    When the data file changes its binary store is rebuilt in a separate
+    process; when only deltas change they are layered over the current store
+    without a rebuild. The new snapshot replaces the old one in a single
+    assignment, so requests already holding the old snapshot finish on it.
+    """
+
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+        self.store_path = os.getenv("CAR_SAMAN_STORE", "") or default_store_path(source_path)
+        self.delta_dir = os.getenv("CAR_SAMAN_DELTA_DIR", "") or os.path.splitext(source_path)[0] + ".d"
+        self.interval = float(os.getenv("CAR_SAMAN_RELOAD_INTERVAL", "30"))
+        self.snapshot: Optional[SamanSnapshot] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._metrics = {
+            "reloads": 0,
+            "reload_failures": 0,
+            "last_reload_seconds": 0.0,
+            "last_error": None,
+        }
+
+    def _scan(self) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+        """Stamps of the data file and of every delta file, in apply order."""
+        deltas = []
+        if os.path.isdir(self.delta_dir):
+            for name in sorted(os.listdir(self.delta_dir)):
+                path = os.path.join(self.delta_dir, name)
+                if name.endswith(".txt") and os.path.isfile(path):
+                    deltas.append((name, source_stamp(path)))
+        return source_stamp(self.source_path), tuple(deltas)
+
+    def _snapshot(
+        self,
+        store: SamanStore,
+        base_stamp: str,
+        delta_stamps: Tuple[Tuple[str, str], ...]
+    ) -> SamanSnapshot:
+        upserts: Dict[str, Dict[str, Any]] = {}
+        deleted: Set[str] = set()
+        for name, _ in delta_stamps:
+            for plate, record in iter_saman_delta(os.path.join(self.delta_dir, name)):
+                if record is None:
+                    upserts.pop(plate, None)
+                    deleted.add(plate)
+                else:
+                    upserts[plate] = record
+
+        offences = OffenceTable.from_store(store)
+        if upserts or deleted:
+            data = LayeredSamanData(store, upserts, deleted)
+            index = LayeredPlateIndex(store.plate_index(), data)
+            replaced = [store.position(plate) for plate in data.deleted | set(upserts)]
+            offences = offences.layered([p for p in replaced if p is not None], upserts)
+        else:
+            data, index = store, store.plate_index()
+
+        version = hashlib.sha256(repr((base_stamp, delta_stamps)).encode()).hexdigest()[:12]
+        return SamanSnapshot(data, index, offences, version, base_stamp, delta_stamps, time.time())
+
+    def load(self) -> SamanSnapshot:
+        """Load synchronously at startup.
+
+        An existing store is opened as-is even if the data file has changed
+        since, so startup does not wait for a rebuild; the first background
+        reload picks up the change.
+        """
+        started = time.perf_counter()
+        base_stamp, delta_stamps = self._scan()
+        try:
+            store = SamanStore(self.store_path)
+            base_stamp = store.source_stamp
+        except (OSError, ValueError, KeyError, struct.error):
+            store = SamanStore(ensure_saman_store(self.source_path, self.store_path))
+        self.snapshot = self._snapshot(store, base_stamp, delta_stamps)
+        self._metrics["last_reload_seconds"] = round(time.perf_counter() - started, 4)
+        return self.snapshot
+
+    async def reload(self) -> bool:
+        """Rebuild and swap in the dataset if any source changed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            base_stamp, delta_stamps = await asyncio.to_thread(self._scan)
+            current = self.snapshot
+            if current and (current.base_stamp, current.delta_stamps) == (base_stamp, delta_stamps):
+                return False
+
+            started = time.perf_counter()
+            try:
+                if current and current.base_stamp == base_stamp:
+                    store = current.data.base if isinstance(current.data, LayeredSamanData) else current.data
+                else:
+                    # Build in a child process so the GIL stays free for requests
+                    loop = asyncio.get_running_loop()
+                    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                        await loop.run_in_executor(pool, ensure_saman_store, self.source_path, self.store_path)
+                    store = await asyncio.to_thread(SamanStore, self.store_path)
+                snapshot = await asyncio.to_thread(self._snapshot, store, store.source_stamp, delta_stamps)
+            except Exception as e:
+                self._metrics["reload_failures"] += 1
+                self._metrics["last_error"] = str(e)
+                raise
+
+            self.snapshot = snapshot
+            self._metrics["reloads"] += 1
+            self._metrics["last_reload_seconds"] = round(time.perf_counter() - started, 4)
+            self._metrics["last_error"] = None
+            print(f"Reloaded {len(snapshot.data)} car saman records (version {snapshot.version})")
+            return True
+
+    async def _run(self):
+        while True:
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"Car saman reload failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start polling for changes. CAR_SAMAN_RELOAD_INTERVAL=0 disables it."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stop polling."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Current data version, record count and reload timings."""
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "records": len(snapshot.data) if snapshot else 0,
+            "deltas": len(snapshot.delta_stamps) if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            **self._metrics,
+        }
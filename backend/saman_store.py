@@ -0,0 +1,377 @@
+import os
+import mmap
+import zlib
+import struct
+import tempfile
+from collections.abc import Mapping, Sequence
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+import json_codec
+from plate_index import PlateIndex, canonical_plate
+from saman_offences import parse_offences, parse_amount_sen
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MAGIC = b"SAMN"
+FORMAT_VERSION = 3
+_HEADER = struct.Struct("<4sII")  # magic, format version, table of contents length
+_ALIGN = 8
+
+# Record fields in the order they appear in car_saman_data.txt
+FIELDS = ("owner", "ic", "car_type", "total_saman", "unpaid_saman", "outstanding", "details")
+# Low-cardinality string fields stored once in a table and referenced by index
+_INTERNED = ("car_type", "outstanding")
+_INTEGERS = ("total_saman", "unpaid_saman")
+
+
+def _parse_record(line: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    parts = line.split('|')
+    if len(parts) < 8:
+        return None
+    return parts[0].strip(), {
+        "owner": parts[1].strip(),
+        "ic": parts[2].strip(),
+        "car_type": parts[3].strip(),
+        "total_saman": int(parts[4].strip()),
+        "unpaid_saman": int(parts[5].strip()),
+        "outstanding": parts[6].strip(),
+        "details": parts[7].strip()
+    }
+
+
+def iter_saman_records(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield (plate, record) pairs from a pipe-separated saman data file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            # Skip comments and empty lines
+            if not line or line.startswith('#'):
+                continue
+            parsed = _parse_record(line)
+            if parsed:
+                yield parsed
+
+
+def iter_saman_delta(path: str) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+    """Yield (plate, record) upserts and (plate, None) deletions from a delta file.
+
+    Delta files use the data file format; a line ``-PLATE`` deletes a plate.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('-'):
+                yield line[1:].strip(), None
+                continue
+            parsed = _parse_record(line)
+            if parsed:
+                yield parsed
+
+
+class _Writer:
+    """Appends aligned sections to a file and records them in a table of contents."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        self.toc: Dict[str, List[Any]] = {}
+
+    def add(self, name: str, data: bytes, typecode: str = "B"):
+        padding = -self.offset % _ALIGN
+        self.f.write(b"\0" * padding)
+        self.offset += padding
+        self.toc[name] = [self.offset, len(data), typecode]
+        self.f.write(data)
+        self.offset += len(data)
+
+    def add_strings(self, name: str, values: Iterable[str]):
+        blob = bytearray()
+        offsets = [0]
+        for value in values:
+            blob += value.encode("utf-8")
+            offsets.append(len(blob))
+        self.add(name + ".offsets", struct.pack(f"<{len(offsets)}Q", *offsets), "Q")
+        self.add(name + ".blob", bytes(blob))
+
+
+def build_saman_store(records: Iterable[Tuple[str, Dict[str, Any]]], path: str, stamp: str = ""):
+    """Write records to a binary store file, atomically replacing ``path``.
+
+    Records are sorted by canonical plate so the plate column doubles as a
+    prefix index. Each string field is a UTF-8 blob with an offsets array,
+    integer fields are packed arrays, and a hash table of record positions
+    keyed by crc32 of the canonical plate serves point lookups.
+    """
+    # A later line for the same plate replaces an earlier one
+    rows = sorted((canonical_plate(plate), plate, record) for plate, record in dict(records).items())
+    count = len(rows)
+
+    body = tempfile.TemporaryFile()
+    writer = _Writer(body)
+    writer.add_strings("key", (key for key, _, _ in rows))
+    writer.add_strings("plate", (plate for _, plate, _ in rows))
+    for field in ("owner", "ic", "details"):
+        writer.add_strings(field, (record[field] for _, _, record in rows))
+    for field in _INTERNED:
+        table: Dict[str, int] = {}
+        refs = [table.setdefault(record[field], len(table)) for _, _, record in rows]
+        writer.add_strings(field + ".table", table)
+        writer.add(field, struct.pack(f"<{count}I", *refs), "I")
+    for field in _INTEGERS:
+        writer.add(field, struct.pack(f"<{count}i", *(record[field] for _, _, record in rows)), "i")
+    writer.add(
+        "outstanding_sen",
+        struct.pack(f"<{count}q", *(parse_amount_sen(record["outstanding"]) for _, _, record in rows)),
+        "q"
+    )
+
+    # Typed offences parsed from the details text, one row per offence
+    offences = [
+        (position, offence)
+        for position, (_, _, record) in enumerate(rows)
+        for offence in parse_offences(record["details"], record["unpaid_saman"], parse_amount_sen(record["outstanding"]))
+    ]
+    total = len(offences)
+    writer.add("offence.record", struct.pack(f"<{total}I", *(position for position, _ in offences)), "I")
+    writer.add("offence.day", struct.pack(f"<{total}i", *(offence.day for _, offence in offences)), "i")
+    writer.add("offence.code", struct.pack(f"<{total}B", *(offence.code for _, offence in offences)), "B")
+    writer.add("offence.amount", struct.pack(f"<{total}q", *(offence.amount_sen for _, offence in offences)), "q")
+    writer.add("offence.paid", struct.pack(f"<{total}B", *(offence.paid for _, offence in offences)), "B")
+
+    # Open addressing with linear probing; slots hold position + 1, 0 is empty
+    size = 1
+    while size < count * 2:
+        size *= 2
+    slots = [0] * size
+    previous = None
+    for position, (key, _, _) in enumerate(rows):
+        if key == previous:
+            continue  # only the first record of a run of equal keys is hashed
+        previous = key
+        slot = zlib.crc32(key.encode("utf-8")) & (size - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = position + 1
+    writer.add("hash", struct.pack(f"<{size}I", *slots), "I")
+
+    toc = json_codec.dumps_bytes({"count": count, "source": stamp, "sections": writer.toc})
+    header_size = _HEADER.size + len(toc)
+    header_size += -header_size % _ALIGN
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(toc)))
+            out.write(toc)
+            out.write(b"\0" * (header_size - _HEADER.size - len(toc)))
+            body.seek(0)
+            while True:
+                chunk = body.read(1 << 20)
+                if not chunk:
+                    break
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    finally:
+        body.close()
+
+
+class _StringColumn(Sequence):
+    """Read-only sequence of strings decoded on access from a mapped blob."""
+
+    def __init__(self, buffer: mmap.mmap, offsets: memoryview, blob_start: int):
+        self._buffer = buffer
+        self._offsets = offsets
+        self._blob_start = blob_start
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._buffer[start:end].decode("utf-8")
+
+
+class SamanStore(Mapping):
+    """Read-only, memory-mapped mapping of plate -> saman record.
+
+    Records are decoded into dicts only when looked up, so resident memory
+    is the shared page cache of the file rather than a Python object per
+    field per plate. Every worker that opens the same file shares it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, toc_length = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported saman store file: {path}")
+        toc = json_codec.loads(self._buffer[_HEADER.size:_HEADER.size + toc_length])
+        header_size = _HEADER.size + toc_length
+        header_size += -header_size % _ALIGN
+
+        self.source_stamp = toc["source"]
+        self._count = toc["count"]
+        self._view = memoryview(self._buffer)
+        self._exports: List[memoryview] = []
+        self._sections = {
+            name: (header_size + offset, length, typecode)
+            for name, (offset, length, typecode) in toc["sections"].items()
+        }
+        array = self.column
+
+        def strings(name: str) -> _StringColumn:
+            return _StringColumn(self._buffer, array(name + ".offsets"), self._sections[name + ".blob"][0])
+
+        self.keys_column = strings("key")
+        self._key_offsets = self.keys_column._offsets
+        self._key_blob = self.keys_column._blob_start
+        self.plates_column = strings("plate")
+        self._strings = {field: strings(field) for field in ("owner", "ic", "details")}
+        self._interned = {field: (list(strings(field + ".table")), array(field)) for field in _INTERNED}
+        self._integers = {field: array(field) for field in _INTEGERS}
+        self._hash = array("hash")
+
+    def column(self, name: str) -> memoryview:
+        """Typed view of a section, e.g. for numpy.frombuffer."""
+        start, length, typecode = self._sections[name]
+        view = self._view[start:start + length].cast(typecode)
+        self._exports.append(view)
+        return view
+
+    def interned_table(self, field: str) -> List[str]:
+        """Distinct values of an interned field, indexed by the field's column."""
+        return self._interned[field][0]
+
+    def position(self, plate: str) -> Optional[int]:
+        """Record position of a plate, or None."""
+        return self._position(plate)
+
+    def find_key(self, key: str) -> Optional[int]:
+        """Position of the first record with this canonical plate, or None."""
+        size = len(self._hash)
+        if not size:
+            return None
+        encoded = key.encode("utf-8")
+        offsets, blob_start, buffer = self._key_offsets, self._key_blob, self._buffer
+        slot = zlib.crc32(encoded) & (size - 1)
+        while True:
+            entry = self._hash[slot]
+            if not entry:
+                return None
+            # Compare raw bytes to avoid decoding every probed key
+            if buffer[blob_start + offsets[entry - 1]:blob_start + offsets[entry]] == encoded:
+                return entry - 1
+            slot = (slot + 1) & (size - 1)
+
+    def record_at(self, position: int) -> Dict[str, Any]:
+        """Decode the record stored at a position."""
+        record: Dict[str, Any] = {}
+        for field in FIELDS:
+            if field in self._strings:
+                record[field] = self._strings[field][position]
+            elif field in self._interned:
+                table, refs = self._interned[field]
+                record[field] = table[refs[position]]
+            else:
+                record[field] = self._integers[field][position]
+        return record
+
+    def _position(self, plate: str) -> Optional[int]:
+        if not isinstance(plate, str):
+            return None
+        key = canonical_plate(plate)
+        position = self.find_key(key)
+        if position is None:
+            return None
+        while position < self._count and self.keys_column[position] == key:
+            if self.plates_column[position] == plate:
+                return position
+            position += 1
+        return None
+
+    def __getitem__(self, plate: str) -> Dict[str, Any]:
+        position = self._position(plate)
+        if position is None:
+            raise KeyError(plate)
+        return self.record_at(position)
+
+    def __contains__(self, plate) -> bool:
+        return self._position(plate) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.plates_column)
+
+    def plate_index(self) -> PlateIndex:
+        """PlateIndex that searches this store in place."""
+        return PlateIndex.from_sorted(self.keys_column, self.plates_column, self.find_key)
+
+    def close(self):
+        """Unmap the file. Records must not be read afterwards."""
+        for view in self._exports:
+            view.release()
+        self._view.release()
+        self._buffer.close()
+
+
+def source_stamp(source_path: str) -> str:
+    """Size and mtime of a source file, used to detect changes."""
+    stat = os.stat(source_path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def default_store_path(source_path: str) -> str:
+    """Binary store path for a text data file."""
+    return os.path.splitext(source_path)[0] + ".bin"
+
+
+def _store_is_current(store_path: str, stamp: str) -> bool:
+    try:
+        store = SamanStore(store_path)
+    except (OSError, ValueError, KeyError, struct.error):
+        return False
+    try:
+        return store.source_stamp == stamp
+    finally:
+        store.close()
+
+
+def ensure_saman_store(source_path: str, store_path: Optional[str] = None) -> str:
+    """Build the binary store for a text data file unless it is current.
+
+    A lock file serializes builds so that several workers noticing the same
+    change build the store once. Returns the store path.
+    """
+    store_path = store_path or default_store_path(source_path)
+    stamp = source_stamp(source_path)
+    if _store_is_current(store_path, stamp):
+        return store_path
+
+    with open(store_path + ".lock", "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another process may have finished the build while we waited
+        if not _store_is_current(store_path, stamp):
+            build_saman_store(iter_saman_records(source_path), store_path, stamp)
+    return store_path
+
+
+def open_saman_store(source_path: str, store_path: Optional[str] = None) -> SamanStore:
+    """Open the binary store for a text data file, rebuilding it when stale."""
+    return SamanStore(ensure_saman_store(source_path, store_path))
@@ -0,0 +1,73 @@
+import json
+import asyncio
+import hashlib
+from typing import Dict, Any, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of a request, independent of dict key order."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one shared task.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result. A waiter that is cancelled only
+    detaches itself, and the shared task is cancelled only when no waiters
+    are left.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._metrics = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "abandoned": 0,
+        }
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """Run ``factory()`` once per key among concurrent callers."""
+        self._metrics["calls"] += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._metrics["executions"] += 1
+        else:
+            self._metrics["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                self._metrics["abandoned"] += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark exceptions as retrieved when every waiter was cancelled
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Call counters and number of in-flight keys."""
+        return {"in_flight": len(self._calls), **self._metrics}
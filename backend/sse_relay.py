@@ -0,0 +1,212 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+import json_codec
+
+# A frame is flushed once it has been open this long or holds this many characters
+FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_INTERVAL_MS", "30")) / 1000
+FLUSH_MAX_CHARS = int(os.getenv("SSE_FLUSH_MAX_CHARS", "512"))
+
+_DONE = object()
+
+
+def sse_frame(content: str) -> bytes:
+    """One SSE data frame carrying a chunk of chat content."""
+    return b"data: " + json_codec.dumps_bytes({"content": content}) + b"\n\n"
+
+
+class SSEParser:
+    """Incremental parser for a server-sent event stream.
+
+    Bytes are fed as they arrive from the network, in chunks that need not
+    line up with lines or events; ``feed`` returns the data payload of every
+    event completed by the chunk.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        events = []
+        lines = (self._pending + chunk).split(b"\n")
+        self._pending = lines.pop()
+        for line in lines:
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                # A blank line ends the event
+                if self._data:
+                    events.append(b"\n".join(self._data))
+                    self._data = []
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                self._data.append(value[1:] if value.startswith(b" ") else value)
+            # Comments and other fields (event, id, retry) are not used
+        return events
+
+    def close(self) -> List[bytes]:
+        """Payload of a final event the stream ended without terminating."""
+        events = self.feed(b"\n\n") if self._pending or self._data else []
+        self._pending = b""
+        return events
+
+
+class _RateWindow:
+    """Events per second over the last ``seconds`` seconds."""
+
+    def __init__(self, seconds: int = 60):
+        self.seconds = seconds
+        self._buckets: deque = deque()
+
+    def add(self, count: int = 1):
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += count
+        else:
+            self._buckets.append([now, count])
+        self._trim(now)
+
+    def _trim(self, now: int):
+        while self._buckets and self._buckets[0][0] <= now - self.seconds:
+            self._buckets.popleft()
+
+    def rate(self) -> float:
+        self._trim(int(time.monotonic()))
+        return round(sum(count for _, count in self._buckets) / self.seconds, 2)
+
+
+class SSERelay:
+    """Relays upstream chat tokens to clients in coalesced SSE frames.
+
+    A pump task reads token batches into a buffer while the client side
+    sends one frame per FLUSH_INTERVAL with everything buffered so far,
+    split at FLUSH_MAX_CHARS. The first tokens go out immediately so
+    coalescing does not add to time to first token.
+    """
+
+    def __init__(self):
+        self._frames = _RateWindow()
+        self._metrics = {
+            "streams": 0,
+            "active_streams": 0,
+            "tokens": 0,
+            "frames": 0,
+            "bytes": 0,
+            "cpu_seconds": 0.0,
+        }
+
+    async def relay(self, batches: AsyncIterator[List[str]]) -> AsyncIterator[bytes]:
+        """Coalesce batches of tokens into SSE frames."""
+        buffer: List[str] = []
+        ready = asyncio.Event()
+        state: Dict[str, Any] = {"done": False, "error": None}
+
+        async def pump():
+            try:
+                async for batch in batches:
+                    if batch:
+                        buffer.extend(batch)
+                        ready.set()
+            except Exception as e:
+                # Re-raised on the client side of the relay
+                state["error"] = e
+            finally:
+                state["done"] = True
+                ready.set()
+
+        self._metrics["streams"] += 1
+        self._metrics["active_streams"] += 1
+        task = asyncio.create_task(pump())
+        try:
+            first = True
+            while True:
+                await ready.wait()
+                if not first and not state["done"]:
+                    # Let tokens accumulate for the rest of the window
+                    await asyncio.sleep(FLUSH_INTERVAL)
+                ready.clear()
+                if buffer:
+                    first = False
+                    pending = buffer[:]
+                    del buffer[:]
+                    for frame in self._encode(pending):
+                        yield frame
+                if state["done"] and not buffer:
+                    break
+            if state["error"] is not None:
+                raise state["error"]
+        finally:
+            self._metrics["active_streams"] -= 1
+            if not task.done():
+                task.cancel()
+
+    def _encode(self, tokens: List[str]) -> List[bytes]:
+        started = time.thread_time()
+        content = "".join(tokens)
+        frames = [
+            sse_frame(content[start:start + FLUSH_MAX_CHARS])
+            for start in range(0, len(content), FLUSH_MAX_CHARS)
+        ]
+        self._metrics["tokens"] += len(tokens)
+        self._metrics["frames"] += len(frames)
+        self._metrics["bytes"] += sum(len(frame) for frame in frames)
+        self._metrics["cpu_seconds"] += time.thread_time() - started
+        self._frames.add(len(frames))
+        return frames
+
+    async def upstream_tokens(self, chunks: AsyncIterator[bytes], on_event=None) -> AsyncIterator[List[str]]:
+        """Content tokens from an OpenAI-style SSE byte stream, one batch per chunk read.
+
+        ``on_event`` is called with every decoded event, e.g. to read usage.
+        """
+        parser = SSEParser()
+        async for chunk in chunks:
+            contents, done = self._decode(parser.feed(chunk), on_event)
+            yield contents
+            if done:
+                return
+        contents, _ = self._decode(parser.close(), on_event)
+        yield contents
+
+    def _decode(self, events: List[bytes], on_event) -> Tuple[List[str], bool]:
+        """Content of each event, and whether the stream sent [DONE]."""
+        started = time.thread_time()
+        contents = []
+        done = False
+        for data in events:
+            if data == b"[DONE]":
+                done = True
+                break
+            try:
+                event = json_codec.loads(data)
+            except json_codec.JSONDecodeError:
+                continue
+            if on_event is not None:
+                on_event(event)
+            delta = (event.get("choices") or [{}])[0].get("delta") or {}
+            if delta.get("content"):
+                contents.append(delta["content"])
+        self._metrics["cpu_seconds"] += time.thread_time() - started
+        return contents, done
+
+    def frames(self, chunks: List[str]) -> List[bytes]:
+        """Frames for content that is already complete, e.g. a templated answer."""
+        return self._encode(chunks)
+
+    def stats(self) -> Dict[str, Any]:
+        """Frame rate, tokens per frame and relay CPU time per stream."""
+        stats: Dict[str, Any] = dict(self._metrics)
+        stats["cpu_seconds"] = round(stats["cpu_seconds"], 4)
+        stats["frames_per_second"] = self._frames.rate()
+        stats["tokens_per_frame"] = round(stats["tokens"] / stats["frames"], 2) if stats["frames"] else None
+        stats["cpu_ms_per_stream"] = (
+            round(self._metrics["cpu_seconds"] * 1000 / stats["streams"], 3) if stats["streams"] else None
+        )
+        return stats
+
+
+# Global SSE relay
+sse_relay = SSERelay()
@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import aiohttp
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from http_client import http_client, UpstreamError
+
+load_dotenv()
+
+# Paths a Whisper-compatible server may serve transcriptions on, in the
+# order they are probed
+TRANSCRIPTION_PATHS = ["/audio/transcriptions", "/transcriptions"]
+
+# Statuses that mean the path itself does not exist
+_MISSING_ROUTE = (404, 405)
+
+
+class TranscriptionClient:
+    """Whisper transcription over the pooled "whisper" upstream session.
+
+    The working endpoint is discovered once, at startup or on first use, by
+    probing each known path with a form that carries no audio; the audio is
+    then uploaded to that endpoint only. A 404 later on clears the cached
+    endpoint so it is discovered again. WHISPER_TRANSCRIPTION_PATH skips
+    discovery. Timeouts, retries and the circuit breaker come from the
+    "whisper" upstream settings in http_client.
+    """
+
+    def __init__(self):
+        self.api_key = os.getenv("WHISPER_API_KEY", "sk-2iTJBlqeaDWPTmGHm-kfbg")
+        self.api_base = os.getenv("WHISPER_API_URL", "http://60.51.17.97:9999/v1").rstrip("/")
+        self.model = os.getenv("WHISPER_MODEL", "whisper-large-v3-turbo")
+        path = os.getenv("WHISPER_TRANSCRIPTION_PATH", "")
+        self._endpoint: Optional[str] = f"{self.api_base}/{path.lstrip('/')}" if path else None
+        self._discovery_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._metrics = {
+            "requests": 0,
+            "failures": 0,
+            "audio_bytes": 0,
+            "upload_bytes": 0,
+            "latency_seconds": 0.0,
+            "last_audio_bytes": None,
+            "last_latency_seconds": None,
+            "discoveries": 0,
+            "endpoint_misses": 0,
+        }
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def start(self):
+        """Discover the endpoint in the background. Called from the startup hook."""
+        if self._task is None and self._endpoint is None:
+            self._task = asyncio.create_task(self.discover())
+
+    async def close(self):
+        """Stop a discovery still in progress."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def discover(self) -> Optional[str]:
+        """The working transcription endpoint, probing the known paths if needed."""
+        async with self._discovery_lock:
+            if self._endpoint is not None:
+                return self._endpoint
+            self._metrics["discoveries"] += 1
+            for endpoint in self._candidates():
+                try:
+                    await http_client.post_form("whisper", endpoint, self._probe_form, self.headers, idempotent=False)
+                except UpstreamError as e:
+                    if e.status in _MISSING_ROUTE:
+                        continue
+                    # The route exists and rejected a form without audio
+                except Exception as e:
+                    print(f"Whisper endpoint probe failed at {endpoint}: {e}")
+                    return None
+                print(f"Whisper transcription endpoint: {endpoint}")
+                self._endpoint = endpoint
+                return endpoint
+            print(f"No Whisper transcription endpoint found under {self.api_base}")
+            return None
+
+    async def transcribe(self, audio: bytes, filename: str = "recording.webm", content_type: str = "audio/webm") -> str:
+        """Transcribe audio and return the text. Raises on failure."""
+        started = time.perf_counter()
+        self._metrics["requests"] += 1
+        self._metrics["audio_bytes"] += len(audio)
+        try:
+            result = await self._post_audio(audio, filename, content_type)
+        except Exception:
+            self._metrics["failures"] += 1
+            raise
+        finally:
+            latency = time.perf_counter() - started
+            self._metrics["latency_seconds"] += latency
+            self._metrics["last_audio_bytes"] = len(audio)
+            self._metrics["last_latency_seconds"] = round(latency, 4)
+            print(f"Transcription of {len(audio)} bytes took {latency * 1000:.0f} ms")
+        return result.get("text", "")
+
+    async def _post_audio(self, audio: bytes, filename: str, content_type: str) -> Dict[str, Any]:
+        def audio_form() -> aiohttp.FormData:
+            self._metrics["upload_bytes"] += len(audio)
+            form = aiohttp.FormData()
+            form.add_field("file", audio, filename=filename, content_type=content_type)
+            form.add_field("model", self.model)
+            return form
+
+        for _ in range(2):
+            endpoint = self._endpoint or await self.discover()
+            if endpoint is None:
+                raise UpstreamError(503, "No Whisper transcription endpoint available")
+            try:
+                return await http_client.post_form("whisper", endpoint, audio_form, self.headers)
+            except UpstreamError as e:
+                if e.status not in _MISSING_ROUTE:
+                    raise
+                # The server moved its route; forget it and discover again once
+                self._metrics["endpoint_misses"] += 1
+                if self._endpoint == endpoint:
+                    self._endpoint = None
+                last_error = e
+        raise last_error
+
+    def _candidates(self) -> List[str]:
+        return [f"{self.api_base}{path}" for path in TRANSCRIPTION_PATHS]
+
+    def _probe_form(self) -> aiohttp.FormData:
+        form = aiohttp.FormData()
+        form.add_field("model", self.model)
+        return form
+
+    def stats(self) -> Dict[str, Any]:
+        """Endpoint in use, audio volume, upload amplification and latency."""
+        stats: Dict[str, Any] = {"endpoint": self._endpoint, **self._metrics}
+        stats["latency_seconds"] = round(stats["latency_seconds"], 4)
+        requests = stats["requests"]
+        stats["avg_latency_seconds"] = round(self._metrics["latency_seconds"] / requests, 4) if requests else None
+        stats["avg_audio_bytes"] = round(stats["audio_bytes"] / requests) if requests else None
+        # Bytes uploaded per byte of audio received; above 1 means retries or endpoint misses
+        stats["upload_ratio"] = round(stats["upload_bytes"] / stats["audio_bytes"], 3) if stats["audio_bytes"] else None
+        return stats
+
+
+# Global transcription client
+transcription_client = TranscriptionClient()
@@ -0,0 +1,322 @@
+import re
+from typing import Dict, Any, Optional
+import json_codec
+
+# JSON schemas requested from the VLM in structured-output mode, per task.
+_STRING = {"type": "string"}
+
+PLATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plate_number": _STRING,
+        "vehicle_type": _STRING,
+        "vehicle_color": _STRING,
+        "registration_expiry": _STRING,
+        "road_tax_status": _STRING,
+    },
+    "required": ["plate_number", "vehicle_type", "vehicle_color", "registration_expiry", "road_tax_status"],
+    "additionalProperties": False,
+}
+
+LICENSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": _STRING,
+        "ic_number": _STRING,
+        "license_number": _STRING,
+        "nationality": _STRING,
+        "class": _STRING,
+        "expiry_date": _STRING,
+        "address": _STRING,
+    },
+    "required": ["name", "ic_number", "license_number", "nationality", "class", "expiry_date", "address"],
+    "additionalProperties": False,
+}
+
+RESPONSE_SCHEMAS = {
+    "accident_photos": {
+        "type": "object",
+        "properties": {
+            "analysis": _STRING,
+            "consistency_score": {"type": "number", "minimum": 0, "maximum": 1},
+            "damage_assessment": _STRING,
+        },
+        "required": ["analysis", "consistency_score", "damage_assessment"],
+        "additionalProperties": False,
+    },
+    "accident_image": {
+        "type": "object",
+        "properties": {
+            "vehicle_description": _STRING,
+            "damage_description": _STRING,
+            "incident_description": _STRING,
+        },
+        "required": ["vehicle_description", "damage_description", "incident_description"],
+        "additionalProperties": False,
+    },
+    "plate": PLATE_SCHEMA,
+    "license": LICENSE_SCHEMA,
+    "semakan": {
+        "type": "object",
+        "properties": {
+            "plate": PLATE_SCHEMA,
+            "license": {"anyOf": [LICENSE_SCHEMA, {"type": "null"}]},
+        },
+        "required": ["plate", "license"],
+        "additionalProperties": False,
+    },
+}
+
+# Appended to the prompt when a JSON schema is requested
+STRUCTURED_OUTPUT_INSTRUCTION = (
+    "\nKEMBALIKAN SATU OBJEK JSON SAHAJA MENGIKUT SKEMA YANG DIBERIKAN. "
+    "NILAI TEKS MESTILAH DALAM BAHASA MELAYU."
+)
+
+UNKNOWN = "Tidak dapat dikenal pasti"
+
+# How many responses were parsed from JSON versus the regex fallback
+PARSE_STATS = {"structured": 0, "fallback": 0}
+
+
+def response_format(task: str) -> Dict[str, Any]:
+    """OpenAI-compatible response_format requesting the task's JSON schema."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": task, "schema": RESPONSE_SCHEMAS[task], "strict": True},
+    }
+
+
+def parse_response(task: str, response_text: str) -> Dict[str, Any]:
+    """Parse a VLM response as JSON in one pass, falling back to regex."""
+    data = _load_object(response_text)
+    if data is not None:
+        PARSE_STATS["structured"] += 1
+        return _STRUCTURED[task](data)
+    PARSE_STATS["fallback"] += 1
+    return _FALLBACK[task](response_text)
+
+
+def _load_object(response_text: str) -> Optional[Dict[str, Any]]:
+    text = response_text.strip()
+    if not text.startswith("{"):
+        # Tolerate a fenced ```json block around the object
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            return None
+        text = text[start:end + 1]
+    try:
+        data = json_codec.loads(text)
+    except (ValueError, TypeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _text(data: Dict[str, Any], key: str, default: str = "") -> str:
+    value = data.get(key)
+    return str(value).strip() if value is not None else default
+
+
+def _structured_photos(data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        score = float(data.get("consistency_score", 0.7))
+    except (TypeError, ValueError):
+        score = 0.7
+    return {
+        "analysis": _text(data, "analysis"),
+        "consistency_score": min(1.0, max(0.0, score)),
+        "damage_assessment": _text(data, "damage_assessment", "Berdasarkan analisis VLM foto kemalangan"),
+    }
+
+
+def _structured_image(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "vehicle_description": _text(data, "vehicle_description"),
+        "damage_description": _text(data, "damage_description"),
+        "incident_description": _text(data, "incident_description"),
+        "confidence_score": 0.8,
+    }
+
+
+def _structured_plate(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "plate_number": _text(data, "plate_number"),
+        "vehicle_type": _text(data, "vehicle_type"),
+        "vehicle_color": _text(data, "vehicle_color"),
+        "registration_expiry": _text(data, "registration_expiry", UNKNOWN) or UNKNOWN,
+        "road_tax_status": _text(data, "road_tax_status", UNKNOWN) or UNKNOWN,
+        "confidence_score": 0.8,
+    }
+
+
+def _structured_license(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: _text(data, key) for key in LICENSE_SCHEMA["properties"]}
+
+
+def _structured_semakan(data: Dict[str, Any]) -> Dict[str, Any]:
+    license_data = data.get("license")
+    return {
+        "plate": _structured_plate(data.get("plate") or {}),
+        "license": _structured_license(license_data) if isinstance(license_data, dict) else None,
+    }
+
+
+# Regex fallback, compiled once at import
+
+_CONSISTENCY_PATTERNS = [
+    re.compile(r'consistency[:\s]*(\d+(?:\.\d+)?)'),
+    re.compile(r'score[:\s]*(\d+(?:\.\d+)?)'),
+    re.compile(r'(\d+(?:\.\d+)?)%?\s*consistency'),
+    re.compile(r'(\d+(?:\.\d+)?)/10'),
+    re.compile(r'(\d+(?:\.\d+)?)\s*out\s*of\s*10'),
+]
+
+_DAMAGE_PATTERNS = [
+    re.compile(r'damage[:\s]*([^.]+\.)', re.IGNORECASE),
+    re.compile(r'assessment[:\s]*([^.]+\.)', re.IGNORECASE),
+    re.compile(r'repair cost[:\s]*([^.]+\.)', re.IGNORECASE),
+    re.compile(r'estimated[:\s]*([^.]+\.)', re.IGNORECASE),
+]
+
+_DAMAGE_KEYWORDS = ('damage', 'repair', 'cost', 'severity')
+
+_IMAGE_FIELDS = re.compile(r'\b(KENDERAAN|KEROSAKAN|INSIDEN)\s*:', re.IGNORECASE)
+_PLATE_FIELDS = re.compile(r'\b(PLAT|JENIS|WARNA|TAMAT|CUKAI)\s*:', re.IGNORECASE)
+_LICENSE_FIELDS = re.compile(r'\b(NAMA|IC|LESEN|WARGANEGARA|KELAS|TAMAT|ALAMAT)\s*:', re.IGNORECASE)
+_PLATE_NUMBER = re.compile(r'([A-Z]{1,3}\s?\d{1,4}\s?[A-Z]{0,3})')
+
+
+def _split_fields(pattern: "re.Pattern", text: str, first_line: bool) -> Dict[str, str]:
+    """Split text on KEY: markers in one pass; the first value per key wins."""
+    parts = pattern.split(text)
+    fields: Dict[str, str] = {}
+    for key, value in zip(parts[1::2], parts[2::2]):
+        value = value.strip()
+        if first_line:
+            value = value.split("\n", 1)[0].strip()
+        fields.setdefault(key.upper(), value)
+    return fields
+
+
+def parse_vlm_response(response_text: str) -> Dict[str, Any]:
+    """Parse free-form accident photo analysis text."""
+    lowered = response_text.lower()
+
+    # Try to extract consistency score from response
+    consistency_score = 0.7  # Default
+    for pattern in _CONSISTENCY_PATTERNS:
+        match = pattern.search(lowered)
+        if match:
+            try:
+                score = float(match.group(1))
+                if score > 1:  # If percentage or out of 10, convert to decimal
+                    consistency_score = min(1.0, score / 100 if score <= 100 else score / 10)
+                else:
+                    consistency_score = score
+                break
+            except ValueError:
+                continue
+
+    # Try to extract damage assessment
+    damage_assessment = "Berdasarkan analisis VLM foto kemalangan"
+    for pattern in _DAMAGE_PATTERNS:
+        match = pattern.search(response_text)
+        if match:
+            damage_assessment = match.group(1).strip()
+            break
+    else:
+        # If no specific damage assessment found, try to extract key points
+        damage_lines = [
+            line.strip() for line in response_text.split('\n')
+            if any(keyword in line.lower() for keyword in _DAMAGE_KEYWORDS)
+        ]
+        if damage_lines:
+            damage_assessment = '. '.join(damage_lines[:3])  # Take first 3 relevant lines
+
+    return {
+        "analysis": response_text,
+        "consistency_score": min(1.0, max(0.0, consistency_score)),
+        "damage_assessment": damage_assessment
+    }
+
+
+def parse_image_response(response_text: str) -> Dict[str, Any]:
+    """Parse KENDERAAN/KEROSAKAN/INSIDEN sections."""
+    fields = _split_fields(_IMAGE_FIELDS, response_text, first_line=False)
+    vehicle_description = fields.get("KENDERAAN", "")
+    damage_description = fields.get("KEROSAKAN", "")
+    incident_description = fields.get("INSIDEN", "")
+
+    # If parsing failed, return the whole text as incident description
+    if not vehicle_description and not damage_description and not incident_description:
+        vehicle_description = "Tidak dapat mengenal pasti kenderaan daripada foto"
+        damage_description = "Tidak dapat menilai kerosakan daripada foto"
+        incident_description = response_text[:500]
+
+    return {
+        "vehicle_description": vehicle_description,
+        "damage_description": damage_description,
+        "incident_description": incident_description,
+        "confidence_score": 0.8
+    }
+
+
+def parse_plate_response(response_text: str) -> Dict[str, Any]:
+    """Parse PLAT/JENIS/WARNA/TAMAT/CUKAI lines."""
+    fields = _split_fields(_PLATE_FIELDS, response_text, first_line=True)
+    plate_number = fields.get("PLAT", "")
+
+    # If parsing failed, try to find plate number pattern
+    if not plate_number:
+        match = _PLATE_NUMBER.search(response_text)
+        if match:
+            plate_number = match.group(1).strip()
+
+    return {
+        "plate_number": plate_number,
+        "vehicle_type": fields.get("JENIS", ""),
+        "vehicle_color": fields.get("WARNA", ""),
+        "registration_expiry": fields.get("TAMAT") or UNKNOWN,
+        "road_tax_status": fields.get("CUKAI") or UNKNOWN,
+        "confidence_score": 0.8
+    }
+
+
+def parse_license_response(response_text: str) -> Dict[str, Any]:
+    """Parse NAMA/IC/LESEN/WARGANEGARA/KELAS/TAMAT/ALAMAT lines."""
+    fields = _split_fields(_LICENSE_FIELDS, response_text, first_line=True)
+    return {
+        "name": fields.get("NAMA", ""),
+        "ic_number": fields.get("IC", ""),
+        "license_number": fields.get("LESEN", ""),
+        "nationality": fields.get("WARGANEGARA", ""),
+        "class": fields.get("KELAS", ""),
+        "expiry_date": fields.get("TAMAT", ""),
+        "address": fields.get("ALAMAT", "")
+    }
+
+
+def parse_semakan_response(response_text: str) -> Dict[str, Any]:
+    """Parse a combined === KENDERAAN === / === LESEN === response."""
+    vehicle_text, has_license, license_text = response_text.partition("=== LESEN ===")
+    return {
+        "plate": parse_plate_response(vehicle_text),
+        "license": parse_license_response(license_text) if has_license else None
+    }
+
+
+_STRUCTURED = {
+    "accident_photos": _structured_photos,
+    "accident_image": _structured_image,
+    "plate": _structured_plate,
+    "license": _structured_license,
+    "semakan": _structured_semakan,
+}
+
+_FALLBACK = {
+    "accident_photos": parse_vlm_response,
+    "accident_image": parse_image_response,
+    "plate": parse_plate_response,
+    "license": parse_license_response,
+    "semakan": parse_semakan_response,
+}
@@ -1,102 +1,107 @@
 import os
 import json
-import aiohttp
-from typing import List, Dict, Any
-from PIL import Image
-import base64
-from io import BytesIO
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple, Union, BinaryIO
 from dotenv import load_dotenv
+from http_client import http_client, UpstreamError
+from singleflight import SingleFlight, fingerprint
+from resilience import deadline_scope
+from image_processing import image_preprocessor, IMAGE_PROFILES
+from analysis_cache import analysis_cache, content_hash, file_content_hash, make_cache_key
+import vlm_parsers
 
 load_dotenv()
 
+# Bump a task's version whenever its prompt or parser changes so that cached
+# results produced by the old prompt are no longer served.
+PROMPT_VERSIONS = {
+    "accident_photos": "2",
+    "accident_image": "2",
+    "plate": "2",
+    "license": "2",
+    "semakan": "2",
+}
+
+# Image preprocessing profile used for each task
+TASK_IMAGE_PROFILES = {
+    "accident_photos": "damage",
+    "accident_image": "damage",
+    "plate": "plate",
+    "license": "license",
+    "semakan": "plate",
+}
+
+# An image can be passed as raw bytes, a readable buffer or a file path
+ImageInput = Union[bytes, bytearray, BinaryIO, str]
+
 class VLMService:
     def __init__(self):
         self.api_key = os.getenv("VLM_API_KEY", "sk-2iTJBlqeaDWPTmGHm-kfbg")
         self.api_url = os.getenv("VLM_API_URL", "http://60.51.17.97:9999/v1/chat/completions")
         self.model = os.getenv("VLM_MODEL", "qwen3.5-397b-a17b-fp8-instruct")
-        
-    async def encode_image_to_base64(self, image_path: str) -> str:
-        """Convert image to base64 for API transmission."""
+        self.photo_concurrency = int(os.getenv("VLM_PHOTO_CONCURRENCY", "4"))
+        self.per_photo_analysis = os.getenv("VLM_PER_PHOTO_ANALYSIS", "false").lower() in ("1", "true", "yes")
+        self.photos_deadline = float(os.getenv("VLM_PHOTOS_DEADLINE", "90"))
+        # Ask for JSON matching a per-task schema via response_format
+        self.structured_output = os.getenv("VLM_STRUCTURED_OUTPUT", "true").lower() in ("1", "true", "yes")
+        self.singleflight = SingleFlight()
+        
+    async def encode_image_to_base64(self, image: Union[bytes, str], profile: str = "default") -> str:
+        """Convert image bytes or an image file to base64 for API transmission."""
         try:
-            with Image.open(image_path) as img:
-                # Resize image if too large (max 1024x1024 for most VLM APIs)
-                if img.width > 1024 or img.height > 1024:
-                    img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
-                
-                # Convert to RGB if necessary
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Convert to base64
-                buffer = BytesIO()
-                img.save(buffer, format='JPEG', quality=85)
-                img_str = base64.b64encode(buffer.getvalue()).decode()
-                return img_str
+            return await image_preprocessor.encode(image, profile)
         except Exception as e:
             raise Exception(f"Error encoding image: {str(e)}")
     
+    async def _load_image(self, image: ImageInput) -> Tuple[Union[bytes, str], str]:
+        """
+        Return an encodable image source and its content hash.
+        Bytes and buffers stay in memory; paths are hashed in a thread and
+        decoded by the worker straight from disk.
+        """
+        if isinstance(image, str):
+            return image, await asyncio.to_thread(file_content_hash, image)
+        if hasattr(image, "read"):
+            image = await asyncio.to_thread(image.read)
+        data = bytes(image)
+        return data, await asyncio.to_thread(content_hash, data)
+    
+    def _analysis_cache_key(self, task: str, *parts: str) -> str:
+        """Cache key for a task over the given content hashes and inputs."""
+        profile = IMAGE_PROFILES[TASK_IMAGE_PROFILES[task]]
+        return make_cache_key(
+            *parts, task, PROMPT_VERSIONS[task], self.model,
+            f"{profile['max_size']}:{profile['quality']}"
+        )
+    
     async def analyze_accident_photos(
         self, 
         photo_paths: List[str], 
         damage_description: str, 
-        incident_description: str
+        incident_description: str,
+        per_photo: Optional[bool] = None,
+        deadline: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Analyze accident photos using VLM API.
-        This is a placeholder implementation that can be replaced with actual VLM API calls.
+        Photos are read and encoded concurrently. With per_photo enabled each
+        photo is analyzed in its own upstream call and the results are merged.
+        The whole request is bounded by ``deadline`` seconds.
         """
+        per_photo = self.per_photo_analysis if per_photo is None else per_photo
+        deadline = self.photos_deadline if deadline is None else deadline
         try:
-            # Encode all images
-            encoded_images = []
-            for photo_path in photo_paths:
-                if os.path.exists(photo_path):
-                    encoded_img = await self.encode_image_to_base64(photo_path)
-                    encoded_images.append(encoded_img)
-            
-            if not encoded_images:
-                return {
-                    "analysis": "No valid images found for analysis",
-                    "consistency_score": 0.0,
-                    "damage_assessment": "Unable to assess damage without images"
-                }
-            
-            # Prepare the prompt for VLM analysis
-            analysis_prompt = f"""
-            Analisis foto-foto kemalangan berikut dan bandingkan dengan penerangan yang diberikan. BERIKAN SEMUA RESPONS DALAM BAHASA MELAYU.
-            
-            Penerangan Kerosakan: {damage_description}
-            Penerangan Insiden: {incident_description}
-            
-            Sila berikan (DALAM BAHASA MELAYU):
-            1. Analisis terperinci kerosakan yang kelihatan dalam foto
-            2. Skor konsistensi (0-1) antara foto dan penerangan bertulis
-            3. Penilaian tahap keterukan kerosakan dan anggaran kos pembaikan
-            4. Sebarang percanggahan atau kebimbangan yang dicatat
-            
-            Fokus kepada:
-            - Corak kerosakan kenderaan
-            - Konsistensi dengan insiden yang dilaporkan
-            - Bukti arah dan kekuatan hentaman
-            - Sebarang tanda kerosakan sedia ada
-            
-            PENTING: Semua analisis mestilah dalam bahasa Melayu.
-            """
-            
-            # Use actual VLM API if available, otherwise fall back to mock
-            if self.api_url and "localhost:11434" in self.api_url:
-                # Make actual API call to local Ollama
-                analysis_result = await self._call_ollama_api(encoded_images, analysis_prompt)
-            elif self.api_key and self.api_key != "your-vlm-api-key-here":
-                # Make actual API call to other VLM provider
-                analysis_result = await self._call_vlm_api(encoded_images, analysis_prompt)
-            else:
-                # Mock response for development
-                analysis_result = await self._mock_vlm_analysis(
-                    encoded_images, damage_description, incident_description
+            with deadline_scope(deadline):
+                return await asyncio.wait_for(
+                    self._analyze_accident_photos(photo_paths, damage_description, incident_description, per_photo),
+                    timeout=deadline
                 )
-            
-            return analysis_result
-            
+        except asyncio.TimeoutError:
+            return {
+                "analysis": f"Analisis VLM melebihi had masa {deadline:.0f} saat",
+                "consistency_score": 0.0,
+                "damage_assessment": "Analysis timed out before all photos were assessed"
+            }
         except Exception as e:
             return {
                 "analysis": f"Error during VLM analysis: {str(e)}",
@@ -104,6 +109,135 @@ class VLMService:
                 "damage_assessment": "Analysis failed due to technical error"
             }
     
+    async def _analyze_accident_photos(
+        self,
+        photo_paths: List[str],
+        damage_description: str,
+        incident_description: str,
+        per_photo: bool
+    ) -> Dict[str, Any]:
+        semaphore = asyncio.Semaphore(self.photo_concurrency)
+        
+        async def read_photo(photo_path: str) -> Optional[Tuple[str, str]]:
+            async with semaphore:
+                if not os.path.exists(photo_path):
+                    return None
+                return await self._load_image(photo_path)
+        
+        async def encode_photo(photo_path: str) -> str:
+            async with semaphore:
+                return await self.encode_image_to_base64(photo_path, TASK_IMAGE_PROFILES["accident_photos"])
+        
+        # Read all images and hash their content
+        images = [
+            image for image in await asyncio.gather(*[read_photo(path) for path in photo_paths])
+            if image is not None
+        ]
+        
+        cache_key = self._analysis_cache_key(
+            "accident_photos",
+            *[image_hash for _, image_hash in images],
+            damage_description,
+            incident_description,
+            "per_photo" if per_photo else "combined"
+        )
+        cached = await analysis_cache.get(cache_key, "accident_photos")
+        if cached is not None:
+            return cached
+        
+        # Encode all images
+        encoded_images = list(await asyncio.gather(*[encode_photo(source) for source, _ in images]))
+        
+        if not encoded_images:
+            return {
+                "analysis": "No valid images found for analysis",
+                "consistency_score": 0.0,
+                "damage_assessment": "Unable to assess damage without images"
+            }
+        
+        # Prepare the prompt for VLM analysis
+        analysis_prompt = f"""
+        Analisis foto-foto kemalangan berikut dan bandingkan dengan penerangan yang diberikan. BERIKAN SEMUA RESPONS DALAM BAHASA MELAYU.
+        
+        Penerangan Kerosakan: {damage_description}
+        Penerangan Insiden: {incident_description}
+        
+        Sila berikan (DALAM BAHASA MELAYU):
+        1. Analisis terperinci kerosakan yang kelihatan dalam foto
+        2. Skor konsistensi (0-1) antara foto dan penerangan bertulis
+        3. Penilaian tahap keterukan kerosakan dan anggaran kos pembaikan
+        4. Sebarang percanggahan atau kebimbangan yang dicatat
+        
+        Fokus kepada:
+        - Corak kerosakan kenderaan
+        - Konsistensi dengan insiden yang dilaporkan
+        - Bukti arah dan kekuatan hentaman
+        - Sebarang tanda kerosakan sedia ada
+        
+        PENTING: Semua analisis mestilah dalam bahasa Melayu.
+        """
+        
+        # Use actual VLM API if available, otherwise fall back to mock
+        if self.api_url and "localhost:11434" in self.api_url:
+            # Make actual API call to local Ollama
+            analysis_result = await self._call_ollama_api(encoded_images, analysis_prompt)
+        elif self.api_key and self.api_key != "your-vlm-api-key-here":
+            # Make actual API call to other VLM provider
+            if per_photo and len(encoded_images) > 1:
+                analysis_result = await self._analyze_photos_individually(encoded_images, analysis_prompt)
+            else:
+                analysis_result = await self._call_vlm_api(encoded_images, analysis_prompt)
+            await analysis_cache.set(cache_key, analysis_result, "accident_photos")
+        else:
+            # Mock response for development
+            analysis_result = await self._mock_vlm_analysis(
+                encoded_images, damage_description, incident_description
+            )
+        
+        return analysis_result
+    
+    async def _analyze_photos_individually(self, encoded_images: List[str], prompt: str) -> Dict[str, Any]:
+        """Fan out one VLM call per photo and merge the results."""
+        results = await asyncio.gather(
+            *[self._call_vlm_api([img], prompt) for img in encoded_images],
+            return_exceptions=True
+        )
+        
+        analyses = []
+        assessments = []
+        scores = []
+        for index, result in enumerate(results, start=1):
+            if isinstance(result, BaseException):
+                print(f"Per-photo VLM analysis failed for photo {index}: {str(result)}")
+                continue
+            analyses.append(f"FOTO {index}:\n{result['analysis']}")
+            assessments.append(f"FOTO {index}: {result['damage_assessment']}")
+            scores.append(result["consistency_score"])
+        
+        if not scores:
+            raise Exception("VLM analysis failed for every photo")
+        
+        return {
+            "analysis": "\n\n".join(analyses),
+            "consistency_score": round(sum(scores) / len(scores), 2),
+            "damage_assessment": "\n".join(assessments)
+        }
+    
+    async def _post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        POST a payload to the VLM upstream and return the JSON response.
+        Concurrent requests with an identical payload share one upstream call.
+        """
+        key = fingerprint(url, payload)
+        return await self.singleflight.do(
+            key, lambda: http_client.post_json("vlm", url, payload, headers)
+        )
+    
     async def _call_ollama_api(self, encoded_images: List[str], prompt: str) -> Dict[str, Any]:
         """Make API call to local Ollama VLM service."""
         try:
@@ -115,22 +249,54 @@ class VLMService:
                 "stream": False
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(f"{self.api_url}/api/generate", json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        analysis_text = result.get("response", "")
-                        
-                        # Parse the analysis to extract structured data
-                        return self._parse_vlm_response(analysis_text)
-                    else:
-                        raise Exception(f"Ollama API error: {response.status}")
-                        
+            result = await self._post_json(f"{self.api_url}/api/generate", payload)
+            analysis_text = result.get("response", "")
+            
+            # Parse the analysis to extract structured data
+            return self._parse_vlm_response(analysis_text)
+            
         except Exception as e:
             # Fall back to mock analysis if Ollama is not available
             print(f"Ollama API call failed: {str(e)}, falling back to mock analysis")
             return await self._mock_vlm_analysis(encoded_images, "", "")
 
+    async def _post_chat(
+        self,
+        payload: Dict[str, Any],
+        headers: Dict[str, str],
+        task: Optional[str] = None
+    ) -> str:
+        """
+        Send a chat completion and return the message content. With a task and
+        structured output enabled, a JSON schema is requested via
+        response_format; if the upstream rejects it the call is retried once
+        as plain text and structured output is turned off.
+        """
+        if task and self.structured_output:
+            content = payload["messages"][0]["content"]
+            structured = {
+                **payload,
+                "messages": [{
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": content[0]["text"] + vlm_parsers.STRUCTURED_OUTPUT_INSTRUCTION},
+                        *content[1:]
+                    ]
+                }],
+                "response_format": vlm_parsers.response_format(task)
+            }
+            try:
+                result = await self._post_json(self.api_url, structured, headers)
+                return result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            except UpstreamError as e:
+                if e.status not in (400, 422):
+                    raise
+                print(f"VLM upstream rejected response_format, disabling structured output: {e.body[:200]}")
+                self.structured_output = False
+        
+        result = await self._post_json(self.api_url, payload, headers)
+        return result.get("choices", [{}])[0].get("message", {}).get("content", "")
+    
     async def _call_vlm_api(self, encoded_images: List[str], prompt: str) -> Dict[str, Any]:
         """Make actual API call to VLM service."""
         try:
@@ -154,18 +320,11 @@ class VLMService:
                 "max_tokens": 1000
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        analysis_text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        
-                        # Parse the analysis to extract structured data
-                        return self._parse_vlm_response(analysis_text)
-                    else:
-                        error_text = await response.text()
-                        raise Exception(f"VLM API error: {response.status} - {error_text}")
-                        
+            analysis_text = await self._post_chat(payload, headers, "accident_photos")
+            
+            # Parse the analysis to extract structured data
+            return self._parse_vlm_response(analysis_text)
+            
         except Exception as e:
             raise Exception(f"VLM API call failed: {str(e)}")
     
@@ -227,71 +386,22 @@ class VLMService:
     
     def _parse_vlm_response(self, response_text: str) -> Dict[str, Any]:
         """Parse VLM response to extract structured data."""
-        import re
-        
-        # Try to extract consistency score from response
-        consistency_score = 0.7  # Default
-        consistency_patterns = [
-            r'consistency[:\s]*(\d+(?:\.\d+)?)',
-            r'score[:\s]*(\d+(?:\.\d+)?)',
-            r'(\d+(?:\.\d+)?)%?\s*consistency',
-            r'(\d+(?:\.\d+)?)/10',
-            r'(\d+(?:\.\d+)?)\s*out\s*of\s*10'
-        ]
-        
-        for pattern in consistency_patterns:
-            match = re.search(pattern, response_text.lower())
-            if match:
-                try:
-                    score = float(match.group(1))
-                    if score > 1:  # If percentage or out of 10, convert to decimal
-                        consistency_score = min(1.0, score / 100 if score <= 100 else score / 10)
-                    else:
-                        consistency_score = score
-                    break
-                except ValueError:
-                    continue
-        
-        # Try to extract damage assessment
-        damage_assessment = "Berdasarkan analisis VLM foto kemalangan"
-        damage_patterns = [
-            r'damage[:\s]*([^.]+\.)',
-            r'assessment[:\s]*([^.]+\.)',
-            r'repair cost[:\s]*([^.]+\.)',
-            r'estimated[:\s]*([^.]+\.)'
-        ]
-        
-        for pattern in damage_patterns:
-            match = re.search(pattern, response_text, re.IGNORECASE)
-            if match:
-                damage_assessment = match.group(1).strip()
-                break
-        
-        # If no specific damage assessment found, try to extract key points
-        if damage_assessment == "Berdasarkan analisis VLM foto kemalangan":
-            lines = response_text.split('\n')
-            damage_lines = []
-            for line in lines:
-                if any(keyword in line.lower() for keyword in ['damage', 'repair', 'cost', 'severity']):
-                    damage_lines.append(line.strip())
-            
-            if damage_lines:
-                damage_assessment = '. '.join(damage_lines[:3])  # Take first 3 relevant lines
-        
-        return {
-            "analysis": response_text,
-            "consistency_score": min(1.0, max(0.0, consistency_score)),
-            "damage_assessment": damage_assessment
-        }
+        return vlm_parsers.parse_response("accident_photos", response_text)
     
-    async def analyze_accident_image(self, image_path: str) -> Dict[str, Any]:
+    async def analyze_accident_image(self, image: ImageInput) -> Dict[str, Any]:
         """
         Analyze a single accident image to extract vehicle, damage, and incident information.
         Used for the new simplified report creation flow.
         """
         try:
+            image_source, image_hash = await self._load_image(image)
+            cache_key = self._analysis_cache_key("accident_image", image_hash)
+            cached = await analysis_cache.get(cache_key, "accident_image")
+            if cached is not None:
+                return cached
+            
             # Encode the image
-            encoded_image = await self.encode_image_to_base64(image_path)
+            encoded_image = await self.encode_image_to_base64(image_source, TASK_IMAGE_PROFILES["accident_image"])
             
             # Create prompt for extracting structured information
             analysis_prompt = """
@@ -329,6 +439,7 @@ class VLMService:
                 result = await self._call_ollama_api([encoded_image], analysis_prompt)
             elif self.api_key and self.api_key != "your-vlm-api-key-here":
                 result = await self._call_image_vlm_api([encoded_image], analysis_prompt)
+                await analysis_cache.set(cache_key, result, "accident_image")
             else:
                 result = await self._mock_image_analysis()
             
@@ -338,14 +449,20 @@ class VLMService:
             print(f"Error in analyze_accident_image: {str(e)}")
             return await self._mock_image_analysis()
 
-    async def analyze_plate_number(self, image_path: str) -> Dict[str, Any]:
+    async def analyze_plate_number(self, image: ImageInput) -> Dict[str, Any]:
         """
         Analyze a vehicle image to extract the license plate number.
         Used for traffic fine checking (Semakan Saman).
         """
         try:
+            image_source, image_hash = await self._load_image(image)
+            cache_key = self._analysis_cache_key("plate", image_hash)
+            cached = await analysis_cache.get(cache_key, "plate")
+            if cached is not None:
+                return cached
+            
             # Encode the image
-            encoded_image = await self.encode_image_to_base64(image_path)
+            encoded_image = await self.encode_image_to_base64(image_source, TASK_IMAGE_PROFILES["plate"])
             
             # Create prompt for plate number extraction
             analysis_prompt = """
@@ -372,8 +489,9 @@ class VLMService:
             if self.api_url and "localhost:11434" in self.api_url:
                 result = await self._call_ollama_api([encoded_image], analysis_prompt)
             elif self.api_key and self.api_key != "your-vlm-api-key-here":
-                result = await self._call_image_vlm_api([encoded_image], analysis_prompt)
-                result = self._parse_plate_response(result.get("incident_description", ""))
+                response_text = await self._call_image_vlm_text([encoded_image], analysis_prompt, "plate")
+                result = self._parse_plate_response(response_text)
+                await analysis_cache.set(cache_key, result, "plate")
             else:
                 result = await self._mock_plate_analysis()
             
@@ -383,14 +501,20 @@ class VLMService:
             print(f"Error in analyze_plate_number: {str(e)}")
             return await self._mock_plate_analysis()
 
-    async def analyze_license(self, image_path: str) -> Dict[str, Any]:
+    async def analyze_license(self, image: ImageInput) -> Dict[str, Any]:
         """
         Analyze a driver license image to extract driver information.
         Used for traffic fine checking (Semakan Saman).
         """
         try:
+            image_source, image_hash = await self._load_image(image)
+            cache_key = self._analysis_cache_key("license", image_hash)
+            cached = await analysis_cache.get(cache_key, "license")
+            if cached is not None:
+                return cached
+            
             # Encode the image
-            encoded_image = await self.encode_image_to_base64(image_path)
+            encoded_image = await self.encode_image_to_base64(image_source, TASK_IMAGE_PROFILES["license"])
             
             # Create prompt for license extraction
             analysis_prompt = """
@@ -421,8 +545,9 @@ class VLMService:
             if self.api_url and "localhost:11434" in self.api_url:
                 result = await self._call_ollama_api([encoded_image], analysis_prompt)
             elif self.api_key and self.api_key != "your-vlm-api-key-here":
-                result = await self._call_image_vlm_api([encoded_image], analysis_prompt)
-                result = self._parse_license_response(result.get("incident_description", ""))
+                response_text = await self._call_image_vlm_text([encoded_image], analysis_prompt, "license")
+                result = self._parse_license_response(response_text)
+                await analysis_cache.set(cache_key, result, "license")
             else:
                 result = await self._mock_license_analysis()
             
@@ -432,6 +557,86 @@ class VLMService:
             print(f"Error in analyze_license: {str(e)}")
             return await self._mock_license_analysis()
 
+    async def analyze_semakan(
+        self,
+        vehicle_image: ImageInput,
+        license_image: Optional[ImageInput] = None
+    ) -> Dict[str, Any]:
+        """
+        Analyze a vehicle photo and, optionally, a driver license photo in a
+        single VLM round trip. Returns {"plate": {...}, "license": {...} or None}
+        with the same fields as analyze_plate_number and analyze_license.
+        When the VLM is not configured or the call fails, the mock analysis is
+        returned with "mocked": True so callers never treat its plate as read.
+        """
+        try:
+            images = [await self._load_image(vehicle_image)]
+            if license_image is not None:
+                images.append(await self._load_image(license_image))
+            
+            cache_key = self._analysis_cache_key("semakan", *[image_hash for _, image_hash in images])
+            cached = await analysis_cache.get(cache_key, "semakan")
+            if cached is not None:
+                return cached
+            
+            # Encode both images concurrently
+            profiles = [TASK_IMAGE_PROFILES["plate"], TASK_IMAGE_PROFILES["license"]]
+            encoded_images = list(await asyncio.gather(*[
+                self.encode_image_to_base64(source, profile)
+                for (source, _), profile in zip(images, profiles)
+            ]))
+            
+            license_section = """
+            === LESEN ===
+            NAMA: [nama penuh]
+            IC: [nombor IC]
+            LESEN: [nombor lesen]
+            WARGANEGARA: [kewarganegaraan]
+            KELAS: [kelas lesen]
+            TAMAT: [tarikh tamat tempoh lesen]
+            ALAMAT: [alamat penuh]
+            """ if license_image is not None else ""
+            
+            analysis_prompt = f"""
+            SEMAKAN SAMAN: ANALISIS GAMBAR KENDERAAN{" DAN LESEN MEMANDU" if license_image is not None else ""}
+            
+            Gambar pertama ialah kenderaan.{" Gambar kedua ialah lesen memandu pemandu." if license_image is not None else ""}
+            Sila ekstrak maklumat berikut DALAM BAHASA MELAYU.
+            
+            BERIKAN RESPONS DALAM FORMAT BERIKUT (SAHAJA, TANPA PENJELASAN TAMBAHAN):
+            
+            === KENDERAAN ===
+            PLAT: [nombor plat, format: ABC 1234]
+            JENIS: [jenis kenderaan]
+            WARNA: [warna kenderaan]
+            TAMAT: [tarikh tamat pendaftaran atau "Tidak dapat dikenal pasti"]
+            CUKAI: [status cukai jalan atau "Tidak dapat dikenal pasti"]
+            {license_section}
+            """
+            
+            if self.api_key and self.api_key != "your-vlm-api-key-here" and "localhost:11434" not in self.api_url:
+                response_text = await self._call_image_vlm_text(encoded_images, analysis_prompt, "semakan")
+                result = vlm_parsers.parse_response("semakan", response_text)
+                if license_image is None:
+                    result["license"] = None
+                await analysis_cache.set(cache_key, result, "semakan")
+            else:
+                result = await self._mock_semakan_analysis(license_image is not None)
+            
+            return result
+            
+        except Exception as e:
+            print(f"Error in analyze_semakan: {str(e)}")
+            return await self._mock_semakan_analysis(license_image is not None)
+
+    async def _mock_semakan_analysis(self, with_license: bool) -> Dict[str, Any]:
+        """Mock semakan analysis, flagged so its plate is never joined with saman data."""
+        return {
+            "plate": await self._mock_plate_analysis(),
+            "license": await self._mock_license_analysis() if with_license else None,
+            "mocked": True
+        }
+
     async def _mock_plate_analysis(self) -> Dict[str, Any]:
         """Mock plate analysis for development purposes."""
         return {
@@ -466,6 +671,16 @@ class VLMService:
     
     async def _call_image_vlm_api(self, encoded_images: List[str], prompt: str) -> Dict[str, Any]:
         """Make actual API call to VLM service for image analysis."""
+        analysis_text = await self._call_image_vlm_text(encoded_images, prompt, "accident_image")
+        
+        # Parse the analysis to extract structured data
+        return self._parse_image_response(analysis_text)
+    
+    async def _call_image_vlm_text(self, encoded_images: List[str], prompt: str, task: Optional[str] = None) -> str:
+        """
+        Make actual API call to VLM service and return the raw response text.
+        With a task, the response is requested as JSON matching its schema.
+        """
         try:
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
@@ -498,169 +713,25 @@ class VLMService:
             print(f"Number of images: {len(encoded_images)}")
             print(f"Image data length: {len(encoded_images[0]) if encoded_images else 0}")
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_url, headers=headers, json=payload) as response:
-                    status = response.status
-                    response_text = await response.text()
-                    print(f"VLM Response Status: {status}")
-                    print(f"VLM Response Body: {response_text[:2000]}")
-                    
-                    if status == 200:
-                        result = await response.json()
-                        analysis_text = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                        print(f"Extracted analysis text: {analysis_text[:500] if analysis_text else 'EMPTY'}")
-                        
-                        # Parse the analysis to extract structured data
-                        return self._parse_image_response(analysis_text)
-                    else:
-                        raise Exception(f"VLM API error: {status} - {response_text}")
-                        
+            analysis_text = await self._post_chat(payload, headers, task)
+            print(f"Extracted analysis text: {analysis_text[:500] if analysis_text else 'EMPTY'}")
+            return analysis_text
+            
         except Exception as e:
             print(f"VLM API call failed: {str(e)}")
             raise
     
     def _parse_image_response(self, response_text: str) -> Dict[str, Any]:
         """Parse VLM response to extract vehicle, damage, and incident information."""
-        import re
-        
-        vehicle_description = ""
-        damage_description = ""
-        incident_description = ""
-        
-        # Extract vehicle description
-        vehicle_match = re.search(r'KENDERAAN:\s*(.+?)(?=KEROSAKAN:|$)', response_text, re.DOTALL | re.IGNORECASE)
-        if vehicle_match:
-            vehicle_description = vehicle_match.group(1).strip()
-        
-        # Extract damage description
-        damage_match = re.search(r'KEROSAKAN:\s*(.+?)(?=INSIDEN:|$)', response_text, re.DOTALL | re.IGNORECASE)
-        if damage_match:
-            damage_description = damage_match.group(1).strip()
-        
-        # Extract incident description
-        incident_match = re.search(r'INSIDEN:\s*(.+?)$', response_text, re.DOTALL | re.IGNORECASE)
-        if incident_match:
-            incident_description = incident_match.group(1).strip()
-        
-        # If parsing failed, return the whole text as incident description
-        if not vehicle_description and not damage_description and not incident_description:
-            vehicle_description = "Tidak dapat mengenal pasti kenderaan daripada foto"
-            damage_description = "Tidak dapat menilai kerosakan daripada foto"
-            incident_description = response_text[:500] if len(response_text) > 500 else response_text
-        
-        return {
-            "vehicle_description": vehicle_description,
-            "damage_description": damage_description,
-            "incident_description": incident_description,
-            "confidence_score": 0.8
-        }
+        return vlm_parsers.parse_response("accident_image", response_text)
     
     def _parse_plate_response(self, response_text: str) -> Dict[str, Any]:
         """Parse VLM response to extract plate number information."""
-        import re
-        
-        plate_number = ""
-        vehicle_type = ""
-        vehicle_color = ""
-        registration_expiry = "Tidak dapat dikenal pasti"
-        road_tax_status = "Tidak dapat dikenal pasti"
-        
-        # Extract plate number
-        plate_match = re.search(r'PLAT:\s*(.+?)(?=\n|JENIS:|$)', response_text, re.IGNORECASE)
-        if plate_match:
-            plate_number = plate_match.group(1).strip()
-        
-        # Extract vehicle type
-        type_match = re.search(r'JENIS:\s*(.+?)(?=\n|WARNA:|$)', response_text, re.IGNORECASE)
-        if type_match:
-            vehicle_type = type_match.group(1).strip()
-        
-        # Extract vehicle color
-        color_match = re.search(r'WARNA:\s*(.+?)(?=\n|TAMAT:|$)', response_text, re.IGNORECASE)
-        if color_match:
-            vehicle_color = color_match.group(1).strip()
-        
-        # Extract registration expiry
-        expiry_match = re.search(r'TAMAT:\s*(.+?)(?=\n|CUKAI:|$)', response_text, re.IGNORECASE)
-        if expiry_match:
-            registration_expiry = expiry_match.group(1).strip()
-        
-        # Extract road tax status
-        tax_match = re.search(r'CUKAI:\s*(.+?)(?=\n|$)', response_text, re.IGNORECASE)
-        if tax_match:
-            road_tax_status = tax_match.group(1).strip()
-        
-        # If parsing failed, try to find plate number pattern
-        if not plate_number:
-            plate_pattern = re.search(r'([A-Z]{1,3}\s?\d{1,4}\s?[A-Z]{0,3})', response_text)
-            if plate_pattern:
-                plate_number = plate_pattern.group(1).strip()
-        
-        return {
-            "plate_number": plate_number,
-            "vehicle_type": vehicle_type,
-            "vehicle_color": vehicle_color,
-            "registration_expiry": registration_expiry,
-            "road_tax_status": road_tax_status,
-            "confidence_score": 0.8
-        }
+        return vlm_parsers.parse_response("plate", response_text)
     
     def _parse_license_response(self, response_text: str) -> Dict[str, Any]:
         """Parse VLM response to extract driver license information."""
-        import re
-        
-        name = ""
-        ic_number = ""
-        license_number = ""
-        nationality = ""
-        license_class = ""
-        expiry_date = ""
-        address = ""
-        
-        # Extract name
-        name_match = re.search(r'NAMA:\s*(.+?)(?=\n|IC:|$)', response_text, re.IGNORECASE)
-        if name_match:
-            name = name_match.group(1).strip()
-        
-        # Extract IC number
-        ic_match = re.search(r'IC:\s*(.+?)(?=\n|LESEN:|$)', response_text, re.IGNORECASE)
-        if ic_match:
-            ic_number = ic_match.group(1).strip()
-        
-        # Extract license number
-        license_match = re.search(r'LESEN:\s*(.+?)(?=\n|WARGANEGARA:|$)', response_text, re.IGNORECASE)
-        if license_match:
-            license_number = license_match.group(1).strip()
-        
-        # Extract nationality
-        nationality_match = re.search(r'WARGANEGARA:\s*(.+?)(?=\n|KELAS:|$)', response_text, re.IGNORECASE)
-        if nationality_match:
-            nationality = nationality_match.group(1).strip()
-        
-        # Extract license class
-        class_match = re.search(r'KELAS:\s*(.+?)(?=\n|TAMAT:|$)', response_text, re.IGNORECASE)
-        if class_match:
-            license_class = class_match.group(1).strip()
-        
-        # Extract expiry date
-        expiry_match = re.search(r'TAMAT:\s*(.+?)(?=\n|ALAMAT:|$)', response_text, re.IGNORECASE)
-        if expiry_match:
-            expiry_date = expiry_match.group(1).strip()
-        
-        # Extract address
-        address_match = re.search(r'ALAMAT:\s*(.+?)(?=\n|$)', response_text, re.IGNORECASE)
-        if address_match:
-            address = address_match.group(1).strip()
-        
-        return {
-            "name": name,
-            "ic_number": ic_number,
-            "license_number": license_number,
-            "nationality": nationality,
-            "class": license_class,
-            "expiry_date": expiry_date,
-            "address": address
-        }
+        return vlm_parsers.parse_response("license", response_text)
 
 # Global VLM service instance
 vlm_service = VLMService()
\ No newline at end of file
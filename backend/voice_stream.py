@@ -0,0 +1,211 @@
+import io
+import os
+import time
+import wave
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from transcription_client import transcription_client
+
+# Raw audio clients stream: 16 kHz mono signed 16-bit little-endian
+SAMPLE_RATE = 16000
+_SAMPLE_BYTES = 2
+# 20 ms, the frame used to find a quiet point to cut segments at
+_FRAME_BYTES = SAMPLE_RATE // 50 * _SAMPLE_BYTES
+
+PCM16 = "pcm16"
+WEBM = "webm"
+# Stream format -> (filename, content type) sent to Whisper
+VOICE_FORMATS = {
+    PCM16: ("segment.wav", "audio/wav"),
+    WEBM: ("recording.webm", "audio/webm"),
+}
+
+# Partial transcripts are requested at most this often
+PARTIAL_INTERVAL = float(os.getenv("VOICE_PARTIAL_INTERVAL_MS", "1000")) / 1000
+# pcm16 audio is committed in segments of about this length
+SEGMENT_SECONDS = float(os.getenv("VOICE_SEGMENT_SECONDS", "6"))
+# Shortest pcm16 remainder worth a partial transcript
+MIN_PARTIAL_SECONDS = 0.5
+# A webm partial re-sends the whole recording, so the next one waits until
+# the recording has grown by this factor; the partial uploads then add up to
+# about twice the audio instead of growing with the square of its length
+WEBM_PARTIAL_GROWTH = float(os.getenv("VOICE_WEBM_PARTIAL_GROWTH", "2"))
+MAX_STREAM_BYTES = int(os.getenv("VOICE_STREAM_MAX_BYTES", str(10 * 1024 * 1024)))
+
+_metrics = {
+    "streams": 0,
+    "audio_bytes": 0,
+    "segments": 0,
+    "partials": 0,
+    "partial_failures": 0,
+    "partial_bytes": 0,
+    "finals": 0,
+    "finals_from_partial": 0,
+    "final_seconds": 0.0,
+}
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    """Wrap raw pcm16 audio in a WAV header."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(_SAMPLE_BYTES)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def quiet_cut(pcm: bytes, search_bytes: int) -> int:
+    """Offset of the middle of the quietest 20 ms frame in the last ``search_bytes``.
+
+    Segments are cut there so a word is rarely split between two of them.
+    """
+    start = max(0, len(pcm) - search_bytes)
+    start -= start % _FRAME_BYTES
+    frames = (len(pcm) - start) // _FRAME_BYTES
+    if frames == 0:
+        return len(pcm) - len(pcm) % _SAMPLE_BYTES
+    samples = np.frombuffer(pcm, dtype="<i2", count=frames * _FRAME_BYTES // _SAMPLE_BYTES, offset=start)
+    energy = np.square(samples.astype(np.float32)).reshape(frames, -1).mean(axis=1)
+    return start + int(energy.argmin()) * _FRAME_BYTES + _FRAME_BYTES // 2
+
+
+class VoiceStream:
+    """Transcribes one voice session while its audio is still arriving.
+
+    pcm16 audio is cut into segments of about VOICE_SEGMENT_SECONDS at the
+    quietest point of their last second, and each segment is transcribed as
+    soon as it is complete, so when the user stops only the short remainder
+    is left to transcribe. Partial transcripts of the remainder are pushed
+    every VOICE_PARTIAL_INTERVAL_MS.
+
+    Container audio such as webm from MediaRecorder cannot be cut without
+    decoding it, so each partial transcribes the recording so far, and the
+    final text reuses the latest partial when no audio arrived after it.
+    Partials back off as the recording grows (VOICE_WEBM_PARTIAL_GROWTH) so
+    the re-sent audio stays proportional to the recording.
+    """
+
+    def __init__(self, audio_format: str, on_partial: Callable[[str], Awaitable[None]]):
+        self.audio_format = audio_format
+        self._on_partial = on_partial
+        self._audio = bytearray()
+        # Start of the audio not yet in a committed segment
+        self._tail_start = 0
+        self._segments: List[asyncio.Task] = []
+        self._partial: Optional[asyncio.Task] = None
+        self._partial_span: Tuple[int, int] = (0, 0)
+        self._partial_started = 0.0
+        _metrics["streams"] += 1
+
+    @property
+    def received(self) -> int:
+        return len(self._audio)
+
+    def feed(self, chunk: bytes):
+        """Add a chunk of audio; starts segment and partial transcriptions as due."""
+        if self.received + len(chunk) > MAX_STREAM_BYTES:
+            raise ValueError("Voice stream exceeds the maximum length")
+        self._audio.extend(chunk)
+        _metrics["audio_bytes"] += len(chunk)
+        if self.audio_format == PCM16:
+            self._commit_segments()
+        self._maybe_partial()
+
+    async def finish(self) -> str:
+        """The final transcript, once the user has stopped speaking."""
+        stopped = time.monotonic()
+        span = (self._tail_start, self.received)
+
+        async def tail_text() -> str:
+            if self._partial is not None and self._partial_span == span:
+                # The latest partial already covers everything received
+                text = await self._partial
+                if text is not None:
+                    _metrics["finals_from_partial"] += 1
+                    return text
+            elif self._partial is not None:
+                self._partial.cancel()
+            if span[1] <= span[0]:
+                return ""
+            return await self._transcribe(bytes(self._audio[span[0]:span[1]]))
+
+        texts = await asyncio.gather(*self._segments, tail_text())
+        _metrics["finals"] += 1
+        _metrics["final_seconds"] += time.monotonic() - stopped
+        return " ".join(text for text in texts if text)
+
+    async def aclose(self):
+        """Cancel transcriptions still running, e.g. after a disconnect."""
+        tasks = [task for task in self._segments + [self._partial] if task is not None and not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _commit_segments(self):
+        segment_bytes = int(SEGMENT_SECONDS * SAMPLE_RATE) * _SAMPLE_BYTES
+        while self.received - self._tail_start >= segment_bytes:
+            window = bytes(self._audio[self._tail_start:self._tail_start + segment_bytes])
+            cut = self._tail_start + quiet_cut(window, SAMPLE_RATE * _SAMPLE_BYTES)
+            segment = bytes(self._audio[self._tail_start:cut])
+            self._tail_start = cut
+            self._segments.append(asyncio.create_task(self._transcribe(segment)))
+            _metrics["segments"] += 1
+
+    def _maybe_partial(self):
+        if self._partial is not None and not self._partial.done():
+            return
+        now = time.monotonic()
+        if now - self._partial_started < PARTIAL_INTERVAL:
+            return
+        if self.audio_format == PCM16 and self.received - self._tail_start < MIN_PARTIAL_SECONDS * SAMPLE_RATE * _SAMPLE_BYTES:
+            return
+        if self.audio_format == WEBM and self.received < self._partial_span[1] * WEBM_PARTIAL_GROWTH:
+            return
+        self._partial_started = now
+        self._partial_span = (self._tail_start, self.received)
+        audio = bytes(self._audio[self._tail_start:])
+        _metrics["partial_bytes"] += len(audio)
+        self._partial = asyncio.create_task(self._run_partial(audio, len(self._segments)))
+
+    async def _run_partial(self, audio: bytes, segments: int) -> Optional[str]:
+        """Transcribe the remainder and push it after the segments finished so far."""
+        try:
+            text = await self._transcribe(audio)
+            done = []
+            for task in self._segments[:segments]:
+                if not task.done() or task.cancelled() or task.exception() is not None:
+                    break
+                done.append(task.result())
+            await self._on_partial(" ".join(part for part in done + [text] if part))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _metrics["partial_failures"] += 1
+            print(f"Partial transcription failed: {e}")
+            return None
+        _metrics["partials"] += 1
+        return text
+
+    async def _transcribe(self, audio: bytes) -> str:
+        filename, content_type = VOICE_FORMATS[self.audio_format]
+        if self.audio_format == PCM16:
+            audio = pcm_to_wav(audio)
+        text = await transcription_client.transcribe(audio, filename=filename, content_type=content_type)
+        return text.strip()
+
+
+def voice_stream_stats() -> Dict[str, Any]:
+    """Streams, partials and the delay from the user stopping to the final text."""
+    stats: Dict[str, Any] = dict(_metrics)
+    # Audio sent for partials per byte received
+    stats["partial_upload_ratio"] = (
+        round(stats["partial_bytes"] / stats["audio_bytes"], 3) if stats["audio_bytes"] else None
+    )
+    stats["final_seconds"] = round(stats["final_seconds"], 4)
+    stats["avg_final_seconds"] = (
+        round(_metrics["final_seconds"] / stats["finals"], 4) if stats["finals"] else None
+    )
+    return stats
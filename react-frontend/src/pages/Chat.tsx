@@ -27,6 +27,9 @@ export default function Chat() {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const mediaRecorderRef = useRef<MediaRecorder | null>(null);
   const audioChunksRef = useRef<Blob[]>([]);
+  // Server-side chat session: the backend keeps the history, so each turn
+  // sends only the new message and this id
+  const sessionIdRef = useRef<string | null>(null);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -36,6 +39,32 @@ export default function Chat() {
     scrollToBottom();
   }, [messages]);
 
+  const postChat = async (message: string, token: string | null) => {
+    const send = () =>
+      fetch("http://localhost:8000/chat", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${token}`,
+        },
+        body: JSON.stringify(
+          sessionIdRef.current ? { message, session_id: sessionIdRef.current } : { message }
+        ),
+      });
+
+    let response = await send();
+    if (response.status === 404 && sessionIdRef.current) {
+      // The session expired on the server; start a new one
+      sessionIdRef.current = null;
+      response = await send();
+    }
+    const sessionId = response.headers.get("X-Chat-Session-Id");
+    if (sessionId) {
+      sessionIdRef.current = sessionId;
+    }
+    return response;
+  };
+
   const startRecording = async () => {
     try {
       const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
@@ -105,20 +134,7 @@ export default function Chat() {
           const assistantMessageId = (Date.now() + 1).toString();
           let firstContentReceived = false;
 
-          const chatResponse = await fetch("http://localhost:8000/chat", {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-              Authorization: `Bearer ${token}`,
-            },
-            body: JSON.stringify({
-              message: transcribedText,
-              conversation_history: messages.map(m => ({
-                role: m.role,
-                content: m.content
-              }))
-            }),
-          });
+          const chatResponse = await postChat(transcribedText, token);
 
           if (chatResponse.ok) {
             const reader = chatResponse.body?.getReader();
@@ -223,20 +239,7 @@ export default function Chat() {
 
     try {
       const token = localStorage.getItem("token");
-      const response = await fetch("http://localhost:8000/chat", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-        body: JSON.stringify({
-          message: userMessage.content,
-          conversation_history: messages.map(m => ({
-            role: m.role,
-            content: m.content
-          }))
-        }),
-      });
+      const response = await postChat(userMessage.content, token);
 
       if (!response.ok) {
         throw new Error("Failed to get response");